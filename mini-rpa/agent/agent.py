@@ -1,116 +1,164 @@
 # agent.py
 import os
-import subprocess
-import json
+import uuid
+import socket
+import logging
+import threading
 import base64
+import shutil
 import tempfile
-import datetime
+import requests
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from cryptography.fernet import Fernet
-
-app = FastAPI()
+from backends import criar_backend
+from cache_scripts import CacheScripts
 
 FERNET = Fernet(os.environ["AGENT_FERNET_KEY"])
 
+# Registro no orquestrador (opcional): sem ORCH_URL o agente só atende /run
+ORCH_URL = os.getenv("ORCH_URL")
+AGENT_ID = os.getenv("AGENT_ID", socket.gethostname())
+AGENT_PUBLIC_URL = os.getenv("AGENT_PUBLIC_URL", "http://127.0.0.1:5001")
+AGENT_CAPACITY = int(os.getenv("AGENT_CAPACITY", "1"))
+AGENT_LABELS = [l.strip() for l in os.getenv("AGENT_LABELS", "").split(",") if l.strip()]
+HEARTBEAT_INTERVAL = float(os.getenv("AGENT_HEARTBEAT_INTERVAL", "10"))
+
+# Backend de execução (AGENT_BACKEND); AGENT_MAX_WORKERS limita os jobs simultâneos do pool
+BACKEND = criar_backend(max_workers=int(os.getenv("AGENT_MAX_WORKERS", str(AGENT_CAPACITY))))
+
+# job_id sendo iniciados agora: um reenvio do mesmo job não dispara uma segunda execução
+INICIANDO: set[str] = set()
+INICIANDO_LOCK = threading.Lock()
+
+# Cache de scripts por SHA-256: o orquestrador manda só o hash de scripts já conhecidos
+SCRIPTS = CacheScripts(
+    pasta=os.getenv("AGENT_SCRIPT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "bot_scripts")),
+    max_bytes=int(os.getenv("AGENT_SCRIPT_CACHE_MAX_MB", "256")) * 1024 * 1024,
+    max_itens=int(os.getenv("AGENT_SCRIPT_CACHE_MAX_ITEMS", "500"))
+)
+
 
 class JobPayload(BaseModel):
     task_name: str               # Nome da Scheduled Task (ex: "DemoBot_Run")
     username: str                # DOMINIO\usuario ou maquina\usuario
     cred_ciphertext: str         # senha criptografada em base64 (Fernet)
-    script_b64: str              # automação (conteúdo .py) em base64
+    script_b64: str | None = None     # automação (conteúdo .py) em base64; omitido = usar o cache
+    script_sha256: str | None = None  # hash do conteúdo do script (chave do cache)
     working_dir: str | None = None
     interactive_hint: bool = False  # abre Notepad se houver sessão interativa
-
-
-def windows_quote(s: str) -> str:
-    return f'"{s}"'
-
-
-def create_python_runner(script_path: str, interactive_hint: bool):
-    # Cria um wrapper .cmd para executar o Python de forma confiável
-    content = f"""@echo off
-setlocal
-REM Ajuste o caminho do Python se necessário:
-where python >nul 2>nul
-IF %ERRORLEVEL% NEQ 0 (
-  echo Python não encontrado no PATH. Ajuste o runner.cmd para apontar para o python.exe.
-  exit /b 1
-)
-python {windows_quote(script_path)} {"--interactive" if interactive_hint else ""}
-endlocal
-"""
-    runner = os.path.join(os.path.dirname(script_path), "runner.cmd")
-    with open(runner, "w", encoding="utf-8") as f:
-        f.write(content)
-    return runner
-
-
-def ensure_task(task_name: str, username: str, password: str, command: str, start_in: str | None):
-    # Cria/atualiza a Scheduled Task para rodar "mesmo sem usuário logado"
-    # /RL HIGHEST = privilégios elevados (se suportado)
-    args_create = [
-        "schtasks", "/Create",
-        "/TN", task_name,
-        "/TR", command,
-        "/SC", "ONCE",
-        "/ST", (datetime.datetime.now() +
-                datetime.timedelta(minutes=2)).strftime("%H:%M"),
-        "/RU", username,
-        "/RP", password,
-        "/RL", "HIGHEST",
-        "/F"
-    ]
-    if start_in:
-        # Agendador não tem /StartIn; usamos workdir via wrapper .cmd
-        pass
-
-    result = subprocess.run(
-        args_create, capture_output=True, text=True, shell=False)
-    if result.returncode != 0:
-        # Se já existir, alguns ambientes precisam /Change para ajustar credenciais
-        # Tenta alterar
-        args_change = [
-            "schtasks", "/Change",
-            "/TN", task_name,
-            "/RU", username,
-            "/RP", password
-        ]
-        ch = subprocess.run(args_change, capture_output=True,
-                            text=True, shell=False)
-        if ch.returncode != 0:
-            raise RuntimeError(
-                f"Falha ao criar/alterar tarefa: {result.stderr}\n{ch.stderr}")
-
-
-def run_task(task_name: str):
-    result = subprocess.run(["schtasks", "/Run", "/TN", task_name],
-                            capture_output=True, text=True, shell=False)
-    if result.returncode != 0:
-        raise RuntimeError(f"Falha ao iniciar tarefa: {result.stderr}")
+    job_id: str | None = None    # ID do job no orquestrador (gerado aqui se ausente)
+
+
+def heartbeat_loop(parar: threading.Event):
+    # Registra o agente e envia heartbeats; se o orquestrador esquecer o agente (404), registra de novo
+    registrado = False
+    while not parar.is_set():
+        try:
+            running = BACKEND.em_execucao()
+            if not registrado:
+                r = requests.post(f"{ORCH_URL}/agents/register", json={
+                    "agent_id": AGENT_ID,
+                    "url": AGENT_PUBLIC_URL,
+                    "capacity": AGENT_CAPACITY,
+                    "running": running,
+                    "labels": AGENT_LABELS
+                }, timeout=10)
+                r.raise_for_status()
+                registrado = True
+            else:
+                r = requests.post(f"{ORCH_URL}/agents/{AGENT_ID}/heartbeat",
+                                  json={"running": running}, timeout=10)
+                if r.status_code == 404:
+                    registrado = False
+                    continue
+                r.raise_for_status()
+        except Exception as e:
+            logging.warning(f"Falha no heartbeat para {ORCH_URL}: {e}")
+        parar.wait(HEARTBEAT_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    parar = threading.Event()
+    if ORCH_URL:
+        threading.Thread(target=heartbeat_loop, args=(parar,), daemon=True).start()
+    yield
+    parar.set()
+    if hasattr(BACKEND, "encerrar"):
+        BACKEND.encerrar()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.post("/run")
 def run_job(payload: JobPayload):
+    job_id = payload.job_id or uuid.uuid4().hex
+    with INICIANDO_LOCK:
+        existente = BACKEND.historico.obter(job_id)
+        if existente is not None:
+            return {**existente, "duplicate": True}
+        if job_id in INICIANDO:
+            return {"job_id": job_id, "status": "starting", "duplicate": True}
+        INICIANDO.add(job_id)
+    try:
+        return iniciar_job(job_id, payload)
+    finally:
+        with INICIANDO_LOCK:
+            INICIANDO.discard(job_id)
+
+
+def iniciar_job(job_id: str, payload: JobPayload):
     try:
         password = FERNET.decrypt(payload.cred_ciphertext.encode()).decode()
     except Exception as e:
         raise HTTPException(400, f"Credenciais inválidas/cripto: {e}")
 
+    if payload.script_b64 is not None:
+        try:
+            script_path = SCRIPTS.guardar(base64.b64decode(payload.script_b64), payload.script_sha256)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+    elif payload.script_sha256:
+        script_path = SCRIPTS.obter(payload.script_sha256)
+        if script_path is None:
+            # O orquestrador reenvia com script_b64
+            raise HTTPException(409, "script_sha256 não está no cache do agente")
+    else:
+        raise HTTPException(400, "Informe script_b64 ou script_sha256")
+
+    # Pasta temporária do job (runner/log): removida pelo backend quando o job termina
+    temporaria = payload.working_dir is None
     tmpdir = payload.working_dir or tempfile.mkdtemp(prefix="bot_job_")
-    script_path = os.path.join(tmpdir, "automation.py")
-    with open(script_path, "wb") as f:
-        f.write(base64.b64decode(payload.script_b64))
-
-    runner_cmd = create_python_runner(script_path, payload.interactive_hint)
-
-    # Importante: usar caminho absoluto do wrapper .cmd
-    ensure_task(
-        task_name=payload.task_name,
-        username=payload.username,
-        password=password,
-        command=windows_quote(runner_cmd),
-        start_in=tmpdir
-    )
-    run_task(payload.task_name)
-    return {"status": "started", "task": payload.task_name, "workdir": tmpdir}
+
+    try:
+        job = BACKEND.executar(
+            job_id=job_id,
+            task_name=payload.task_name,
+            username=payload.username,
+            password=password,
+            script_path=script_path,
+            workdir=tmpdir,
+            interactive_hint=payload.interactive_hint,
+            remover_workdir=temporaria
+        )
+    except RuntimeError as e:
+        if temporaria:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        raise HTTPException(500, str(e))
+    return {**job, "status": "started" if job["status"] == "running" else job["status"]}
+
+
+@app.get("/scripts")
+def status_scripts():
+    return SCRIPTS.estatisticas()
+
+
+@app.get("/jobs/{job_id}")
+def status_job(job_id: str):
+    job = BACKEND.status(job_id)
+    if job is None:
+        raise HTTPException(404, "Job não encontrado neste agente")
+    return job
@@ -0,0 +1,304 @@
+# backends.py
+import os
+import sys
+import time
+import shutil
+import datetime
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_JOBS_HISTORICO = int(os.getenv("AGENT_JOBS_HISTORY", "1000"))
+# Folga após o horário do gatilho ONCE antes de considerar a tarefa encerrada
+FOLGA_GATILHO = int(os.getenv("AGENT_SCHTASKS_TRIGGER_GRACE", "60"))
+# Bytes finais do log do job guardados no histórico antes de a pasta ser removida
+TAMANHO_SAIDA = int(os.getenv("AGENT_JOB_OUTPUT_BYTES", "4096"))
+
+
+def agora_iso():
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+
+def windows_quote(s: str) -> str:
+    return f'"{s}"'
+
+
+class HistoricoJobs:
+    # Jobs conhecidos pelo agente (limitado: os mais antigos finalizados saem primeiro)
+    def __init__(self, maximo: int = MAX_JOBS_HISTORICO):
+        self.maximo = maximo
+        self.jobs: OrderedDict[str, dict] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def adicionar(self, job: dict):
+        with self.lock:
+            self.jobs[job["job_id"]] = job
+            while len(self.jobs) > self.maximo:
+                antigo = next((j for j, dados in self.jobs.items()
+                               if dados["status"] not in ("queued", "running")), None)
+                if antigo is None:
+                    break
+                self.jobs.pop(antigo)
+
+    def atualizar(self, job_id: str, **campos):
+        # Toda alteração de um job publicado passa pelo lock (obter/contar iteram sob ele)
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.update(campos)
+            return job
+
+    def obter(self, job_id: str):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            # Campos com "_" são internos do backend
+            return {k: v for k, v in job.items() if not k.startswith("_")} if job else None
+
+    def contar(self, *status: str) -> int:
+        with self.lock:
+            return sum(1 for job in self.jobs.values() if job["status"] in status)
+
+
+class SchtasksBackend:
+    # Execução via Scheduled Task (Windows): roda com as credenciais do job, mesmo sem usuário logado
+    nome = "schtasks"
+
+    def __init__(self):
+        self.historico = HistoricoJobs()
+
+    def create_python_runner(self, script_path: str, interactive_hint: bool, pasta: str):
+        # Cria um wrapper .cmd para executar o Python de forma confiável
+        content = f"""@echo off
+setlocal
+REM Ajuste o caminho do Python se necessário:
+where python >nul 2>nul
+IF %ERRORLEVEL% NEQ 0 (
+  echo Python não encontrado no PATH. Ajuste o runner.cmd para apontar para o python.exe.
+  exit /b 1
+)
+python {windows_quote(script_path)} {"--interactive" if interactive_hint else ""}
+endlocal
+"""
+        # Fica na pasta do job: o script pode estar no cache compartilhado entre jobs
+        runner = os.path.join(pasta, "runner.cmd")
+        with open(runner, "w", encoding="utf-8") as f:
+            f.write(content)
+        return runner
+
+    def ensure_task(self, task_name: str, username: str, password: str, command: str, start_in: str | None):
+        # Cria/atualiza a Scheduled Task para rodar "mesmo sem usuário logado"
+        # /RL HIGHEST = privilégios elevados (se suportado)
+        # Devolve o horário (time.time()) até o qual o gatilho ONCE ainda pode disparar
+        gatilho = datetime.datetime.now() + datetime.timedelta(minutes=2)
+        args_create = [
+            "schtasks", "/Create",
+            "/TN", task_name,
+            "/TR", command,
+            "/SC", "ONCE",
+            "/ST", gatilho.strftime("%H:%M"),
+            "/RU", username,
+            "/RP", password,
+            "/RL", "HIGHEST",
+            "/F"
+        ]
+        if start_in:
+            # Agendador não tem /StartIn; usamos workdir via wrapper .cmd
+            pass
+
+        result = subprocess.run(
+            args_create, capture_output=True, text=True, shell=False)
+        if result.returncode != 0:
+            # Se já existir, alguns ambientes precisam /Change para ajustar credenciais
+            # Tenta alterar
+            args_change = [
+                "schtasks", "/Change",
+                "/TN", task_name,
+                "/RU", username,
+                "/RP", password
+            ]
+            ch = subprocess.run(args_change, capture_output=True,
+                                text=True, shell=False)
+            if ch.returncode != 0:
+                raise RuntimeError(
+                    f"Falha ao criar/alterar tarefa: {result.stderr}\n{ch.stderr}")
+        return gatilho.timestamp()
+
+    def run_task(self, task_name: str):
+        result = subprocess.run(["schtasks", "/Run", "/TN", task_name],
+                                capture_output=True, text=True, shell=False)
+        if result.returncode != 0:
+            raise RuntimeError(f"Falha ao iniciar tarefa: {result.stderr}")
+
+    def task_running(self, task_name: str) -> bool | None:
+        # Status da tarefa na saída CSV do schtasks ("Running" / "Em execução")
+        # None = consulta falhou (estado desconhecido, não significa que terminou)
+        result = subprocess.run(["schtasks", "/Query", "/TN", task_name, "/FO", "CSV", "/NH"],
+                                capture_output=True, text=True, shell=False)
+        if result.returncode != 0 or not result.stdout.strip():
+            return None
+        status = result.stdout.strip().rsplit(",", 1)[-1].strip('"').lower()
+        return status in ("running", "em execução", "em execucao")
+
+    def executar(self, job_id: str, task_name: str, username: str, password: str,
+                 script_path: str, workdir: str, interactive_hint: bool, remover_workdir: bool = False):
+        inicio = time.perf_counter()
+        runner_cmd = self.create_python_runner(script_path, interactive_hint, workdir)
+
+        # Importante: usar caminho absoluto do wrapper .cmd
+        gatilho = self.ensure_task(
+            task_name=task_name,
+            username=username,
+            password=password,
+            command=windows_quote(runner_cmd),
+            start_in=workdir
+        )
+        self.run_task(task_name)
+
+        job = {
+            "job_id": job_id,
+            "backend": self.nome,
+            "task": task_name,
+            "workdir": workdir,
+            "status": "running",
+            "started_at": agora_iso(),
+            "finished_at": None,
+            "start_latency_ms": round((time.perf_counter() - inicio) * 1000, 1),
+            # O agendador não informa o fim nem o código de saída do processo
+            "exit_code": None,
+            "duration_ms": None,
+            "_remover_workdir": remover_workdir,
+            # O gatilho ONCE ainda executa o runner.cmd: a pasta fica até ele passar
+            "_gatilho_ate": gatilho + FOLGA_GATILHO,
+            "_visto_rodando": False,
+        }
+        self.historico.adicionar(job)
+        return self.status(job_id)
+
+    def _atualizar(self):
+        with self.historico.lock:
+            rodando = [(job["job_id"], job["task"]) for job in self.historico.jobs.values()
+                       if job["status"] == "running"]
+        # A consulta ao schtasks fica fora do lock; só a alteração do job fica dentro
+        for job_id, task in rodando:
+            executando = self.task_running(task)
+            if executando is None:
+                continue
+            remover = None
+            with self.historico.lock:
+                job = self.historico.jobs.get(job_id)
+                if job is None or job["status"] != "running":
+                    continue
+                if executando:
+                    job["_visto_rodando"] = True
+                    continue
+                if time.time() < job["_gatilho_ate"]:
+                    continue
+                job["status"] = "finished"
+                job["finished_at"] = agora_iso()
+                # Sem ter visto Running -> parado não há garantia de que o runner já rodou
+                if job["_remover_workdir"] and job["_visto_rodando"]:
+                    job["_remover_workdir"] = False
+                    remover = job["workdir"]
+            if remover:
+                shutil.rmtree(remover, ignore_errors=True)
+
+    def status(self, job_id: str):
+        self._atualizar()
+        return self.historico.obter(job_id)
+
+    def em_execucao(self) -> int:
+        self._atualizar()
+        return self.historico.contar("running")
+
+
+class ProcessPoolBackend:
+    """
+    Execução direta em subprocessos do próprio agente (Windows ou Linux), com
+    limite de concorrência: jobs além do limite ficam na fila do agente.
+    O script roda com o usuário do agente (as credenciais do job não são usadas).
+    """
+    nome = "subprocess"
+
+    def __init__(self, max_workers: int, python: str = sys.executable):
+        self.max_workers = max_workers
+        self.python = python
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.historico = HistoricoJobs()
+
+    def _rodar(self, job_id: str, enfileirado: float, comando: list[str], workdir: str,
+               remover_workdir: bool):
+        inicio = time.perf_counter()
+        self.historico.atualizar(job_id, status="running", started_at=agora_iso(),
+                                 start_latency_ms=round((inicio - enfileirado) * 1000, 1))
+        log_path = os.path.join(workdir, "job.log")
+        fim = {}
+        try:
+            with open(log_path, "wb") as log:
+                processo = subprocess.Popen(comando, cwd=workdir, stdout=log,
+                                            stderr=subprocess.STDOUT, shell=False)
+                self.historico.atualizar(job_id, pid=processo.pid)
+                fim["exit_code"] = processo.wait()
+            fim["status"] = "succeeded" if fim["exit_code"] == 0 else "failed"
+        except Exception as e:
+            fim["status"] = "failed"
+            fim["error"] = f"Falha ao iniciar processo: {e}"
+        fim["duration_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+        fim["finished_at"] = agora_iso()
+
+        if remover_workdir:
+            # Só o final do log sobrevive à pasta do job
+            try:
+                with open(log_path, "rb") as log:
+                    log.seek(max(0, os.path.getsize(log_path) - TAMANHO_SAIDA))
+                    fim["output"] = log.read().decode("utf-8", errors="replace")
+            except OSError:
+                pass
+            fim["log"] = None
+        self.historico.atualizar(job_id, **fim)
+        if remover_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def executar(self, job_id: str, task_name: str, username: str, password: str,
+                 script_path: str, workdir: str, interactive_hint: bool, remover_workdir: bool = False):
+        comando = [self.python, script_path] + (["--interactive"] if interactive_hint else [])
+        job = {
+            "job_id": job_id,
+            "backend": self.nome,
+            "task": task_name,
+            "workdir": workdir,
+            "status": "queued",
+            "pid": None,
+            "started_at": None,
+            "finished_at": None,
+            "start_latency_ms": None,
+            "exit_code": None,
+            "duration_ms": None,
+            "error": None,
+            "log": os.path.join(workdir, "job.log"),
+            "output": None,
+        }
+        self.historico.adicionar(job)
+        self.executor.submit(self._rodar, job_id, time.perf_counter(), comando, workdir,
+                             remover_workdir)
+        return self.status(job_id)
+
+    def status(self, job_id: str):
+        return self.historico.obter(job_id)
+
+    def em_execucao(self) -> int:
+        # Jobs na fila também contam como carga para o orquestrador
+        return self.historico.contar("queued", "running")
+
+    def encerrar(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def criar_backend(nome: str | None = None, max_workers: int = 1):
+    # AGENT_BACKEND: "schtasks" (padrão no Windows) ou "subprocess" (padrão nos demais)
+    nome = nome or os.getenv("AGENT_BACKEND") or ("schtasks" if os.name == "nt" else "subprocess")
+    if nome == "schtasks":
+        return SchtasksBackend()
+    if nome == "subprocess":
+        return ProcessPoolBackend(max_workers)
+    raise ValueError(f"Backend de execução desconhecido: {nome}")
@@ -0,0 +1,97 @@
+# cache_scripts.py
+import os
+import time
+import hashlib
+import tempfile
+import threading
+
+
+def sha256_hex(conteudo: bytes) -> str:
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+class CacheScripts:
+    # Scripts guardados pelo hash SHA-256 do conteúdo: <pasta>/<sha>/automation.py
+    # Limitado por tamanho e quantidade; sai primeiro o usado há mais tempo (mtime)
+
+    def __init__(self, pasta: str, max_bytes: int, max_itens: int, idade_protegida: float = 600):
+        self.pasta = pasta
+        self.max_bytes = max_bytes
+        self.max_itens = max_itens
+        # Scripts usados há menos que isso não são removidos (jobs na fila ainda vão abri-los)
+        self.idade_protegida = idade_protegida
+        self.lock = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminho(self, sha: str) -> str:
+        return os.path.join(self.pasta, sha, "automation.py")
+
+    def obter(self, sha: str) -> str | None:
+        # Caminho do script em cache (ou None); marca como usado agora
+        if len(sha) != 64 or not all(c in "0123456789abcdef" for c in sha):
+            return None
+        caminho = self._caminho(sha)
+        with self.lock:
+            try:
+                os.utime(caminho)
+            except FileNotFoundError:
+                return None
+        return caminho
+
+    def guardar(self, conteudo: bytes, sha: str | None = None) -> str:
+        # Grava o script (se ainda não existir) e devolve o caminho em cache
+        calculado = sha256_hex(conteudo)
+        if sha and sha != calculado:
+            raise ValueError(f"script_sha256 não confere com o conteúdo ({calculado})")
+
+        caminho = self.obter(calculado)
+        if caminho:
+            return caminho
+
+        caminho = self._caminho(calculado)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(conteudo)
+        os.replace(temporario, caminho)
+        self.despejar()
+        return caminho
+
+    def itens(self):
+        # [(mtime, bytes, sha)] dos scripts em cache
+        itens = []
+        for sha in os.listdir(self.pasta):
+            try:
+                st = os.stat(self._caminho(sha))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            itens.append((st.st_mtime, st.st_size, sha))
+        return itens
+
+    def despejar(self):
+        with self.lock:
+            itens = sorted(self.itens())
+            total = sum(tamanho for _, tamanho, _ in itens)
+            restantes = len(itens)
+            limite_idade = time.time() - self.idade_protegida
+            for mtime, tamanho, sha in itens:
+                if total <= self.max_bytes and restantes <= self.max_itens:
+                    break
+                if mtime >= limite_idade:
+                    break
+                pasta_sha = os.path.dirname(self._caminho(sha))
+                for nome in os.listdir(pasta_sha):
+                    os.remove(os.path.join(pasta_sha, nome))
+                os.rmdir(pasta_sha)
+                total -= tamanho
+                restantes -= 1
+
+    def estatisticas(self):
+        itens = self.itens()
+        return {
+            "pasta": self.pasta,
+            "itens": len(itens),
+            "bytes": sum(tamanho for _, tamanho, _ in itens),
+            "max_itens": self.max_itens,
+            "max_bytes": self.max_bytes
+        }
@@ -1,4 +1,5 @@
 # send_job.py
+import time
 import requests
 import pathlib
 
@@ -11,7 +12,7 @@ password = "020406"
 script_text = pathlib.Path("automation_example.py").read_text(encoding="utf-8")
 
 payload = {
-    "agent_url": AGENT_URL,
+    "agent_url": AGENT_URL,  # omita para o orquestrador escolher o agente menos carregado
     "task_name": "DemoBot_Run",
     "username": username,
     "password": password,
@@ -21,3 +22,12 @@ payload = {
 
 r = requests.post(f"{ORCH_URL}/dispatch", json=payload, timeout=30)
 print(r.status_code, r.json())
+
+# /dispatch só enfileira: acompanha o job até o agente confirmar (ou falhar)
+job_id = r.json()["job_id"]
+while True:
+    job = requests.get(f"{ORCH_URL}/jobs/{job_id}", timeout=10).json()
+    if job["status"] in ("dispatched", "failed"):
+        print(job)
+        break
+    time.sleep(1)
@@ -1,18 +1,211 @@
 # orchestrator.py
 import os
+import time
+import uuid
 import base64
-import requests
+import hashlib
+import asyncio
+import httpx
 import datetime
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from cryptography.fernet import Fernet
 
-app = FastAPI()
 FERNET = Fernet(os.environ["ORCH_FERNET_KEY"])
 
+# Fila de despacho: /dispatch só enfileira; os workers entregam aos agentes
+DISPATCH_WORKERS = int(os.getenv("ORCH_DISPATCH_WORKERS", "8"))
+DISPATCH_RETRIES = int(os.getenv("ORCH_DISPATCH_RETRIES", "2"))
+QUEUE_MAX = int(os.getenv("ORCH_QUEUE_MAX", "10000"))
+JOB_TTL = int(os.getenv("ORCH_JOB_TTL", "3600"))  # segundos que um job finalizado fica consultável
+
+# Cliente HTTP por agente: conexões keep-alive reaproveitadas entre jobs
+AGENT_CONNECT_TIMEOUT = float(os.getenv("ORCH_AGENT_CONNECT_TIMEOUT", "5"))
+AGENT_READ_TIMEOUT = float(os.getenv("ORCH_AGENT_READ_TIMEOUT", "30"))
+AGENT_POOL_TIMEOUT = float(os.getenv("ORCH_AGENT_POOL_TIMEOUT", "10"))
+AGENT_MAX_CONN = int(os.getenv("ORCH_AGENT_MAX_CONN", "10"))
+AGENT_KEEPALIVE = float(os.getenv("ORCH_AGENT_KEEPALIVE", "30"))
+
+# Registro de agentes: sem heartbeat há mais de AGENT_TTL segundos = fora do ar
+AGENT_TTL = float(os.getenv("ORCH_AGENT_TTL", "30"))
+
+# Hashes de script que cada agente já recebeu (por URL, limitado por agente)
+SCRIPTS_POR_AGENTE_MAX = int(os.getenv("ORCH_SCRIPTS_PER_AGENT", "500"))
+
+JOBS: dict[str, dict] = {}
+FILA: asyncio.Queue | None = None
+CLIENTES: dict[str, httpx.AsyncClient] = {}
+AGENTES: dict[str, dict] = {}
+SCRIPTS_CONHECIDOS: dict[str, OrderedDict] = {}
+STATUS_FINAIS = ("dispatched", "failed")
+
+# POST /run não é idempotente: só repete quando a requisição não chegou ao agente
+ERROS_REPETIVEIS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def agora_iso():
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+
+def cliente_do_agente(agent_url: str) -> httpx.AsyncClient:
+    # Um pool de conexões por agente: um agente lento não esgota o pool dos outros
+    base_url = agent_url.rstrip("/")
+    cliente = CLIENTES.get(base_url)
+    if cliente is None:
+        cliente = CLIENTES[base_url] = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(
+                connect=AGENT_CONNECT_TIMEOUT,
+                read=AGENT_READ_TIMEOUT,
+                write=AGENT_READ_TIMEOUT,
+                pool=AGENT_POOL_TIMEOUT
+            ),
+            limits=httpx.Limits(
+                max_connections=AGENT_MAX_CONN,
+                max_keepalive_connections=AGENT_MAX_CONN,
+                keepalive_expiry=AGENT_KEEPALIVE
+            )
+        )
+    return cliente
+
+
+async def entregar_ao_agente(agent_url: str, payload: dict):
+    # Script já conhecido pelo agente: manda só o hash; 409 = saiu do cache, reenvia completo
+    cliente = cliente_do_agente(agent_url)
+    sha = payload["script_sha256"]
+    conhecidos = SCRIPTS_CONHECIDOS.setdefault(str(cliente.base_url), OrderedDict())
+
+    if sha in conhecidos:
+        r = await cliente.post("/run", json={k: v for k, v in payload.items() if k != "script_b64"})
+        if r.status_code != 409:
+            r.raise_for_status()
+            conhecidos.move_to_end(sha)
+            return r.json()
+        conhecidos.pop(sha, None)
+
+    r = await cliente.post("/run", json=payload)
+    r.raise_for_status()
+    conhecidos[sha] = True
+    while len(conhecidos) > SCRIPTS_POR_AGENTE_MAX:
+        conhecidos.popitem(last=False)
+    return r.json()
+
+
+def agente_saudavel(agente: dict) -> bool:
+    return time.time() - agente["last_heartbeat"] <= AGENT_TTL
+
+
+def agente_publico(agente: dict):
+    return {
+        **agente,
+        "healthy": agente_saudavel(agente),
+        "load": agente["running"] / agente["capacity"] if agente["capacity"] else 1.0
+    }
+
+
+def escolher_agente(labels: list[str], excluir: set[str] = frozenset()):
+    # Agente saudável menos carregado (running/capacity) que tenha todos os labels pedidos
+    candidatos = [
+        a for a in AGENTES.values()
+        if agente_saudavel(a) and set(labels) <= set(a["labels"]) and a["agent_id"] not in excluir
+    ]
+    if not candidatos:
+        return None
+    # Agentes com vaga primeiro; empate decidido pelo que recebeu job há mais tempo
+    return min(candidatos, key=lambda a: (a["running"] >= a["capacity"],
+                                          a["running"] / a["capacity"] if a["capacity"] else 1.0,
+                                          a["last_assigned"]))
+
+
+async def dispatcher(numero: int):
+    # Consome a fila e entrega cada job ao agente, com retry e backoff
+    while True:
+        job_id = await FILA.get()
+        job = JOBS.get(job_id)
+        try:
+            if job is None:
+                continue
+
+            job["status"] = "dispatching"
+            payload = job.pop("_payload")
+            agendado = job.pop("_agendado")
+            falharam = set()
+            for tentativa in range(DISPATCH_RETRIES + 1):
+                job["attempts"] = tentativa + 1
+                agente = None
+                if agendado:
+                    # Escolhido a cada tentativa: um agente que falhou não é repetido
+                    agente = escolher_agente(job["labels"], falharam) or escolher_agente(job["labels"])
+                    if agente is None:
+                        job["error"] = "Nenhum agente saudável disponível"
+                        if tentativa < DISPATCH_RETRIES:
+                            await asyncio.sleep(0.5 * (2 ** tentativa))
+                        continue
+                    job["agent_id"] = agente["agent_id"]
+                    job["agent_url"] = agente["url"]
+                    # Reserva a vaga até o próximo heartbeat trazer a contagem real
+                    agente["running"] += 1
+                    agente["last_assigned"] = time.time()
+                try:
+                    job["agent_response"] = await entregar_ao_agente(job["agent_url"], payload)
+                    job["status"] = "dispatched"
+                    job["dispatched_at"] = agora_iso()
+                    job["error"] = None
+                    break
+                except ERROS_REPETIVEIS as e:
+                    job["error"] = f"Falha ao contatar agente: {e}"
+                    if agente is not None:
+                        agente["running"] = max(0, agente["running"] - 1)
+                        falharam.add(agente["agent_id"])
+                    if tentativa < DISPATCH_RETRIES:
+                        await asyncio.sleep(0.5 * (2 ** tentativa))
+                except Exception as e:
+                    # Timeout de leitura, 5xx...: o agente pode já ter iniciado o job
+                    job["error"] = f"Falha ao contatar agente: {e}"
+                    job["status"] = "failed"
+                    break
+            else:
+                job["status"] = "failed"
+
+            job["finished_at"] = time.time()
+        finally:
+            FILA.task_done()
+
+
+async def limpar_jobs_antigos():
+    # Remove jobs finalizados há mais de JOB_TTL segundos (memória limitada)
+    while True:
+        await asyncio.sleep(60)
+        limite = time.time() - JOB_TTL
+        for job_id in [j for j, job in JOBS.items()
+                       if job["status"] in STATUS_FINAIS and job.get("finished_at", time.time()) < limite]:
+            JOBS.pop(job_id, None)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global FILA
+    FILA = asyncio.Queue(maxsize=QUEUE_MAX)
+    tarefas = [asyncio.create_task(dispatcher(n)) for n in range(DISPATCH_WORKERS)]
+    tarefas.append(asyncio.create_task(limpar_jobs_antigos()))
+    yield
+    for tarefa in tarefas:
+        tarefa.cancel()
+    await asyncio.gather(*tarefas, return_exceptions=True)
+    await asyncio.gather(*(cliente.aclose() for cliente in CLIENTES.values()), return_exceptions=True)
+    CLIENTES.clear()
+    SCRIPTS_CONHECIDOS.clear()
+
+
+app = FastAPI(lifespan=lifespan)
+
 
 class DispatchReq(BaseModel):
-    agent_url: str                 # ex: "http://AGENTE:5001"
+    # ex: "http://AGENTE:5001"; omitido = orquestrador escolhe o agente menos carregado
+    agent_url: str | None = None
+    labels: list[str] = []         # exigidos do agente quando agent_url é omitido
     task_name: str                 # nome da Scheduled Task no agente
     username: str                  # DOMINIO\usuario
     # senha em texto (será criptografada para trânsito)
@@ -21,24 +214,128 @@ class DispatchReq(BaseModel):
     interactive_hint: bool = False  # tenta UI se houver sessão
 
 
-@app.post("/dispatch")
-def dispatch(req: DispatchReq):
+class AgentRegisterReq(BaseModel):
+    agent_id: str
+    url: str                       # URL pela qual o orquestrador alcança o agente
+    capacity: int = 1              # jobs simultâneos suportados
+    running: int = 0
+    labels: list[str] = []
+
+
+class HeartbeatReq(BaseModel):
+    running: int
+    capacity: int | None = None
+    labels: list[str] | None = None
+
+
+def job_publico(job: dict):
+    return {k: v for k, v in job.items() if not k.startswith("_")}
+
+
+@app.post("/agents/register")
+async def registrar_agente(req: AgentRegisterReq):
+    anterior = AGENTES.get(req.agent_id, {})
+    AGENTES[req.agent_id] = {
+        "agent_id": req.agent_id,
+        "url": req.url.rstrip("/"),
+        "capacity": max(1, req.capacity),
+        "running": req.running,
+        "labels": req.labels,
+        "registered_at": anterior.get("registered_at", agora_iso()),
+        "last_heartbeat": time.time(),
+        "last_assigned": anterior.get("last_assigned", 0.0),
+    }
+    return agente_publico(AGENTES[req.agent_id])
+
+
+@app.post("/agents/{agent_id}/heartbeat")
+async def heartbeat_agente(agent_id: str, req: HeartbeatReq):
+    agente = AGENTES.get(agent_id)
+    if agente is None:
+        # Orquestrador reiniciado: o agente deve se registrar de novo
+        raise HTTPException(404, "Agente não registrado")
+    agente["running"] = req.running
+    if req.capacity is not None:
+        agente["capacity"] = max(1, req.capacity)
+    if req.labels is not None:
+        agente["labels"] = req.labels
+    agente["last_heartbeat"] = time.time()
+    return agente_publico(agente)
+
+
+@app.get("/agents")
+async def listar_agentes(healthy: bool | None = None):
+    agentes = [agente_publico(a) for a in AGENTES.values()]
+    if healthy is not None:
+        agentes = [a for a in agentes if a["healthy"] == healthy]
+    return {"total": len(agentes), "agents": agentes}
+
+
+@app.delete("/agents/{agent_id}")
+async def remover_agente(agent_id: str):
+    if AGENTES.pop(agent_id, None) is None:
+        raise HTTPException(404, "Agente não registrado")
+    return {"agent_id": agent_id, "removed": True}
+
+
+@app.post("/dispatch", status_code=202)
+async def dispatch(req: DispatchReq):
     try:
         cipher = FERNET.encrypt(req.password.encode()).decode()
     except Exception as e:
         raise HTTPException(400, f"Erro criptografando senha: {e}")
 
+    script = req.script_text.encode()
     payload = {
         "task_name": req.task_name,
         "username": req.username,
         "cred_ciphertext": cipher,
-        "script_b64": base64.b64encode(req.script_text.encode()).decode(),
+        "script_b64": base64.b64encode(script).decode(),
+        "script_sha256": hashlib.sha256(script).hexdigest(),
         "working_dir": None,
         "interactive_hint": req.interactive_hint
     }
+
+    agendado = req.agent_url is None
+    if agendado and escolher_agente(req.labels) is None:
+        raise HTTPException(503, f"Nenhum agente saudável com os labels {req.labels}")
+
+    job_id = uuid.uuid4().hex
+    payload["job_id"] = job_id
+    JOBS[job_id] = {
+        "job_id": job_id,
+        "status": "queued",
+        "task_name": req.task_name,
+        "agent_id": None,
+        "agent_url": req.agent_url,
+        "labels": req.labels,
+        "created_at": agora_iso(),
+        "dispatched_at": None,
+        "attempts": 0,
+        "agent_response": None,
+        "error": None,
+        "_payload": payload,
+        "_agendado": agendado,
+    }
+
     try:
-        r = requests.post(f"{req.agent_url}/run", json=payload, timeout=30)
-        r.raise_for_status()
-        return {"dispatched_at": datetime.datetime.utcnow().isoformat()+"Z", "agent_response": r.json()}
-    except Exception as e:
-        raise HTTPException(502, f"Falha ao contatar agente: {e}")
+        FILA.put_nowait(job_id)
+    except asyncio.QueueFull:
+        JOBS.pop(job_id, None)
+        raise HTTPException(503, "Fila de despacho cheia, tente novamente")
+
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+async def status_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job não encontrado (inexistente ou expirado)")
+    return job_publico(job)
+
+
+@app.get("/jobs")
+async def listar_jobs(status: str | None = None, limit: int = 100):
+    jobs = [job_publico(j) for j in JOBS.values() if status is None or j["status"] == status]
+    return {"total": len(jobs), "fila": FILA.qsize(), "jobs": jobs[-limit:]}
@@ -0,0 +1,381 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from lib_api_qive import QiveAPI
+from lib_mock_arquivei import ConfigMock, DadosMock, ServidorMockArquivei
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    from lib_async_qive import AsyncQiveAPI
+except ImportError:  # httpx não instalado
+    AsyncQiveAPI = None
+
+
+
+CENARIOS = [
+    "paginacao",
+    "paginacao-paralela",
+    "cancelamento-nfse",
+    "cancelamento-nfe",
+    "processar-nfse",
+    "processar-nfe",
+    "processar-nfe-lote",
+    "arquivar-xml-nfse",
+    "arquivar-xml-nfe",
+    "processar-nfse-async",
+    "processar-nfe-async",
+]
+
+
+def _servir_mock(opcoes, fila):
+    """Processo filho: sobe o mock e fica servindo até ser encerrado"""
+    mock = ServidorMockArquivei(ConfigMock(**opcoes))
+    fila.put(mock.iniciar())
+    threading.Event().wait()
+
+
+class MockEmProcesso:
+    """
+    Roda o ServidorMockArquivei em outro processo, para que CPU e memória
+    do servidor não contaminem as medições do cliente
+    """
+
+    def __init__(self, opcoes):
+        self.opcoes = opcoes
+        self.processo = None
+        self.base_url = None
+
+
+    def __enter__(self):
+        fila = multiprocessing.Queue()
+        self.processo = multiprocessing.Process(target=_servir_mock, args=(self.opcoes, fila), daemon=True)
+        self.processo.start()
+        self.base_url = fila.get(timeout=60)
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.processo.terminate()
+        self.processo.join()
+
+
+class MedidorMemoria:
+    """
+    Pico de RSS durante um trecho: com psutil amostra o RSS do processo em
+    uma thread; sem psutil usa resource.getrusage (pico desde o início do processo)
+    """
+
+    def __init__(self, intervalo=0.02):
+        self.intervalo = intervalo
+        self.pico = 0
+        self._parar = threading.Event()
+        self._thread = None
+
+
+    @staticmethod
+    def rss_atual():
+        if psutil is not None:
+            return psutil.Process().memory_info().rss
+        if resource is not None:
+            pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return pico if sys.platform == "darwin" else pico * 1024
+        return 0
+
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, self.rss_atual())
+
+
+    def __enter__(self):
+        self.pico = self.rss_atual()
+        if psutil is not None:
+            self._thread = threading.Thread(target=self._amostrar, daemon=True)
+            self._thread.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.pico = max(self.pico, self.rss_atual())
+
+
+def _periodo(config):
+    inicio = date.fromisoformat(config.data_inicial)
+    return config.data_inicial, (inicio + timedelta(days=config.dias)).isoformat()
+
+
+def _falhou(resultado):
+    """Resultado de processar_* sem documento ou ATIVA sem PDF/XML"""
+    if resultado is None:
+        return True
+    return resultado.get("status") == "ATIVA" and not (resultado.get("pdf") and resultado.get("xml"))
+
+
+def executar_cenario(nome, qive, config, dados, args, pasta):
+    """
+    Executa um cenário e retorna (documentos processados, documentos com erro)
+    """
+    cnpj = "44555666000199"
+    created_from, created_to = _periodo(config)
+    ids_nfse = dados.ids_nfse[:args.documentos]
+    chaves_nfe = dados.chaves_nfe[:args.documentos]
+
+    if nome == "paginacao":
+        notas = qive.buscar_nfse_todas_notas_paginado(cnpj, created_from, created_to)
+        return len(notas), 0 if notas.completa else 1
+
+    if nome == "paginacao-paralela":
+        notas = qive.buscar_nfse_paralelo(
+            cnpj, created_from, created_to, dias_por_janela=args.dias_por_janela, max_workers=args.workers
+        )
+        return len(notas), 0 if notas.completa else 1
+
+    if nome == "cancelamento-nfse":
+        canceladas = qive.buscar_nfse_canceladas_em_lote(ids_nfse)
+        return len(ids_nfse), len(ids_nfse) if canceladas is None else 0
+
+    if nome == "cancelamento-nfe":
+        canceladas = qive.buscar_nfe_canceladas_em_lote(chaves_nfe)
+        return len(chaves_nfe), len(chaves_nfe) if canceladas is None else 0
+
+    if nome == "processar-nfse":
+        numeros = [str(i + 1) for i in range(min(args.documentos_processar, config.total_nfse))]
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            resultados = list(executor.map(
+                lambda numero: qive.processar_nfse_por_numero(
+                    numero, cnpj, created_from, created_to,
+                    pasta_pdf=os.path.join(pasta, "pdf"), pasta_xml=os.path.join(pasta, "xml")
+                ),
+                numeros
+            ))
+        return len(numeros), sum(1 for r in resultados if _falhou(r))
+
+    if nome == "processar-nfe":
+        chaves = chaves_nfe[:args.documentos_processar]
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            resultados = list(executor.map(
+                lambda chave: qive.processar_nfe_por_chave(
+                    chave, pasta_pdf=os.path.join(pasta, "pdf"), pasta_xml=os.path.join(pasta, "xml")
+                ),
+                chaves
+            ))
+        return len(chaves), sum(1 for r in resultados if _falhou(r))
+
+    if nome == "processar-nfe-lote":
+        resultados = qive.processar_nfe_lote(
+            chaves_nfe,
+            pasta_pdf=os.path.join(pasta, "pdf"),
+            pasta_xml=os.path.join(pasta, "xml"),
+            max_workers=args.workers,
+            caminho_manifesto=os.path.join(pasta, "resultado.jsonl")
+        )
+        if resultados is None:
+            return len(chaves_nfe), len(chaves_nfe)
+        return len(resultados), sum(1 for r in resultados if r.get("status") == "ERRO")
+
+    if nome in ("arquivar-xml-nfse", "arquivar-xml-nfe"):
+        documento = nome.rsplit("-", 1)[1]
+        resumo = qive.baixar_xmls_periodo(
+            documento, cnpj, created_from, created_to, pasta=os.path.join(pasta, "xml")
+        )
+        esperado = config.total_nfse if documento == "nfse" else config.total_nfe
+        erros = resumo["erros"] + (0 if resumo["completa"] else 1) + abs(esperado - resumo["total"])
+        return resumo["total"], erros
+
+    raise ValueError(f"Cenário desconhecido: {nome}")
+
+
+async def executar_cenario_async(nome, qive, config, dados, args, pasta):
+    """Mesmo que executar_cenario, para os cenários da AsyncQiveAPI"""
+    cnpj = "44555666000199"
+    created_from, created_to = _periodo(config)
+
+    if nome == "processar-nfse-async":
+        numeros = [str(i + 1) for i in range(min(args.documentos_processar, config.total_nfse))]
+        resultados = await asyncio.gather(*(
+            qive.processar_nfse_por_numero(
+                numero, cnpj, created_from, created_to,
+                pasta_pdf=os.path.join(pasta, "pdf"), pasta_xml=os.path.join(pasta, "xml")
+            )
+            for numero in numeros
+        ))
+        return len(numeros), sum(1 for r in resultados if _falhou(r))
+
+    if nome == "processar-nfe-async":
+        chaves = dados.chaves_nfe[:args.documentos_processar]
+        resultados = await qive.processar_nfe_varias_chaves(
+            chaves, pasta_pdf=os.path.join(pasta, "pdf"), pasta_xml=os.path.join(pasta, "xml")
+        )
+        return len(chaves), sum(1 for r in resultados if _falhou(r))
+
+    raise ValueError(f"Cenário desconhecido: {nome}")
+
+
+async def _medir_async(nome, base_url, config, dados, args, pasta):
+    async with AsyncQiveAPI(
+        "bench", "bench",
+        base_url=base_url,
+        max_concurrency=args.workers,
+        pool_size=max(10, args.workers * 2),
+        requisicoes_por_segundo=args.rps,
+        backoff_factor=0.05
+    ) as qive:
+        documentos, erros = await executar_cenario_async(nome, qive, config, dados, args, pasta)
+    return qive, documentos, erros
+
+
+def medir(nome, base_url, config, dados, args):
+    """Roda um cenário em uma QiveAPI nova e devolve o relatório dele"""
+    pasta = tempfile.mkdtemp(prefix=f"bench_{nome}_")
+
+    if nome.endswith("-async"):
+        if AsyncQiveAPI is None:
+            raise RuntimeError(f"O cenário {nome} requer o pacote httpx")
+        try:
+            with MedidorMemoria() as memoria:
+                inicio = time.perf_counter()
+                qive, documentos, erros = asyncio.run(_medir_async(nome, base_url, config, dados, args, pasta))
+                duracao = time.perf_counter() - inicio
+        finally:
+            shutil.rmtree(pasta, ignore_errors=True)
+    else:
+        qive = QiveAPI(
+            "bench", "bench",
+            base_url=base_url,
+            pool_size=max(10, args.workers * 2),
+            requisicoes_por_segundo=args.rps,
+            backoff_factor=0.05
+        )
+        try:
+            with MedidorMemoria() as memoria:
+                inicio = time.perf_counter()
+                documentos, erros = executar_cenario(nome, qive, config, dados, args, pasta)
+                duracao = time.perf_counter() - inicio
+        finally:
+            qive.close()
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    endpoints = qive.metricas.snapshot()["endpoints"]
+    return {
+        "cenario": nome,
+        "documentos": documentos,
+        "erros": erros,
+        "duracao": round(duracao, 3),
+        "docs_por_segundo": round(documentos / duracao, 1) if duracao else None,
+        "pico_rss_mb": round(memoria.pico / (1024 * 1024), 1),
+        "requisicoes": sum(m["requisicoes"] for m in endpoints.values()),
+        "retries": sum(m["retries"] for m in endpoints.values()),
+        "endpoints": {
+            endpoint: {
+                "requisicoes": m["requisicoes"],
+                "latencia_media": m["latencia"]["media"],
+                "bytes_recebidos": m["bytes_recebidos"],
+                "fases": m["fases"],
+            }
+            for endpoint, m in endpoints.items()
+        },
+    }
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Benchmark da QiveAPI contra um mock local da Arquivei")
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS, default=CENARIOS)
+    parser.add_argument("--base-url", help="Usa um mock já em execução em vez de subir um novo")
+    parser.add_argument("--notas", type=int, default=2000, help="NFS-e geradas pelo mock")
+    parser.add_argument("--nfe", type=int, default=2000, help="NF-e geradas pelo mock")
+    parser.add_argument("--dias", type=int, default=30, help="Dias de recebimento cobertos pelas NFS-e")
+    parser.add_argument("--documentos", type=int, default=1000, help="IDs/chaves nos cenários de cancelamento e lote")
+    parser.add_argument("--documentos-processar", type=int, default=50, help="Documentos nos cenários processar-*")
+    parser.add_argument("--limite-pagina", type=int, default=50)
+    parser.add_argument("--latencia", type=float, default=0.02, help="Latência fixa (s) de cada resposta")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Latência aleatória adicional (s)")
+    parser.add_argument("--latencia-documento", type=float, default=0.05, help="Atraso extra (s) de DANFE/DANFSe")
+    parser.add_argument("--tamanho-pdf", type=int, default=200 * 1024)
+    parser.add_argument("--tamanho-xml", type=int, default=20 * 1024)
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="Probabilidade de HTTP 500")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="Probabilidade de HTTP 429")
+    parser.add_argument("--modelo-nfse", help="Nota JSON gravada da API real usada como modelo")
+    parser.add_argument("--modelo-pdf", help="PDF gravado servido no lugar do sintético")
+    parser.add_argument("--workers", "-w", type=int, default=8)
+    parser.add_argument("--dias-por-janela", type=int, default=7)
+    parser.add_argument("--rps", type=float, default=1000.0, help="Orçamento do rate limiter do cliente")
+    parser.add_argument("--saida", "-o", help="Grava o relatório JSON neste arquivo")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Mantém os logs INFO da QiveAPI")
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    opcoes = {
+        "total_nfse": args.notas,
+        "total_nfe": args.nfe,
+        "dias": args.dias,
+        "limite_pagina": args.limite_pagina,
+        "latencia": args.latencia,
+        "jitter": args.jitter,
+        "latencia_documento": args.latencia_documento,
+        "tamanho_pdf": args.tamanho_pdf,
+        "tamanho_xml": args.tamanho_xml,
+        "taxa_erro": args.taxa_erro,
+        "taxa_429": args.taxa_429,
+        "modelo_nfse": args.modelo_nfse,
+        "modelo_pdf": args.modelo_pdf,
+    }
+    config = ConfigMock(**opcoes)
+    dados = DadosMock(config)
+
+    relatorio = {"config": config.como_dict(), "workers": args.workers, "psutil": psutil is not None, "cenarios": []}
+
+    def rodar(base_url):
+        for nome in args.cenarios:
+            resultado = medir(nome, base_url, config, dados, args)
+            relatorio["cenarios"].append(resultado)
+            print(
+                f"{nome:<20} {resultado['documentos']:>7} docs  {resultado['duracao']:>8.2f}s  "
+                f"{resultado['docs_por_segundo'] or 0:>9.1f} docs/s  {resultado['pico_rss_mb']:>7.1f} MB  "
+                f"{resultado['requisicoes']:>6} req  {resultado['retries']:>4} retries  {resultado['erros']} erro(s)"
+            )
+
+    if args.base_url:
+        rodar(args.base_url)
+    else:
+        with MockEmProcesso(opcoes) as mock:
+            rodar(mock.base_url)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+    return 1 if any(c["erros"] for c in relatorio["cenarios"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
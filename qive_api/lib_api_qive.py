@@ -2,25 +2,301 @@ import os
 import requests
 import json
 import base64
+import hashlib
 import logging
 import time
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from lib_rate_limiter import RateLimiter, interpretar_retry_after
+from lib_stream_qive import salvar_campo_base64
+from lib_checkpoint_qive import EstadoVarredura, ResultadoVarredura, CheckpointVarredura
+from lib_metricas_qive import MetricasQive, endpoint_da_url
+from lib_log_qive import com_correlacao
+from lib_colunar_qive import converter_numero
+
+
+
+def dividir_em_lotes(valores, nome_param, tamanho_max_query=6000, max_por_lote=None):
+    """
+    Divide uma lista de valores em lotes que caibam em uma query string
+
+    Cada valor ocupa aproximadamente len(nome_param) + len(valor) + 2 caracteres
+    (nome[]=valor&); o lote é fechado quando o próximo valor estouraria o limite.
+
+    Args:
+        valores: Lista de valores (ex: IDs de NFS-e)
+        nome_param: Nome do parâmetro repetido (ex: "id[]")
+        tamanho_max_query: Tamanho máximo estimado da query string de cada lote
+        max_por_lote: Limite opcional de valores por lote
+
+    Returns:
+        Lista de listas de valores
+    """
+    lotes = []
+    lote_atual = []
+    tamanho_atual = 0
+    custo_param = len(nome_param) * 3 + 2  # "[" e "]" viram %5B e %5D
+
+    for valor in valores:
+        custo = custo_param + len(str(valor))
+        lote_cheio = max_por_lote and len(lote_atual) >= max_por_lote
+        if lote_atual and (tamanho_atual + custo > tamanho_max_query or lote_cheio):
+            lotes.append(lote_atual)
+            lote_atual = []
+            tamanho_atual = 0
+        lote_atual.append(valor)
+        tamanho_atual += custo
+
+    if lote_atual:
+        lotes.append(lote_atual)
+
+    return lotes
+
+
+def dividir_periodo(created_from, created_to, dias_por_janela=7):
+    """
+    Divide um período em janelas consecutivas e sem sobreposição
+
+    Args:
+        created_from: Data inicial (YYYY-MM-DD)
+        created_to: Data final (YYYY-MM-DD), inclusive
+        dias_por_janela: Tamanho de cada janela em dias (1 = diário, 7 = semanal)
+
+    Returns:
+        Lista de tuplas (inicio, fim) no formato YYYY-MM-DD, ambas inclusivas
+    """
+    inicio = date.fromisoformat(created_from[:10])
+    fim = date.fromisoformat(created_to[:10])
+
+    janelas = []
+    while inicio <= fim:
+        fim_janela = min(fim, inicio + timedelta(days=dias_por_janela - 1))
+        janelas.append((inicio.isoformat(), fim_janela.isoformat()))
+        inicio = fim_janela + timedelta(days=1)
+
+    return janelas
 
 
 class QiveAPI:
-    def __init__(self, api_id, api_key, log_dir="./log"):
-        self.base_url = "https://api.arquivei.com.br"
+    def __init__(
+        self,
+        api_id,
+        api_key,
+        log_dir="./log",
+        pool_size=10,
+        max_retries=3,
+        backoff_factor=0.5,
+        timeout=60,
+        requisicoes_por_segundo=3.0,
+        rate_limiter=None,
+        indice=None,
+        manifesto=None,
+        metricas=None,
+        base_url="https://api.arquivei.com.br",
+        cache_cancelamentos=None,
+        cache_respostas=None
+    ):
+        """
+        Args:
+            api_id: X-API-ID da conta Qive/Arquivei
+            api_key: X-API-KEY da conta Qive/Arquivei
+            log_dir: Diretório de logs (mantido por compatibilidade)
+            pool_size: Quantidade de conexões keep-alive mantidas no pool
+            max_retries: Tentativas extras em caso de 5xx, timeout ou falha de conexão
+            backoff_factor: Fator do backoff exponencial entre tentativas (0.5 -> 0.5s, 1s, 2s...)
+            timeout: Timeout (segundos) de cada requisição
+            requisicoes_por_segundo: Orçamento de requisições por segundo do limitador padrão
+            rate_limiter: RateLimiter compartilhado (opcional); substitui o limitador padrão
+            indice: IndiceNFSe (opcional) usado para responder buscas por número localmente
+            manifesto: ManifestoDownloads (opcional) para pular documentos já baixados
+            metricas: MetricasQive (opcional) compartilhada; por padrão cada instância cria a sua
+            base_url: Endereço da API (ex: servidor mock local nos benchmarks)
+            cache_cancelamentos: CacheCancelamento (opcional) para não reconsultar status já conhecidos
+            cache_respostas: CacheRespostas (opcional) para reaproveitar páginas de listagens
+        """
+        self.base_url = base_url.rstrip("/")
         self.headers = {
             "X-API-ID": api_id,
             "X-API-KEY": api_key
         }
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.rate_limiter = rate_limiter or RateLimiter(requisicoes_por_segundo)
+        self.indice = indice
+        self.manifesto = manifesto
+        self.metricas = metricas or MetricasQive()
+        self.cache_cancelamentos = cache_cancelamentos
+        self.cache_respostas = cache_respostas
+
+        # Sessão única: reaproveita conexões TLS entre todas as chamadas
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+            # 429 com Retry-After não é repetido pelo urllib3: tem que chegar ao
+            # _get para que o RateLimiter compartilhado reduza o ritmo
+            respect_retry_after_header=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
         logging.info("QiveAPI inicializada")
 
 
-    def buscar_nfse_todas_notas_paginado(self, cnpj, created_from, created_to, tipo="received", max_paginas=None):
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close(self):
+        """Fecha a sessão HTTP e libera as conexões do pool"""
+        self.session.close()
+
+
+    def _get(self, url, params=None, **kwargs):
+        """
+        GET através da sessão compartilhada (pool + retry/backoff).
+        Toda chamada passa pelo rate limiter; respostas 429 reduzem a taxa,
+        respeitam o Retry-After e são repetidas até max_retries vezes.
+        Com cache_respostas, GETs JSON (não streaming) já guardados não vão à rede.
+
+        Args:
+            url: URL completa do endpoint
+            params: Parâmetros de query string
+            **kwargs: Argumentos extras repassados ao requests (ex: stream)
+
+        Returns:
+            requests.Response
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = endpoint_da_url(url)
+
+        usar_cache = self.cache_respostas is not None and not kwargs.get("stream")
+        if usar_cache:
+            corpo = self.cache_respostas.obter(endpoint, params)
+            if corpo is not None:
+                self.metricas.registrar_cache_acerto(endpoint)
+                return self._resposta_do_cache(url, params, corpo)
+
+        tentativa = 0
+        while True:
+            self.metricas.registrar_throttle(endpoint, self.rate_limiter.adquirir())
+
+            inicio = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, **kwargs)
+            except requests.exceptions.RequestException:
+                self.metricas.registrar_requisicao(endpoint, time.perf_counter() - inicio)
+                raise
+            self._registrar_resposta(endpoint, response, time.perf_counter() - inicio, kwargs.get("stream", False))
+
+            if response.status_code != 429:
+                self.rate_limiter.registrar_sucesso()
+                if usar_cache and response.status_code == 200:
+                    self.cache_respostas.guardar(endpoint, params, response.content)
+                return response
+
+            if tentativa >= self.max_retries:
+                return response
+
+            self.rate_limiter.registrar_429(interpretar_retry_after(response.headers.get("Retry-After")))
+            self.metricas.registrar_retry(endpoint)
+            response.close()
+            tentativa += 1
+
+
+    @staticmethod
+    def _resposta_do_cache(url, params, corpo):
+        """Monta um requests.Response a partir de um corpo guardado no cache"""
+        response = requests.Response()
+        response.status_code = 200
+        response._content = corpo
+        response.encoding = "utf-8"
+        response.headers["Content-Type"] = "application/json"
+        response.headers["X-Cache"] = "HIT"
+        response.url = requests.Request("GET", url, params=params).prepare().url
+        return response
+
+
+    def _registrar_resposta(self, endpoint, response, latencia, stream):
+        """Alimenta as métricas com latência, bytes e retries internos do urllib3"""
+        requisicao = getattr(response, "request", None)
+        bytes_enviados = 0
+        if requisicao is not None:
+            bytes_enviados = len(requisicao.url or "") + sum(
+                len(chave) + len(str(valor)) + 4 for chave, valor in requisicao.headers.items()
+            )
+
+        self.metricas.registrar_requisicao(
+            endpoint,
+            latencia,
+            response.status_code,
+            bytes_recebidos=0 if stream else len(response.content or b""),
+            bytes_enviados=bytes_enviados
+        )
+
+        historico = getattr(getattr(getattr(response, "raw", None), "retries", None), "history", None)
+        if historico:
+            self.metricas.registrar_retry(endpoint, len(historico))
+
+
+    def _json(self, response):
+        """response.json() contabilizando o tempo de decodificação do endpoint"""
+        inicio = time.perf_counter()
+        data = response.json()
+        self.metricas.registrar_fase(endpoint_da_url(response.url), "decodificacao", time.perf_counter() - inicio)
+        return data
+
+
+    def _medir_leitura(self, chunks, endpoint):
+        """Repassa os chunks do corpo em streaming, somando tempo de rede e bytes recebidos"""
+        tempo_rede = 0.0
+        recebidos = 0
+        iterador = iter(chunks)
+        try:
+            while True:
+                inicio = time.perf_counter()
+                chunk = next(iterador, None)
+                tempo_rede += time.perf_counter() - inicio
+                if chunk is None:
+                    break
+                recebidos += len(chunk)
+                yield chunk
+        finally:
+            self.metricas.registrar_fase(endpoint, "rede", tempo_rede)
+            self.metricas.registrar_bytes(endpoint, recebidos)
+
+
+    def iterar_nfse_notas(
+        self,
+        cnpj,
+        created_from,
+        created_to,
+        tipo="received",
+        max_paginas=None,
+        por_pagina=False,
+        cursor_inicial=0,
+        estado=None,
+        checkpoint=None
+    ):
         """
-        Busca TODAS as notas com paginação automática por cursor
+        Percorre as notas com paginação automática por cursor, entregando
+        cada página assim que ela chega (sem acumular o período inteiro em memória)
 
         Args:
             cnpj: CNPJ para filtrar
@@ -28,111 +304,364 @@ class QiveAPI:
             created_to: Data de RECEBIMENTO final (formato: YYYY-MM-DD)
             tipo: "received" ou "emitted"
             max_paginas: Limite de páginas (None = sem limite)
-
-        Returns:
-            Lista completa de notas em formato JSON
+            por_pagina: True = entrega listas (uma por página); False = entrega nota a nota
+            cursor_inicial: Cursor a partir do qual a varredura começa (padrão: 0)
+            estado: EstadoVarredura (opcional) preenchido com cursor, páginas e
+                    se a varredura foi completa ou truncada (e por quê)
+            checkpoint: Caminho ou CheckpointVarredura (opcional). As páginas e o
+                        cursor são persistidos a cada página; uma nova chamada com os
+                        mesmos parâmetros reentrega as páginas salvas e continua do
+                        último cursor bom
+
+        Yields:
+            Nota em formato JSON (ou lista de notas, se por_pagina=True)
         """
 
         cnpj_limpo = cnpj.replace(".", "").replace("/", "").replace("-", "")
-        logging.info(f"CNPJ Limpo ({cnpj_limpo})")
+        logging.debug("CNPJ Limpo (%s)", cnpj_limpo)
 
         url = f"{self.base_url}/v1/nfse/{tipo}"
-        logging.info(f"URL de Consulta: {url}")
+        logging.debug("URL de Consulta: %s", url)
+
+        if estado is None:
+            estado = EstadoVarredura(cursor_inicial)
+        if isinstance(checkpoint, str):
+            checkpoint = CheckpointVarredura(checkpoint)
+
+        paginas_salvas = iter(())
+        if checkpoint is not None:
+            salvo = checkpoint.iniciar(
+                {"cnpj": cnpj_limpo, "tipo": tipo, "created_from": created_from, "created_to": created_to},
+                cursor_inicial
+            )
+            cursor_inicial = salvo["cursor"]
+            paginas_salvas = checkpoint.iterar_paginas_salvas()
 
         # Parâmetros iniciais
         params = {
             "cnpj[]": cnpj_limpo,
             "created_at[from]": created_from,  # Data de RECEBIMENTO pelo Arquivei
             "created_at[to]": created_to,
-            "cursor": 0,
+            "cursor": cursor_inicial,
             "limit": 50,
             "format_type": "json"  # Retorna em JSON simplificado
         }
-        logging.info(f"Parâmetros Iniciais: {params}")
+        logging.debug("Parâmetros Iniciais: %s", params)
 
     
-        todas_notas = []
-        cursor_atual = 0
+        cursor_atual = cursor_inicial
+        estado.cursor = cursor_atual
         pagina = 1
 
-        logging.info("="*50)
-        logging.info(f"BUSCANDO NOTAS FISCAIS ({tipo.upper()})")
-        logging.info("="*50)
-        logging.info(f"   CNPJ: {cnpj}")
-        logging.info(f"   Data Recebimento Arquivei: {created_from} a {created_to}")
-        logging.info(f"   Formato: JSON (simplificado)")
-        logging.info(f"   Limite por página: 50 notas")
-        logging.info("="*50)
+        logging.info(
+            "BUSCANDO NOTAS FISCAIS (%s) - CNPJ: %s - Data Recebimento Arquivei: %s a %s - 50 notas por página",
+            tipo.upper(), cnpj, created_from, created_to
+        )
 
-        while True:
-            # Verifica limite de páginas
-            if max_paginas and pagina > max_paginas:
-                logging.info(f"Limite de {max_paginas} páginas atingido")
-                break
+        try:
+            # Reentrega as páginas já recebidas em uma execução anterior
+            for notas in paginas_salvas:
+                estado.paginas += 1
+                estado.total_notas += len(notas)
+                if por_pagina:
+                    yield notas
+                else:
+                    yield from notas
+
+            if checkpoint is not None and checkpoint.estado["completa"]:
+                logging.info("Varredura já concluída no checkpoint; nenhuma página nova a buscar")
+                estado.completa, estado.motivo = True, "fim"
+                return
+
+            while True:
+                # Verifica limite de páginas
+                if max_paginas and pagina > max_paginas:
+                    logging.info("Limite de %s páginas atingido", max_paginas)
+                    estado.motivo = "max_paginas"
+                    break
 
-            logging.info(f" Página {pagina} (cursor: {cursor_atual})...")
+                logging.debug(" Página %s (cursor: %s)...", pagina, cursor_atual)
 
-            params["cursor"] = cursor_atual
+                params["cursor"] = cursor_atual
 
-            try:
-                response = requests.get(url, params=params, headers=self.headers, timeout=60)            
-                logging.info(f"Requisição URL: {response.url}")            
-                response.raise_for_status()
-                data = response.json()
-
-                # Verifica se houve erro
-                if data.get('status', {}).get('code') != 200:
-                    logging.info(f"Erro API: {data.get('status', {}).get('message')}")
+                try:
+                    response = self._get(url, params=params)            
+                    logging.debug("Requisição URL: %s", response.url)            
+                    response.raise_for_status()
+                    data = self._json(response)
+
+                    # Verifica se houve erro
+                    if data.get('status', {}).get('code') != 200:
+                        logging.info("Erro API: %s", data.get('status', {}).get('message'))
+                        estado.motivo = "erro_api"
+                        break
+
+                    notas = data.get('data', [])
+
+                    logging.info("Total de %s notas", len(notas))
+
+                    if not notas:
+                        logging.info("Nenhuma nota encontrada nesta página")
+                        estado.completa, estado.motivo = True, "fim"
+                        break
+
+                except requests.exceptions.Timeout:
+                    logging.error("Timeout na página %s (cursor: %s) após esgotar as tentativas", pagina, cursor_atual)
+                    estado.motivo = "timeout"
                     break
 
-                notas = data.get('data', [])
+                except requests.exceptions.ConnectionError as e:
+                    logging.error("Falha de conexão na página %s (cursor: %s) após esgotar as tentativas: %s", pagina, cursor_atual, e)
+                    estado.motivo = "conexao"
+                    break
 
-                logging.info(f"Total de {len(notas)} notas")
+                except requests.exceptions.HTTPError as e:
+                    logging.info("Erro HTTP %s", e.response.status_code)
+                    estado.motivo = f"http_{e.response.status_code}"
+                    try:
+                        erro_json = e.response.json()
+                        logging.info("Status Code: %s", response.status_code)
+                        logging.info("   Mensagem: %s", erro_json.get('status', {}).get('message', 'Erro desconhecido'))
+                    except:
+                        logging.info("   Resposta: %s", e.response.text[:200])
+                    break
 
-                if not notas:
-                    logging.info("Nenhuma nota encontrada nesta página")
+                except Exception as e:
+                    logging.info("Erro: %s", e)
+                    estado.motivo = "erro"
                     break
 
-                # Adiciona as notas à lista
-                todas_notas.extend(notas)
+                # Próximo cursor é sempre: cursor_atual + quantidade retornada
+                cursor_atual += len(notas)
+
+                # Persiste a página antes de entregá-la
+                if checkpoint is not None:
+                    checkpoint.salvar_pagina(notas, cursor_atual)
+
+                estado.cursor = cursor_atual
+                estado.paginas += 1
+                estado.total_notas += len(notas)
+
+                # Entrega a página ao consumidor
+                if por_pagina:
+                    yield notas
+                else:
+                    yield from notas
 
                 # Verifica se há próxima página
                 if len(notas) < 50:
-                    logging.info(f"Última página atingida ({len(notas)} < 50)")
+                    logging.info("Última página atingida (%s < 50)", len(notas))
+                    estado.completa, estado.motivo = True, "fim"
                     break
 
-                # Próximo cursor é sempre: cursor_atual + quantidade retornada
-                cursor_atual += len(notas)
                 pagina += 1
 
-                # Pequeno delay para não sobrecarregar a API
-                time.sleep(0.3)
+        finally:
+            if estado.motivo is None:
+                estado.motivo = "interrompida"
+            if checkpoint is not None:
+                checkpoint.finalizar(estado.completa, estado.motivo)
+
+            if estado.completa:
+                logging.info("RESUMO: %s notas em %s página(s) - Varredura COMPLETA", estado.total_notas, estado.paginas)
+            elif estado.motivo == "interrompida":
+                logging.info(
+                    "RESUMO: %s notas em %s página(s) - Varredura encerrada antes do fim (cursor %s)",
+                    estado.total_notas, estado.paginas, estado.cursor
+                )
+            else:
+                logging.warning(
+                    "RESUMO: %s notas em %s página(s) - Varredura TRUNCADA (%s) no cursor %s",
+                    estado.total_notas, estado.paginas, estado.motivo, estado.cursor
+                )
 
-            except requests.exceptions.Timeout:
-                logging.info(f"Timeout na página {pagina}")
-                break
 
-            except requests.exceptions.HTTPError as e:
-                logging.info(f"Erro HTTP {e.response.status_code}")
-                try:
-                    erro_json = e.response.json()
-                    logging.info(f"Status Code: {response.status_code}")
-                    logging.info(f"   Mensagem: {erro_json.get('status', {}).get('message', 'Erro desconhecido')}")
-                except:
-                    logging.info(f"   Resposta: {e.response.text[:200]}")
-                break
+    def buscar_nfse_todas_notas_paginado(
+        self,
+        cnpj,
+        created_from,
+        created_to,
+        tipo="received",
+        max_paginas=None,
+        checkpoint=None
+    ):
+        """
+        Busca TODAS as notas com paginação automática por cursor.
+        Para períodos grandes prefira iterar_nfse_notas, que não acumula tudo em memória.
 
-            except Exception as e:
-                logging.info(f"Erro: {e}")
-                break
+        Args:
+            cnpj: CNPJ para filtrar
+            created_from: Data de RECEBIMENTO inicial (formato: YYYY-MM-DD)
+            created_to: Data de RECEBIMENTO final (formato: YYYY-MM-DD)
+            tipo: "received" ou "emitted"
+            max_paginas: Limite de páginas (None = sem limite)
+            checkpoint: Caminho do checkpoint (opcional) para retomar varreduras interrompidas
+
+        Returns:
+            ResultadoVarredura: lista completa de notas em formato JSON, com os
+            atributos completa/truncada, motivo e cursor_final
+        """
+        estado = EstadoVarredura()
+        notas = list(self.iterar_nfse_notas(
+            cnpj, created_from, created_to, tipo, max_paginas, estado=estado, checkpoint=checkpoint
+        ))
+        return ResultadoVarredura(notas, estado)
 
-        logging.info("="*50)
-        logging.info(f"RESUMO:")
-        logging.info(f"   Total de notas: {len(todas_notas)}")
-        logging.info(f"   Páginas processadas: {pagina}")
-        logging.info("="*50)
 
-        return todas_notas
+    def buscar_nfse_paralelo(
+        self,
+        cnpj,
+        created_from,
+        created_to,
+        tipo="received",
+        dias_por_janela=7,
+        max_workers=4,
+        pasta_checkpoints=None
+    ):
+        """
+        Varre um período longo dividindo-o em janelas de dias/semanas, cada uma
+        com seu próprio cursor, executadas em paralelo. O resultado é unido e
+        deduplicado pelo `id` Arquivei.
+
+        O pool de conexões (pool_size) deve ser >= max_workers e o rate limiter
+        compartilhado continua limitando o total de requisições por segundo.
+
+        Args:
+            cnpj: CNPJ para filtrar
+            created_from: Data de RECEBIMENTO inicial (formato: YYYY-MM-DD)
+            created_to: Data de RECEBIMENTO final (formato: YYYY-MM-DD)
+            tipo: "received" ou "emitted"
+            dias_por_janela: Tamanho de cada janela (1 = diário, 7 = semanal)
+            max_workers: Quantidade de janelas varridas ao mesmo tempo
+            pasta_checkpoints: Diretório (opcional) com um checkpoint por janela,
+                               para retomar só as janelas que não terminaram
+
+        Returns:
+            ResultadoVarredura: notas deduplicadas; completa=True somente se todas as
+            janelas terminaram. O atributo janelas_truncadas lista (inicio, fim, motivo)
+        """
+        janelas = dividir_periodo(created_from, created_to, dias_por_janela)
+        cnpj_limpo = cnpj.replace(".", "").replace("/", "").replace("-", "")
+
+        logging.info("Varredura paralela: %s janela(s) de %s dia(s), %s worker(s)", len(janelas), dias_por_janela, max_workers)
+
+        def varrer(janela):
+            checkpoint = None
+            if pasta_checkpoints:
+                checkpoint = os.path.join(pasta_checkpoints, f"nfse_{tipo}_{cnpj_limpo}_{janela[0]}_{janela[1]}.json")
+            return self.buscar_nfse_todas_notas_paginado(cnpj, janela[0], janela[1], tipo, checkpoint=checkpoint)
+
+        resultados = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futuros = {executor.submit(varrer, janela): janela for janela in janelas}
+            for futuro in as_completed(futuros):
+                resultados[futuros[futuro]] = futuro.result()
+
+        # Une na ordem cronológica das janelas, descartando ids repetidos
+        notas = []
+        vistos = set()
+        janelas_truncadas = []
+        estado = EstadoVarredura()
+
+        for janela in janelas:
+            resultado = resultados[janela]
+            estado.paginas += resultado.paginas
+            if not resultado.completa:
+                janelas_truncadas.append((janela[0], janela[1], resultado.motivo))
+
+            for nota in resultado:
+                id_nota = nota.get("id")
+                if id_nota in vistos:
+                    continue
+                vistos.add(id_nota)
+                notas.append(nota)
+
+        estado.total_notas = len(notas)
+        estado.completa = not janelas_truncadas
+        estado.motivo = "fim" if estado.completa else "janelas_truncadas"
+
+        resultado_final = ResultadoVarredura(notas, estado)
+        resultado_final.janelas_truncadas = janelas_truncadas
+
+        if janelas_truncadas:
+            logging.warning("%s janela(s) truncada(s): %s", len(janelas_truncadas), janelas_truncadas)
+        logging.info("Varredura paralela concluída: %s nota(s) única(s)", len(notas))
+
+        return resultado_final
+
+
+    def sincronizar_indice_nfse(self, cnpj, created_from, created_to, tipo="received"):
+        """
+        Atualiza o índice local com as notas da janela, varrendo apenas os dias
+        de recebimento ainda não cobertos por sincronizações anteriores.
+
+        Dias até ontem, uma vez varridos por completo, ficam marcados como
+        cobertos (não recebem mais notas). Dias a partir de hoje continuam
+        incrementais pelo cursor: só as posições posteriores à última
+        sincronização são buscadas.
+
+        Args:
+            cnpj: CNPJ para filtrar
+            created_from: Data de RECEBIMENTO inicial (formato: YYYY-MM-DD)
+            created_to: Data de RECEBIMENTO final (formato: YYYY-MM-DD)
+            tipo: "received" ou "emitted"
+
+        Returns:
+            Quantidade de notas novas gravadas no índice
+        """
+        if self.indice is None:
+            raise ValueError("QiveAPI criada sem índice (parâmetro 'indice')")
+
+        cnpj_limpo = cnpj.replace(".", "").replace("/", "").replace("-", "")
+        hoje = date.today()
+        ontem = (hoje - timedelta(days=1)).isoformat()
+
+        novas = 0
+        for faixa_de, faixa_ate in self.indice.faixas_pendentes(cnpj_limpo, tipo, created_from, created_to):
+            fechada_ate = min(faixa_ate, ontem)
+            if faixa_de <= fechada_ate:
+                quantidade, completa = self._sincronizar_faixa_indice(cnpj, cnpj_limpo, faixa_de, fechada_ate, tipo)
+                novas += quantidade
+                if completa:
+                    self.indice.registrar_cobertura(cnpj_limpo, tipo, faixa_de, fechada_ate)
+
+            aberta_de = max(faixa_de, hoje.isoformat())
+            if aberta_de <= faixa_ate:
+                quantidade, _ = self._sincronizar_faixa_indice(cnpj, cnpj_limpo, aberta_de, faixa_ate, tipo)
+                novas += quantidade
+
+        logging.info("Índice sincronizado: %s nota(s) nova(s)", novas)
+        return novas
+
+
+    def _sincronizar_faixa_indice(self, cnpj, cnpj_limpo, data_de, data_ate, tipo, cursor_inicial=None):
+        """
+        Varre uma faixa a partir do último cursor salvo (ou de cursor_inicial);
+        retorna (notas novas, varredura completa)
+        """
+        if cursor_inicial is None:
+            cursor = self.indice.cursor_sincronizado(cnpj_limpo, tipo, data_de, data_ate)
+        else:
+            cursor = cursor_inicial
+        logging.info("Sincronizando índice NFS-e %s a %s a partir do cursor %s", data_de, data_ate, cursor)
+
+        estado = EstadoVarredura(cursor)
+        novas = 0
+        for pagina in self.iterar_nfse_notas(
+            cnpj, data_de, data_ate, tipo, por_pagina=True, cursor_inicial=cursor, estado=estado
+        ):
+            cursor += len(pagina)
+            self.indice.registrar_pagina(
+                cnpj_limpo,
+                tipo,
+                data_de,
+                data_ate,
+                [self.extrair_dados_nota_json(nota) for nota in pagina],
+                cursor
+            )
+            novas += len(pagina)
+
+        return novas, estado.completa
 
 
     def extrair_dados_nota_json(self, nota_json):
@@ -147,7 +676,7 @@ class QiveAPI:
         """
 
         try:
-            logging.debug(f"Extraindo dados importantes da nota em formato JSON")
+            logging.debug("Extraindo dados importantes da nota em formato JSON")
             xml_data = nota_json.get('xml', {})
             nfse = xml_data.get('Nfse', {})
             inf_nfse = nfse.get('InfNfse', {})
@@ -162,11 +691,11 @@ class QiveAPI:
 
             # Valores
             valores = inf_nfse.get('ValoresNfse', {})
-            dados['base_calculo'] = float(valores.get('BaseCalculo', 0))
-            dados['aliquota'] = float(valores.get('Aliquota', 0))
-            dados['valor_iss'] = float(valores.get('ValorIss', 0))
-            dados['valor_servicos'] = float(valores.get(
-                'ValorServicos', 0)) if 'ValorServicos' in valores else 0
+            # Ausente = 0, não numérico = None (igual à extração colunar)
+            dados['base_calculo'] = converter_numero(valores.get('BaseCalculo'))
+            dados['aliquota'] = converter_numero(valores.get('Aliquota'))
+            dados['valor_iss'] = converter_numero(valores.get('ValorIss'))
+            dados['valor_servicos'] = converter_numero(valores.get('ValorServicos'))
 
             # Prestador
             prestador = inf_nfse.get('PrestadorServico', {})
@@ -206,10 +735,84 @@ class QiveAPI:
             return dados
 
         except Exception as e:
-            logging.info(f"Erro ao extrair dados: {e}")
+            logging.info("Erro ao extrair dados: %s", e)
             return None
 
 
+    def buscar_nfse_tabela(self, cnpj, created_from, created_to, tipo="received", como_pandas=False):
+        """
+        Busca as notas do período e devolve em formato colunar (Arrow/pandas),
+        convertendo página a página para não acumular os dicts das notas
+
+        Args:
+            cnpj: CNPJ para filtrar
+            created_from: Data de RECEBIMENTO inicial (formato: YYYY-MM-DD)
+            created_to: Data de RECEBIMENTO final (formato: YYYY-MM-DD)
+            tipo: "received" ou "emitted"
+            como_pandas: True = retorna pandas.DataFrame; False = pyarrow.Table
+
+        Returns:
+            pyarrow.Table ou pandas.DataFrame com as colunas de extrair_dados_nota_json
+        """
+        from lib_colunar_qive import tabela_nfse
+
+        tabela = tabela_nfse(self.iterar_nfse_notas(cnpj, created_from, created_to, tipo, por_pagina=True))
+        return tabela.to_pandas() if como_pandas else tabela
+
+
+    def exportar_nfse_parquet(
+        self,
+        cnpj,
+        mes_inicial,
+        mes_final=None,
+        tipo="received",
+        pasta_destino="./parquet_nfse",
+        compressao="zstd"
+    ):
+        """
+        Exporta as notas para um dataset Parquet particionado por
+        cnpj / tipo / mes (mês de RECEBIMENTO pelo Arquivei).
+
+        Cada mês é varrido inteiro e grava somente a sua partição, de modo que
+        reexportar um mês substitui apenas aquele mês. Um mês cuja varredura
+        não chega ao fim (erro de página, timeout...) não é gravado: a partição
+        anterior é mantida e o mês volta como None. Leitores podem filtrar
+        por cnpj/tipo/mes sem abrir as demais partições (ver ler_dataset_nfse).
+
+        Args:
+            cnpj: CNPJ para filtrar
+            mes_inicial: Primeiro mês (YYYY-MM)
+            mes_final: Último mês (YYYY-MM); padrão = mes_inicial
+            tipo: "received" ou "emitted"
+            pasta_destino: Raiz do dataset Parquet
+            compressao: Codec Parquet (padrão: zstd)
+
+        Returns:
+            dict: {mes: quantidade de notas gravadas, ou None se o mês falhou}
+        """
+        from lib_colunar_qive import meses_do_periodo, iterar_lotes_nfse, escrever_particao_parquet
+
+        cnpj_limpo = cnpj.replace(".", "").replace("/", "").replace("-", "")
+        resultado = {}
+
+        for mes, primeiro_dia, ultimo_dia in meses_do_periodo(mes_inicial, mes_final or mes_inicial):
+            logging.info("Exportando %s %s - mês %s", tipo, cnpj_limpo, mes)
+            estado = EstadoVarredura()
+            paginas = self.iterar_nfse_notas(cnpj, primeiro_dia, ultimo_dia, tipo, por_pagina=True, estado=estado)
+            caminho, linhas = escrever_particao_parquet(
+                iterar_lotes_nfse(paginas), pasta_destino, cnpj_limpo, tipo, mes, compressao, estado=estado
+            )
+            resultado[mes] = linhas if caminho else None
+
+        falhas = [mes for mes, linhas in resultado.items() if linhas is None]
+        if falhas:
+            logging.error("Exportação Parquet com meses não gravados (%s): %s", ", ".join(falhas), resultado)
+        else:
+            logging.info("Exportação Parquet concluída: %s", resultado)
+        return resultado
+
+
+    @com_correlacao
     def buscar_nfse_nota_por_numero(self, numero_nota, cnpj, created_from, created_to, tipo="received"):
         """
         Busca uma nota específica pelo número
@@ -225,29 +828,60 @@ class QiveAPI:
             Dados da nota ou None
         """
 
-        logging.info(f"BUSCANDO NOTA ESPECÍFICA")
-        logging.info(f"   Número: {numero_nota}")
-        logging.info(f"   CNPJ: {cnpj}")
-        logging.info(f"   Período: {created_from} a {created_to}")
+        logging.info("BUSCANDO NOTA ESPECÍFICA")
+        logging.info("   Número: %s", numero_nota)
+        logging.info("   CNPJ: %s", cnpj)
+        logging.info("   Período: %s a %s", created_from, created_to)
 
-        # Busca todas as notas do período
-        todas_notas = self.buscar_nfse_todas_notas_paginado(cnpj, created_from, created_to, tipo)
+        # Com índice local: consulta o SQLite e só sincroniza (o que é novo) se não achar
+        if self.indice is not None:
+            cnpj_limpo = cnpj.replace(".", "").replace("/", "").replace("-", "")
 
-        if not todas_notas:
-            logging.info("Nenhuma nota encontrada no período")
-            return None
+            def buscar_no_indice():
+                return self.indice.buscar_por_numero(
+                    cnpj_limpo, numero_nota, tipo, recebido_de=created_from, recebido_ate=created_to
+                )
+
+            dados = buscar_no_indice()
+            if dados is None:
+                self.sincronizar_indice_nfse(cnpj, created_from, created_to, tipo)
+                dados = buscar_no_indice()
+
+            if dados is None:
+                # Nota indexada por uma varredura mais larga que a janela: varre só a
+                # interseção para saber se ela foi recebida dentro da janela
+                for faixa_de, faixa_ate in self.indice.faixas_ambiguas(
+                    cnpj_limpo, numero_nota, tipo, created_from, created_to
+                ):
+                    _, completa = self._sincronizar_faixa_indice(
+                        cnpj, cnpj_limpo, faixa_de, faixa_ate, tipo, cursor_inicial=0
+                    )
+                    if completa:
+                        self.indice.descartar_faixa(cnpj_limpo, tipo, faixa_de, faixa_ate)
+                dados = buscar_no_indice()
+
+            if dados:
+                logging.info("NOTA ENCONTRADA! (índice local)")
+                return dados
 
-        logging.info(f"Procurando nota {numero_nota} entre {len(todas_notas)} notas...")
+            logging.info("Nota %s não encontrada", numero_nota)
+            return None
 
-        # Procura a nota específica
-        for nota_json in todas_notas:
+        # Percorre as notas do período página a página e para no primeiro acerto
+        total_verificadas = 0
+        for nota_json in self.iterar_nfse_notas(cnpj, created_from, created_to, tipo):
+            total_verificadas += 1
             dados = self.extrair_dados_nota_json(nota_json)
 
             if dados and str(dados.get('numero')) == str(numero_nota):
-                logging.info(f"NOTA ENCONTRADA!")
+                logging.info("NOTA ENCONTRADA! (%s notas verificadas)", total_verificadas)
                 return dados
 
-        logging.info(f"Nota {numero_nota} não encontrada")
+        if not total_verificadas:
+            logging.info("Nenhuma nota encontrada no período")
+            return None
+
+        logging.info("Nota %s não encontrada", numero_nota)
         return None
 
 
@@ -257,34 +891,38 @@ class QiveAPI:
         if not dados:
             return
 
-        logging.info("="*50)
-        logging.info(f"Status: {dados['status']}")
-        logging.info("="*50)
+        logging.debug("="*50)
+        logging.info("Status: %s", dados['status'])
+        logging.debug("="*50)
 
-        logging.info(f"DADOS DA NOTA:")
-        logging.info(f"   ID Qive: {dados['id_arquivei']}")
-        logging.info(f"   Número: {dados['numero']}")
-        logging.info(f"   Código Verificação: {dados['codigo_verificacao']}")
-        logging.info(f"   Data Emissão: {dados['data_emissao']}")
+        logging.info("DADOS DA NOTA:")
+        logging.info("   ID Qive: %s", dados['id_arquivei'])
+        logging.info("   Número: %s", dados['numero'])
+        logging.info("   Código Verificação: %s", dados['codigo_verificacao'])
+        logging.info("   Data Emissão: %s", dados['data_emissao'])
 
         if dados['cancelada']:
-            logging.info(f"Data Cancelamento: {dados['data_cancelamento']}")
+            logging.info("Data Cancelamento: %s", dados['data_cancelamento'])
 
-        logging.info(f"PRESTADOR:")
-        logging.info(f"   Nome: {dados['nome_prestador']}")
-        logging.info(f"   CNPJ: {dados['cnpj_prestador']}")
+        logging.info("PRESTADOR:")
+        logging.info("   Nome: %s", dados['nome_prestador'])
+        logging.info("   CNPJ: %s", dados['cnpj_prestador'])
 
-        logging.info(f"TOMADOR:")
-        logging.info(f"   Nome: {dados['nome_tomador']}")
-        logging.info(f"   CNPJ: {dados['cnpj_tomador']}")
+        logging.info("TOMADOR:")
+        logging.info("   Nome: %s", dados['nome_tomador'])
+        logging.info("   CNPJ: %s", dados['cnpj_tomador'])
 
-        logging.info(f"VALORES:")
-        logging.info(f"   Serviços: R$ {dados['valor_servicos']:,.2f}")
-        logging.info(f"   Base Cálculo: R$ {dados['base_calculo']:,.2f}")
-        logging.info(f"   Alíquota: {dados['aliquota']:.2f}%")
-        logging.info(f"   ISS: R$ {dados['valor_iss']:,.2f}")   
+        # Valores não numéricos na nota chegam como None
+        def formatar(valor, formato="{:,.2f}"):
+            return "N/A" if valor is None else formato.format(valor)
 
-        logging.info("="*50)
+        logging.info("VALORES:")
+        logging.info("   Serviços: R$ %s", formatar(dados['valor_servicos']))
+        logging.info("   Base Cálculo: R$ %s", formatar(dados['base_calculo']))
+        logging.info("   Alíquota: %s%%", formatar(dados['aliquota'], "{:.2f}"))
+        logging.info("   ISS: R$ %s", formatar(dados['valor_iss']))
+
+        logging.debug("="*50)
 
 
     def buscar_nfse_cancelada(self, cnpj=None, id_notas=None, tipo_evento="101101", limit=50):
@@ -301,9 +939,9 @@ class QiveAPI:
         Returns:
             Lista de eventos de cancelamento encontrados
         """
-        logging.info("="*50)
+        logging.debug("="*50)
         logging.info("BUSCANDO EVENTOS DE CANCELAMENTO (Qive API)")
-        logging.info("="*50)
+        logging.debug("="*50)
 
         url = f"{self.base_url}/v1/nfse/events"
 
@@ -320,36 +958,150 @@ class QiveAPI:
             params["cnpj[]"] = cnpj_limpo
 
         try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=60)
-            logging.info(f"Requisição URL: {response.url}")
+            response = self._get(url, params=params)
+            logging.debug("Requisição URL: %s", response.url)
 
             response.raise_for_status()
-            data = response.json()
+            data = self._json(response)
 
             # Valida retorno
             if data.get("status", {}).get("code") != 200:
-                logging.info(f"Erro na API: {data.get('status', {}).get('message')}")
+                logging.info("Erro na API: %s", data.get('status', {}).get('message'))
                 return []
 
             eventos = data.get("data", [])
             canceladas = []
 
-            logging.info(f"Total de eventos retornados: {len(eventos)}")
+            logging.info("Total de eventos retornados: %s", len(eventos))
 
             for ev in eventos:
                 tipo = ev.get("type")
                 if tipo == "101101":  # cancelamento confirmado
                     canceladas.append(ev)
-                    logging.info(f"Nota cancelada encontrada: ID Qive {ev.get('id')}")
+                    logging.info("Nota cancelada encontrada: ID Qive %s", ev.get('id'))
 
-            logging.info(f"Total de notas canceladas: {len(canceladas)}")
+            logging.info("Total de notas canceladas: %s", len(canceladas))
             return canceladas
 
         except requests.exceptions.RequestException as e:
-            logging.error(f"Erro ao consultar eventos: {e}")
+            logging.error("Erro ao consultar eventos: %s", e)
             return []
 
 
+    def _iterar_paginas(self, url, params, limit=50):
+        """
+        Percorre por cursor todas as páginas de um endpoint paginado
+        (eventos ou listagens received/emitted)
+
+        Args:
+            url: URL completa do endpoint (ex: /v1/nfse/events, /v1/nfe/received)
+            params: Parâmetros de filtro (sem cursor)
+            limit: Quantidade de registros por página
+
+        Yields:
+            Lista de registros de cada página
+
+        Raises:
+            requests.exceptions.RequestException / RuntimeError se alguma página falhar,
+            para que o chamador não confunda resultado incompleto com "sem registros"
+        """
+        params = dict(params, limit=limit)
+        cursor = 0
+
+        while True:
+            params["cursor"] = cursor
+            response = self._get(url, params=params)
+            response.raise_for_status()
+            data = self._json(response)
+
+            status = data.get("status", {})
+            if status.get("code") != 200:
+                raise RuntimeError(f"Erro na API: {status.get('message')}")
+
+            registros = data.get("data", [])
+            if registros:
+                yield registros
+
+            if len(registros) < limit:
+                break
+
+            cursor += len(registros)
+
+
+    def buscar_nfse_canceladas_em_lote(
+        self,
+        id_notas,
+        cnpj=None,
+        tipo_evento="101101",
+        limit=50,
+        tamanho_max_query=6000,
+        datas_emissao=None,
+        ignorar_cache=False
+    ):
+        """
+        Verifica cancelamento de muitas NFS-e de uma vez: os IDs são agrupados
+        em lotes de id[] do maior tamanho que cabe na URL e cada lote é paginado
+        até o fim no endpoint /v1/nfse/events.
+
+        Args:
+            id_notas: Lista (ou iterável) de IDs Qive das NFS-e
+            cnpj: (opcional) CNPJ para filtrar
+            tipo_evento: código do tipo de evento (padrão: 101101 = Cancelamento)
+            limit: quantidade de registros por página
+            tamanho_max_query: tamanho máximo estimado da query string de cada lote
+            datas_emissao: Dict opcional id -> data de emissão (TTL do cache por idade)
+            ignorar_cache: True = consulta a API mesmo para status ainda válidos no cache
+
+        Returns:
+            set|None: IDs das notas canceladas ou None se alguma consulta falhar
+        """
+        ids = list(dict.fromkeys(id_notas))
+        url = f"{self.base_url}/v1/nfse/events"
+
+        usar_cache = self.cache_cancelamentos is not None and tipo_evento == "101101" and not ignorar_cache
+        canceladas_cache = set()
+        if usar_cache:
+            canceladas_cache, ativas_cache, ids = self.cache_cancelamentos.separar("nfse", ids)
+            logging.info(
+                "Cache de cancelamentos: %s cancelada(s) e %s ativa(s) resolvidas localmente; %s a consultar", len(canceladas_cache), len(ativas_cache), len(ids)
+            )
+            if self.indice is not None and ids:
+                datas_emissao = dict(datas_emissao or {})
+                for id_nota in ids:
+                    if id_nota not in datas_emissao:
+                        dados = self.indice.buscar_por_id(id_nota)
+                        if dados:
+                            datas_emissao[id_nota] = dados.get("data_emissao")
+
+        params = {"type[]": tipo_evento}
+        if cnpj:
+            params["cnpj[]"] = cnpj.replace(".", "").replace("/", "").replace("-", "")
+
+        lotes = dividir_em_lotes(ids, "id[]", tamanho_max_query)
+        logging.info("Verificando cancelamento de %s NFS-e em %s lote(s)", len(ids), len(lotes))
+
+        canceladas = set()
+        try:
+            for numero_lote, lote in enumerate(lotes, start=1):
+                for eventos in self._iterar_paginas(url, dict(params, **{"id[]": lote}), limit):
+                    canceladas.update(ev.get("id") for ev in eventos if ev.get("type") == tipo_evento)
+                logging.debug("Lote %s/%s verificado", numero_lote, len(lotes))
+
+        except requests.exceptions.RequestException as e:
+            logging.error("Erro ao consultar eventos em lote: %s", e)
+            return None
+        except Exception as e:
+            logging.error("Erro inesperado ao consultar eventos em lote: %s", e)
+            return None
+
+        if usar_cache:
+            self.cache_cancelamentos.registrar("nfse", ids, canceladas, datas_emissao)
+            canceladas |= canceladas_cache
+
+        logging.info("Total de notas canceladas: %s de %s", len(canceladas), len(ids) + len(canceladas_cache))
+        return canceladas
+
+
     def buscar_nfe_cancelada(self, cnpj=None, access_key=None, tipo_evento="110111", limit=50):
         """
         Busca eventos de cancelamento (type=110111) de NF-e via API Qive/Arquivei.
@@ -365,9 +1117,9 @@ class QiveAPI:
             list|None: Lista de eventos encontrados ou None se falhar
         """
         try:
-            logging.info("=" * 80)
+            logging.debug("=" * 80)
             logging.info("🔍 BUSCANDO EVENTOS DE CANCELAMENTO (NF-e)")
-            logging.info("=" * 80)
+            logging.debug("=" * 80)
 
             url = f"{self.base_url}/v2/nfe/events"
 
@@ -380,15 +1132,15 @@ class QiveAPI:
             if cnpj:
                 params["cnpj[]"] = cnpj.replace(".", "").replace("/", "").replace("-", "")
 
-            logging.info(f"Requisição URL: {url}")
-            response = requests.get(url, headers=self.headers, params=params, timeout=60)
+            logging.debug("Requisição URL: %s", url)
+            response = self._get(url, params=params)
             response.raise_for_status()
 
-            data_json = response.json()
+            data_json = self._json(response)
 
             status = data_json.get("status", {})
             if status.get("code") != 200:
-                logging.error(f"Erro na resposta: {status.get('message')}")
+                logging.error("Erro na resposta: %s", status.get('message'))
                 return None
 
             eventos = data_json.get("data", [])
@@ -396,18 +1148,131 @@ class QiveAPI:
                 logging.info("Nenhum evento encontrado para os filtros informados.")
                 return []
 
-            logging.info(f"{len(eventos)} evento(s) encontrado(s).")
+            logging.info("%s evento(s) encontrado(s).", len(eventos))
             return eventos
 
         except requests.exceptions.RequestException as e:
-            logging.error(f"Erro de requisição: {e}")
+            logging.error("Erro de requisição: %s", e)
         except Exception as e:
-            logging.error(f"Erro inesperado: {e}")
+            logging.error("Erro inesperado: %s", e)
 
         return None
 
 
-    def baixar_nfe_pdf(self, access_key, nome_arquivo=None, pasta="./danfe_pdf"):
+    def buscar_nfe_canceladas_em_lote(
+        self,
+        access_keys,
+        cnpj=None,
+        tipo_evento="110111",
+        limit=50,
+        tamanho_max_query=6000,
+        ignorar_cache=False
+    ):
+        """
+        Verifica cancelamento de muitas NF-e de uma vez via /v2/nfe/events,
+        agrupando as chaves em lotes e paginando cada lote até o fim.
+
+        Args:
+            access_keys: Lista (ou iterável) de chaves de acesso
+            cnpj: (opcional) CNPJ para filtrar
+            tipo_evento: Tipo de evento (padrão: "110111" = cancelamento)
+            limit: Quantidade de registros por página
+            tamanho_max_query: tamanho máximo estimado da query string de cada lote
+            ignorar_cache: True = consulta a API mesmo para status ainda válidos no cache
+                           (a idade do documento vem do AAMM da própria chave)
+
+        Returns:
+            set|None: Chaves das NF-e canceladas ou None se alguma consulta falhar
+        """
+        chaves = list(dict.fromkeys(access_keys))
+        url = f"{self.base_url}/v2/nfe/events"
+
+        usar_cache = self.cache_cancelamentos is not None and tipo_evento == "110111" and not ignorar_cache
+        canceladas_cache = set()
+        if usar_cache:
+            canceladas_cache, ativas_cache, chaves = self.cache_cancelamentos.separar("nfe", chaves)
+            logging.info(
+                "Cache de cancelamentos: %s cancelada(s) e %s ativa(s) resolvidas localmente; %s a consultar", len(canceladas_cache), len(ativas_cache), len(chaves)
+            )
+
+        params = {"type[]": tipo_evento}
+        if cnpj:
+            params["cnpj[]"] = cnpj.replace(".", "").replace("/", "").replace("-", "")
+
+        lotes = dividir_em_lotes(chaves, "access_key", tamanho_max_query)
+        logging.info("Verificando cancelamento de %s NF-e em %s lote(s)", len(chaves), len(lotes))
+
+        canceladas = set()
+        try:
+            for lote in lotes:
+                for eventos in self._iterar_paginas(url, dict(params, access_key=lote), limit):
+                    canceladas.update(ev.get("access_key") for ev in eventos if ev.get("type") == tipo_evento)
+
+        except requests.exceptions.RequestException as e:
+            logging.error("Erro ao consultar eventos em lote: %s", e)
+            return None
+        except Exception as e:
+            logging.error("Erro inesperado ao consultar eventos em lote: %s", e)
+            return None
+
+        if usar_cache:
+            self.cache_cancelamentos.registrar("nfe", chaves, canceladas)
+            canceladas |= canceladas_cache
+
+        logging.info("Total de NF-e canceladas: %s de %s", len(canceladas), len(chaves) + len(canceladas_cache))
+        return canceladas
+
+
+    def _documento_em_cache(self, chave_documento, caminho_arquivo, forcar=False):
+        """True se o manifesto indica que o documento já está íntegro em caminho_arquivo"""
+        if self.manifesto is None or forcar:
+            return False
+        return self.manifesto.documento_valido(chave_documento, caminho_arquivo)
+
+
+    def _baixar_campo_base64(self, url, params, campo, caminho_arquivo, chave_documento=None):
+        """
+        Baixa a resposta em streaming e decodifica o campo base64 direto para o
+        disco (memória constante, independente do tamanho do documento).
+
+        Args:
+            url: URL completa do endpoint
+            params: Parâmetros da requisição
+            campo: Campo base64 no JSON ("encoded_pdf" ou "xml")
+            caminho_arquivo: Caminho final do arquivo
+            chave_documento: Chave lógica para registro no manifesto (opcional)
+
+        Returns:
+            tuple(dict, int): (envelope JSON sem o campo, bytes gravados)
+        """
+        hasher = hashlib.sha256()
+        endpoint = endpoint_da_url(url)
+        tempos = {}
+
+        with self._get(url, params=params, stream=True) as response:
+            logging.debug("Requisição URL: %s", response.url)
+            response.raise_for_status()
+            chunks = self._medir_leitura(response.iter_content(chunk_size=64 * 1024), endpoint)
+            try:
+                # Status validado antes de substituir o arquivo: um download com erro
+                # não apaga a versão anterior (ex: forcar=True)
+                envelope, tamanho = salvar_campo_base64(
+                    chunks, campo, caminho_arquivo, hasher=hasher, tempos=tempos,
+                    validar=lambda envelope, _: envelope.get("status", {}).get("code") == 200
+                )
+            finally:
+                chunks.close()
+                for fase, segundos in tempos.items():
+                    self.metricas.registrar_fase(endpoint, fase, segundos)
+
+        if tamanho and self.manifesto is not None and chave_documento:
+            self.manifesto.registrar(chave_documento, caminho_arquivo, hasher.hexdigest(), tamanho)
+
+        return envelope, tamanho
+
+
+    @com_correlacao
+    def baixar_nfe_pdf(self, access_key, nome_arquivo=None, pasta="./danfe_pdf", forcar=False):
         """
         Busca o DANFe (PDF) por access_key, decodifica base64 e salva em disco.
         Cria a pasta se não existir.
@@ -417,28 +1282,15 @@ class QiveAPI:
             nome_arquivo (str|None): nome do arquivo (ex: "meu_arquivo.pdf"). 
                                     Se None, será usado "DANFE_<access_key>.pdf".
             pasta (str): diretório onde salvar o PDF.
+            forcar (bool): True = baixa de novo mesmo se já constar no manifesto.
 
         Retorna:
             str|None: caminho completo do arquivo salvo ou None em caso de erro.
         """
         try:
-            logging.info(f"Buscando DANFE para chave: {access_key}")
+            logging.info("Buscando DANFE para chave: %s", access_key)
             url = f"{self.base_url}/v1/nfe/danfe"
             params = {"access_key": access_key}
-            response = requests.get(url, headers=self.headers, params=params, timeout=60)
-            logging.info(f"Requisição URL: {response.url}")
-            response.raise_for_status()
-            data = response.json()
-
-            status_code = data.get("status", {}).get("code")
-            if status_code != 200:
-                logging.error(f"Erro API ao baixar DANFE: {data.get('status', {}).get('message')}")
-                return None
-
-            pdf_base64 = data.get("data", {}).get("encoded_pdf")
-            if not pdf_base64:
-                logging.error("Campo 'encoded_pdf' vazio ou inexistente.")
-                return None
 
             # prepara nome e pasta
             if not nome_arquivo:
@@ -448,28 +1300,39 @@ class QiveAPI:
             if not nome_arquivo.lower().endswith(".pdf"):
                 nome_arquivo = nome_arquivo + ".pdf"
 
-            # cria pasta se necessário
-            os.makedirs(pasta, exist_ok=True)
-
             caminho_completo = os.path.join(pasta, nome_arquivo)
 
-            # decodifica e salva
-            pdf_bytes = base64.b64decode(pdf_base64)
-            with open(caminho_completo, "wb") as f:
-                f.write(pdf_bytes)
+            if self._documento_em_cache(f"nfe_pdf:{access_key}", caminho_completo, forcar):
+                logging.info("DANFE já baixado (manifesto): %s", caminho_completo)
+                return caminho_completo
+
+            # baixa, decodifica e salva em streaming
+            data, tamanho = self._baixar_campo_base64(
+                url, params, "encoded_pdf", caminho_completo, chave_documento=f"nfe_pdf:{access_key}"
+            )
+
+            status_code = data.get("status", {}).get("code")
+            if status_code != 200:
+                logging.error("Erro API ao baixar DANFE: %s", data.get('status', {}).get('message'))
+                return None
+
+            if not tamanho:
+                logging.error("Campo 'encoded_pdf' vazio ou inexistente.")
+                return None
 
-            logging.info(f"DANFE salvo com sucesso: {caminho_completo}")
+            logging.info("DANFE salvo com sucesso: %s", caminho_completo)
             return caminho_completo
 
         except requests.exceptions.RequestException as e:
-            logging.error(f"Erro de requisição: {e}")
+            logging.error("Erro de requisição: %s", e)
         except Exception as e:
-            logging.error(f"Erro ao salvar DANFE: {e}")
+            logging.error("Erro ao salvar DANFE: %s", e)
 
         return None
 
 
-    def baixar_nfe_xml(self, access_key, nome_arquivo=None, pasta="./danfe_xml"):
+    @com_correlacao
+    def baixar_nfe_xml(self, access_key, nome_arquivo=None, pasta="./danfe_xml", forcar=False):
         """
         Baixa o XML de uma NFe via API Qive (endpoint /v1/nfe/received)
         e salva o conteúdo decodificado do campo Base64 'xml'.
@@ -478,14 +1341,15 @@ class QiveAPI:
             access_key (str): Chave de acesso da NFe (44 dígitos)
             nome_arquivo (str|None): Nome do arquivo XML (opcional)
             pasta (str): Diretório de destino (padrão: ./xml)
+            forcar (bool): True = baixa de novo mesmo se já constar no manifesto
 
         Returns:
             str|None: Caminho completo do arquivo salvo ou None se falhar
         """
         try:
-            logging.info("=" * 60)
-            logging.info(f"BUSCANDO XML DA NFe - CHAVE: {access_key}")
-            logging.info("=" * 60)
+            logging.debug("=" * 60)
+            logging.info("BUSCANDO XML DA NFe - CHAVE: %s", access_key)
+            logging.debug("=" * 60)
 
             url = f"{self.base_url}/v1/nfe/received"
             params = {
@@ -493,64 +1357,51 @@ class QiveAPI:
                 "format_type": "xml"
             }
 
-            response = requests.get(url, headers=self.headers, params=params, timeout=60)
-            logging.info(f"Requisição URL: {response.url}")
-            response.raise_for_status()
+            # Define nome e pasta
+            if not nome_arquivo:
+                nome_arquivo = f"NFE_{access_key}.xml"
+            if not nome_arquivo.lower().endswith(".xml"):
+                nome_arquivo += ".xml"
 
-            data_json = response.json()
+            caminho_arquivo = os.path.join(pasta, nome_arquivo)
+
+            if self._documento_em_cache(f"nfe_xml:{access_key}", caminho_arquivo, forcar):
+                logging.info("XML já baixado (manifesto): %s", caminho_arquivo)
+                return caminho_arquivo
+
+            # Baixa e grava os bytes do XML direto do Base64 (sem passar por str)
+            data_json, tamanho = self._baixar_campo_base64(
+                url, params, "xml", caminho_arquivo, chave_documento=f"nfe_xml:{access_key}"
+            )
 
             status = data_json.get("status", {})
             if status.get("code") != 200:
-                logging.error(f"Erro na resposta: {status.get('message')}")
+                logging.error("Erro na resposta: %s", status.get('message'))
                 return None
 
-            notas = data_json.get("data", [])
-            if not notas:
+            if not data_json.get("data"):
                 logging.warning("Nenhum resultado encontrado para a chave informada.")
                 return None
 
-            item = notas[0]
-            xml_base64 = item.get("xml")
-
-            if not xml_base64:
+            if not tamanho:
                 logging.error("Campo 'xml' não encontrado na resposta.")
                 return None
 
-            # Decodifica Base64
-            try:
-                xml_bytes = base64.b64decode(xml_base64)
-                xml_str = xml_bytes.decode("utf-8")
-            except Exception as e:
-                logging.error(f"Erro ao decodificar XML base64: {e}")
-                return None
-
-            # Define nome e pasta
-            if not nome_arquivo:
-                nome_arquivo = f"NFE_{access_key}.xml"
-            if not nome_arquivo.lower().endswith(".xml"):
-                nome_arquivo += ".xml"
-
-            os.makedirs(pasta, exist_ok=True)
-            caminho_arquivo = os.path.join(pasta, nome_arquivo)
-
-            # Salva o XML
-            with open(caminho_arquivo, "w", encoding="utf-8") as f:
-                f.write(xml_str)
-
-            logging.info(f"XML salvo com sucesso em: {caminho_arquivo}")
+            logging.info("XML salvo com sucesso em: %s", caminho_arquivo)
             return caminho_arquivo
 
         except requests.exceptions.RequestException as e:
-            logging.error(f"Erro de requisição: {e}")
+            logging.error("Erro de requisição: %s", e)
         except json.JSONDecodeError:
             logging.error("Resposta da API não está em formato JSON válido.")
         except Exception as e:
-            logging.error(f"Erro ao processar XML: {e}")
+            logging.error("Erro ao processar XML: %s", e)
 
         return None
 
 
-    def baixar_nfse_pdf(self, id_nfse, nome_arquivo=None, pasta="./danfse_pdf"):
+    @com_correlacao
+    def baixar_nfse_pdf(self, id_nfse, nome_arquivo=None, pasta="./danfse_pdf", forcar=False):
         """
         Baixa o DANFSe (PDF) de uma NFS-e via API Qive/Arquivei
         e salva o arquivo PDF decodificado a partir de base64.
@@ -559,58 +1410,55 @@ class QiveAPI:
             id_nfse (str): ID da NFS-e
             nome_arquivo (str|None): Nome do arquivo PDF (opcional)
             pasta (str): Diretório onde salvar o PDF (padrão: ./danfse_pdf)
+            forcar (bool): True = baixa de novo mesmo se já constar no manifesto
 
         Returns:
             str|None: Caminho do arquivo PDF salvo ou None em caso de erro
         """
         try:
-            logging.info(f"Solicitando DANFSe (PDF) - ID: {id_nfse}")
+            logging.info("Solicitando DANFSe (PDF) - ID: %s", id_nfse)
 
             url = f"{self.base_url}/v1/nfse/danfse"
             params = {"id": id_nfse}
 
-            response = requests.get(url, headers=self.headers, params=params, timeout=60)
-            response.raise_for_status()
-            data_json = response.json()
-
-            if data_json.get("status", {}).get("code") != 200:
-                logging.error(f"Erro: {data_json.get('status', {}).get('message')}")
-                return None
-
-            data = data_json.get("data", {})
-            encoded_pdf = data.get("encoded_pdf")
-
-            if not encoded_pdf:
-                logging.error("Campo 'encoded_pdf' não encontrado na resposta.")
-                return None
-
-            # Decodifica o PDF
-            pdf_bytes = base64.b64decode(encoded_pdf)
-
             # Define nome e pasta
             if not nome_arquivo:
                 nome_arquivo = f"NFS-e_{id_nfse}.pdf"
             if not nome_arquivo.lower().endswith(".pdf"):
                 nome_arquivo += ".pdf"
 
-            os.makedirs(pasta, exist_ok=True)
             caminho_arquivo = os.path.join(pasta, nome_arquivo)
 
-            with open(caminho_arquivo, "wb") as f:
-                f.write(pdf_bytes)
+            if self._documento_em_cache(f"nfse_pdf:{id_nfse}", caminho_arquivo, forcar):
+                logging.info("PDF já baixado (manifesto): %s", caminho_arquivo)
+                return caminho_arquivo
 
-            logging.info(f"PDF salvo com sucesso em: {caminho_arquivo}")
+            # Baixa e decodifica o PDF em streaming
+            data_json, tamanho = self._baixar_campo_base64(
+                url, params, "encoded_pdf", caminho_arquivo, chave_documento=f"nfse_pdf:{id_nfse}"
+            )
+
+            if data_json.get("status", {}).get("code") != 200:
+                logging.error("Erro: %s", data_json.get('status', {}).get('message'))
+                return None
+
+            if not tamanho:
+                logging.error("Campo 'encoded_pdf' não encontrado na resposta.")
+                return None
+
+            logging.info("PDF salvo com sucesso em: %s", caminho_arquivo)
             return caminho_arquivo
 
         except requests.exceptions.RequestException as e:
-            logging.error(f"Erro de requisição: {e}")
+            logging.error("Erro de requisição: %s", e)
         except Exception as e:
-            logging.error(f"Erro ao salvar PDF: {e}")
+            logging.error("Erro ao salvar PDF: %s", e)
 
         return None
 
 
-    def baixar_nfse_xml(self, id_nfse, nome_arquivo=None, pasta="./danfse_xml"):
+    @com_correlacao
+    def baixar_nfse_xml(self, id_nfse, nome_arquivo=None, pasta="./danfse_xml", forcar=False):
         """
         Baixa o XML de uma NFS-e via API Qive/Arquivei e salva o arquivo localmente.
 
@@ -618,12 +1466,13 @@ class QiveAPI:
             id_nfse (str): ID da NFS-e
             nome_arquivo (str|None): Nome do arquivo XML (opcional)
             pasta (str): Diretório de destino (padrão: ./danfse_xml)
+            forcar (bool): True = baixa de novo mesmo se já constar no manifesto
 
         Returns:
             str|None: Caminho do XML salvo ou None se falhar
         """
         try:
-            logging.info(f"Solicitando XML da NFS-e - ID: {id_nfse}")
+            logging.info("Solicitando XML da NFS-e - ID: %s", id_nfse)
 
             url = f"{self.base_url}/v1/nfse/received"
             params = {
@@ -631,51 +1480,150 @@ class QiveAPI:
                 "format_type": "xml"
             }
 
-            response = requests.get(url, headers=self.headers, params=params, timeout=60)
-            response.raise_for_status()
-            data_json = response.json()
+            # Define nome e pasta
+            if not nome_arquivo:
+                nome_arquivo = f"NFS-e_{id_nfse}.xml"
+            if not nome_arquivo.lower().endswith(".xml"):
+                nome_arquivo += ".xml"
+
+            caminho_arquivo = os.path.join(pasta, nome_arquivo)
+
+            if self._documento_em_cache(f"nfse_xml:{id_nfse}", caminho_arquivo, forcar):
+                logging.info("XML já baixado (manifesto): %s", caminho_arquivo)
+                return caminho_arquivo
+
+            # Baixa e grava os bytes do XML direto do Base64 (sem passar por str)
+            data_json, tamanho = self._baixar_campo_base64(
+                url, params, "xml", caminho_arquivo, chave_documento=f"nfse_xml:{id_nfse}"
+            )
 
             if data_json.get("status", {}).get("code") != 200:
-                logging.error(f"Erro: {data_json.get('status', {}).get('message')}")
+                logging.error("Erro: %s", data_json.get('status', {}).get('message'))
                 return None
 
-            data = data_json.get("data", [])
-            if not data:
+            if not data_json.get("data"):
                 logging.warning("Nenhum XML encontrado para o ID informado.")
                 return None
 
-            xml_base64 = data[0].get("xml")
-            if not xml_base64:
+            if not tamanho:
                 logging.error("Campo 'xml' não encontrado no retorno da API.")
                 return None
 
-            # Decodifica o XML
-            xml_bytes = base64.b64decode(xml_base64)
-            xml_str = xml_bytes.decode("utf-8")
+            logging.info("XML salvo com sucesso em: %s", caminho_arquivo)
+            return caminho_arquivo
 
-            # Define nome e pasta
-            if not nome_arquivo:
-                nome_arquivo = f"NFS-e_{id_nfse}.xml"
-            if not nome_arquivo.lower().endswith(".xml"):
-                nome_arquivo += ".xml"
+        except requests.exceptions.RequestException as e:
+            logging.error("Erro de requisição: %s", e)
+        except Exception as e:
+            logging.error("Erro ao salvar XML: %s", e)
 
-            os.makedirs(pasta, exist_ok=True)
-            caminho_arquivo = os.path.join(pasta, nome_arquivo)
+        return None
 
-            with open(caminho_arquivo, "w", encoding="utf-8") as f:
-                f.write(xml_str)
 
-            logging.info(f"XML salvo com sucesso em: {caminho_arquivo}")
-            return caminho_arquivo
+    @com_correlacao
+    def baixar_xmls_periodo(
+        self,
+        documento,
+        cnpj,
+        created_from,
+        created_to,
+        tipo="received",
+        pasta=None,
+        forcar=False
+    ):
+        """
+        Arquiva todos os XMLs de um período percorrendo a listagem
+        /v1/{nfe|nfse}/{tipo} com format_type=xml: uma requisição por página
+        de 50 documentos, em vez de uma requisição por documento.
+
+        Os arquivos seguem os mesmos nomes de baixar_nfe_xml / baixar_nfse_xml
+        e são registrados no manifesto (documentos já íntegros não são regravados).
+
+        Args:
+            documento (str): "nfe" ou "nfse"
+            cnpj (str): CNPJ para filtrar
+            created_from (str): Data de RECEBIMENTO inicial (YYYY-MM-DD)
+            created_to (str): Data de RECEBIMENTO final (YYYY-MM-DD)
+            tipo (str): "received" ou "emitted"
+            pasta (str|None): Diretório de destino (padrão: ./danfe_xml ou ./danfse_xml)
+            forcar (bool): Regrava mesmo os documentos que já constam no manifesto
+
+        Returns:
+            dict: Resumo (total, gravados, existentes, erros, paginas, completa)
+        """
+        if documento not in ("nfe", "nfse"):
+            raise ValueError("documento deve ser 'nfe' ou 'nfse'")
+
+        pasta = pasta or ("./danfe_xml" if documento == "nfe" else "./danfse_xml")
+        campo_id = "access_key" if documento == "nfe" else "id"
+        prefixo = "NFE" if documento == "nfe" else "NFS-e"
+
+        url = f"{self.base_url}/v1/{documento}/{tipo}"
+        params = {
+            "cnpj[]": cnpj.replace(".", "").replace("/", "").replace("-", ""),
+            "created_at[from]": created_from,
+            "created_at[to]": created_to,
+            "format_type": "xml"
+        }
+
+        logging.debug("=" * 60)
+        logging.info("ARQUIVANDO XMLs (%s %s) - %s a %s", documento.upper(), tipo.upper(), created_from, created_to)
+        logging.debug("=" * 60)
+
+        resumo = {"total": 0, "gravados": 0, "existentes": 0, "erros": 0, "paginas": 0, "completa": False}
+        os.makedirs(pasta, exist_ok=True)
+        inicio = time.perf_counter()
+
+        try:
+            for pagina in self._iterar_paginas(url, params):
+                resumo["paginas"] += 1
+
+                for item in pagina:
+                    resumo["total"] += 1
+                    id_documento = item.get(campo_id)
+                    xml_base64 = item.get("xml")
+
+                    if not id_documento or not xml_base64:
+                        resumo["erros"] += 1
+                        continue
+
+                    chave_documento = f"{documento}_xml:{id_documento}"
+                    caminho_arquivo = os.path.join(pasta, f"{prefixo}_{id_documento}.xml")
+
+                    if self._documento_em_cache(chave_documento, caminho_arquivo, forcar):
+                        resumo["existentes"] += 1
+                        continue
+
+                    try:
+                        xml_bytes = base64.b64decode(xml_base64)
+                        with open(caminho_arquivo, "wb") as f:
+                            f.write(xml_bytes)
+                    except Exception as e:
+                        logging.error("Erro ao gravar XML %s: %s", id_documento, e)
+                        resumo["erros"] += 1
+                        continue
+
+                    if self.manifesto is not None:
+                        self.manifesto.registrar(
+                            chave_documento, caminho_arquivo, hashlib.sha256(xml_bytes).hexdigest(), len(xml_bytes)
+                        )
+                    resumo["gravados"] += 1
+
+                logging.info("Página %s: %s XMLs processados", resumo['paginas'], resumo['total'])
+
+            resumo["completa"] = True
 
         except requests.exceptions.RequestException as e:
-            logging.error(f"Erro de requisição: {e}")
+            logging.error("Erro de requisição na página %s: %s", resumo['paginas'] + 1, e)
         except Exception as e:
-            logging.error(f"Erro ao salvar XML: {e}")
+            logging.error("Erro ao arquivar XMLs na página %s: %s", resumo['paginas'] + 1, e)
 
-        return None
+        duracao = time.perf_counter() - inicio
+        logging.info("RESUMO: %s em %.1fs", resumo, duracao)
+        return resumo
 
 
+    @com_correlacao
     def processar_nfse_por_numero(
         self,
         numero_nota,
@@ -685,7 +1633,8 @@ class QiveAPI:
         nome_arquivo_pdf=None,
         nome_arquivo_xml=None,
         pasta_pdf="./danfse_pdf",
-        pasta_xml="./danfse_xml"
+        pasta_xml="./danfse_xml",
+        forcar=False
     ):
         """
         Consulta se uma NFSe está cancelada e, se estiver ativa, baixa PDF e XML.
@@ -698,6 +1647,7 @@ class QiveAPI:
             nome_arquivo_xml (str, opcional): Nome do arquivo XML a ser salvo.
             pasta_pdf (str, opcional): Diretório para salvar o PDF.
             pasta_xml (str, opcional): Diretório para salvar o XML.
+            forcar (bool, opcional): Baixa de novo mesmo se já constar no manifesto.
         """
         from datetime import datetime
 
@@ -705,9 +1655,9 @@ class QiveAPI:
             if not data_fim:
                 data_fim = datetime.now().strftime("%Y-%m-%d")
             
-            logging.info("=" * 80)
-            logging.info(f"PROCESSANDO NFSe NÚMERO: {numero_nota}")
-            logging.info("=" * 80)
+            logging.debug("=" * 80)
+            logging.info("PROCESSANDO NFSe NÚMERO: %s", numero_nota)
+            logging.debug("=" * 80)
 
             # 1️⃣ Buscar nota pelo número
             nota_especifica = self.buscar_nfse_nota_por_numero(
@@ -725,39 +1675,40 @@ class QiveAPI:
             self.exibir_nota(nota_especifica)
             id_nfse = nota_especifica.get("id_arquivei")
 
-            # Pequeno delay para não sobrecarregar a API
-            time.sleep(0.3)
-
-            # 2️⃣ Verificar se está cancelada
-            notas_canceladas = self.buscar_nfse_cancelada(
-                cnpj=cnpj, 
-                id_notas=[id_nfse], 
-                limit=50
-            )
+            # 2️⃣ Verificar se está cancelada (pelo cache, quando houver)
+            if self.cache_cancelamentos is not None:
+                canceladas = self.buscar_nfse_canceladas_em_lote(
+                    [id_nfse], cnpj=cnpj, datas_emissao={id_nfse: nota_especifica.get("data_emissao")}
+                )
+                if canceladas is None:
+                    logging.error("Não foi possível verificar o cancelamento da NFSe.")
+                    return None
+                notas_canceladas = id_nfse in canceladas
+            else:
+                notas_canceladas = self.buscar_nfse_cancelada(
+                    cnpj=cnpj, 
+                    id_notas=[id_nfse], 
+                    limit=50
+                )
 
             if notas_canceladas:
-                logging.info(f"NFSe {numero_nota} está CANCELADA.")
+                logging.info("NFSe %s está CANCELADA.", numero_nota)
                 return {"status": "CANCELADA", "id_nfse": id_nfse}
 
             # 3️⃣ Se não estiver cancelada, baixar PDF e XML
-            logging.info(f"NFSe {numero_nota} ATIVA. Baixando arquivos...")
+            logging.info("NFSe %s ATIVA. Baixando arquivos...", numero_nota)
 
             if not nome_arquivo_pdf:
                 nome_arquivo_pdf = f"NFS-e_{numero_nota}.pdf"
             if not nome_arquivo_xml:
                 nome_arquivo_xml = f"NFS-e_{numero_nota}.xml"
 
-            # Pequeno delay para não sobrecarregar a API
-            time.sleep(0.3)
-
             caminho_pdf = self.baixar_nfse_pdf(
-                id_nfse=id_nfse, nome_arquivo=nome_arquivo_pdf, pasta=pasta_pdf
+                id_nfse=id_nfse, nome_arquivo=nome_arquivo_pdf, pasta=pasta_pdf, forcar=forcar
             )
 
-            # Pequeno delay para não sobrecarregar a API
-            time.sleep(0.3)
             caminho_xml = self.baixar_nfse_xml(
-                id_nfse=id_nfse, nome_arquivo=nome_arquivo_xml, pasta=pasta_xml
+                id_nfse=id_nfse, nome_arquivo=nome_arquivo_xml, pasta=pasta_xml, forcar=forcar
             )
 
             resultado = {
@@ -767,21 +1718,23 @@ class QiveAPI:
                 "xml": caminho_xml,
             }
 
-            logging.info(f"Arquivos baixados com sucesso: {resultado}")
+            logging.info("Arquivos baixados com sucesso: %s", resultado)
             return resultado
 
         except Exception as e:
-            logging.error(f"Erro ao processar NFSe: {e}")
+            logging.error("Erro ao processar NFSe: %s", e)
             return None
 
 
+    @com_correlacao
     def processar_nfe_por_chave(
         self,
         access_key,
         nome_arquivo_pdf=None,
         nome_arquivo_xml=None,
         pasta_pdf="./danfe_pdf",
-        pasta_xml="./danfe_xml"
+        pasta_xml="./danfe_xml",
+        forcar=False
     ):
         """
         Consulta se uma NFe está cancelada e, se estiver ativa, baixa PDF e XML.
@@ -792,43 +1745,47 @@ class QiveAPI:
             nome_arquivo_xml (str, opcional): Nome do arquivo XML a ser salvo.
             pasta_pdf (str, opcional): Diretório para salvar o PDF.
             pasta_xml (str, opcional): Diretório para salvar o XML.
+            forcar (bool, opcional): Baixa de novo mesmo se já constar no manifesto.
         """
         try:
-            logging.info("=" * 80)
-            logging.info(f"PROCESSANDO NFe CHAVE: {access_key}")
-            logging.info("=" * 80)
-
-            # 1️⃣ Verificar cancelamento
-            notas_canceladas = self.buscar_nfe_cancelada(access_key=[access_key])
+            logging.debug("=" * 80)
+            logging.info("PROCESSANDO NFe CHAVE: %s", access_key)
+            logging.debug("=" * 80)
+
+            # 1️⃣ Verificar cancelamento (pelo cache, quando houver)
+            if self.cache_cancelamentos is not None:
+                canceladas = self.buscar_nfe_canceladas_em_lote([access_key])
+                if canceladas is None:
+                    logging.error("Não foi possível verificar o cancelamento da NFe.")
+                    return None
+                notas_canceladas = access_key in canceladas
+            else:
+                notas_canceladas = self.buscar_nfe_cancelada(access_key=[access_key])
 
             if notas_canceladas:
-                logging.info(f"NFe {access_key} está CANCELADA.")
+                logging.info("NFe %s está CANCELADA.", access_key)
                 return {"status": "CANCELADA", "access_key": access_key}
 
             # 2️⃣ Se não estiver cancelada, baixar DANFE (PDF) e XML
-            logging.info(f"NFe {access_key} ATIVA. Baixando arquivos...")
+            logging.info("NFe %s ATIVA. Baixando arquivos...", access_key)
 
             if not nome_arquivo_pdf:
                 nome_arquivo_pdf = f"NFe_{access_key}.pdf"
             if not nome_arquivo_xml:
                 nome_arquivo_xml = f"NFe_{access_key}.xml"
-
-            # Pequeno delay para não sobrecarregar a API
-            time.sleep(0.3)
             
             caminho_pdf = self.baixar_nfe_pdf(
                 access_key=access_key, 
                 nome_arquivo=nome_arquivo_pdf, 
-                pasta=pasta_pdf
+                pasta=pasta_pdf,
+                forcar=forcar
             )
-
-            # Pequeno delay para não sobrecarregar a API
-            time.sleep(0.3)
             
             caminho_xml = self.baixar_nfe_xml(
                 access_key=access_key, 
                 nome_arquivo=nome_arquivo_xml, 
-                pasta=pasta_xml
+                pasta=pasta_xml,
+                forcar=forcar
             )
 
             resultado = {
@@ -838,9 +1795,124 @@ class QiveAPI:
                 "xml": caminho_xml,
             }
 
-            logging.info(f"Arquivos baixados com sucesso: {resultado}")
+            logging.info("Arquivos baixados com sucesso: %s", resultado)
             return resultado
 
         except Exception as e:
-            logging.error(f"Erro ao processar NFe: {e}")
+            logging.error("Erro ao processar NFe: %s", e)
             return None
+
+
+    @com_correlacao
+    def processar_nfe_lote(
+        self,
+        access_keys=None,
+        caminho_arquivo=None,
+        pasta_pdf="./danfe_pdf",
+        pasta_xml="./danfe_xml",
+        max_workers=8,
+        caminho_manifesto="./resultado_nfe_lote.jsonl",
+        forcar=False,
+        ao_concluir=None
+    ):
+        """
+        Processa um lote de NF-e: verifica os cancelamentos em massa e baixa
+        PDF e XML das chaves ativas em paralelo.
+
+        O pool de conexões da sessão (pool_size) deve ser >= max_workers
+        para que as threads não disputem conexões.
+
+        Args:
+            access_keys (list, opcional): Lista de chaves de acesso
+            caminho_arquivo (str, opcional): Arquivo texto/CSV com uma chave por linha (1ª coluna)
+            pasta_pdf (str, opcional): Diretório para salvar os PDFs.
+            pasta_xml (str, opcional): Diretório para salvar os XMLs.
+            max_workers (int): Quantidade de downloads simultâneos
+            caminho_manifesto (str): Arquivo JSONL com o resultado de cada chave
+            forcar (bool): Baixa de novo mesmo os documentos que já constam no manifesto de downloads
+            ao_concluir (callable, opcional): Chamado com o resultado de cada chave assim
+                que ela termina (na thread que chamou o método)
+
+        Returns:
+            list|None: Resultado de cada chave ou None se a verificação de cancelamento falhar
+        """
+        chaves = list(access_keys or [])
+        if caminho_arquivo:
+            with open(caminho_arquivo, "r", encoding="utf-8") as f:
+                for linha in f:
+                    chave = linha.strip().split(",")[0].split(";")[0].strip()
+                    if chave.isdigit():
+                        chaves.append(chave)
+        chaves = list(dict.fromkeys(chaves))
+
+        logging.debug("=" * 80)
+        logging.info("PROCESSANDO LOTE DE %s NF-e", len(chaves))
+        logging.debug("=" * 80)
+
+        inicio = time.perf_counter()
+
+        # 1️⃣ Cancelamentos em massa
+        canceladas = self.buscar_nfe_canceladas_em_lote(chaves)
+        if canceladas is None:
+            logging.error("Não foi possível verificar os cancelamentos do lote.")
+            return None
+
+        @com_correlacao
+        def baixar_ativa(chave):
+            inicio_chave = time.perf_counter()
+            caminho_pdf = self.baixar_nfe_pdf(
+                access_key=chave, nome_arquivo=f"NFe_{chave}.pdf", pasta=pasta_pdf, forcar=forcar
+            )
+            caminho_xml = self.baixar_nfe_xml(
+                access_key=chave, nome_arquivo=f"NFe_{chave}.xml", pasta=pasta_xml, forcar=forcar
+            )
+            return {
+                "access_key": chave,
+                "status": "ATIVA" if caminho_pdf and caminho_xml else "ERRO",
+                "pdf": caminho_pdf,
+                "xml": caminho_xml,
+                "duracao": round(time.perf_counter() - inicio_chave, 3),
+            }
+
+        resultados = []
+        pasta_manifesto = os.path.dirname(caminho_manifesto)
+        if pasta_manifesto:
+            os.makedirs(pasta_manifesto, exist_ok=True)
+
+        with open(caminho_manifesto, "a", encoding="utf-8") as manifesto:
+            def registrar(resultado):
+                resultados.append(resultado)
+                manifesto.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+                manifesto.flush()
+                if ao_concluir is not None:
+                    ao_concluir(resultado)
+
+            for chave in chaves:
+                if chave in canceladas:
+                    registrar({"access_key": chave, "status": "CANCELADA"})
+
+            # 2️⃣ Downloads das ativas em paralelo
+            ativas = [chave for chave in chaves if chave not in canceladas]
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futuros = {executor.submit(baixar_ativa, chave): chave for chave in ativas}
+                for futuro in as_completed(futuros):
+                    try:
+                        registrar(futuro.result())
+                    except Exception as e:
+                        logging.error("Erro ao processar NFe %s: %s", futuros[futuro], e)
+                        registrar({"access_key": futuros[futuro], "status": "ERRO", "erro": str(e)})
+
+        duracao = time.perf_counter() - inicio
+        total_erros = sum(1 for r in resultados if r["status"] == "ERRO")
+
+        logging.debug("=" * 80)
+        logging.info("RESUMO DO LOTE:")
+        logging.info("   Chaves processadas: %s", len(resultados))
+        logging.info("   Canceladas: %s", len(canceladas & set(chaves)))
+        logging.info("   Ativas baixadas: %s", len(resultados) - len(canceladas & set(chaves)) - total_erros)
+        logging.info("   Erros: %s", total_erros)
+        logging.info("   Duração: %.1fs (%.1f NF-e/s)", duracao, len(resultados) / duracao if duracao else 0)
+        logging.info("   Manifesto: %s", os.path.abspath(caminho_manifesto))
+        logging.debug("=" * 80)
+
+        return resultados
@@ -0,0 +1,573 @@
+import os
+import asyncio
+import base64
+import time
+import logging
+from datetime import datetime
+
+import httpx
+
+from lib_api_qive import QiveAPI
+from lib_rate_limiter import RateLimiter, interpretar_retry_after
+from lib_metricas_qive import MetricasQive, endpoint_da_url
+
+
+
+class AsyncQiveAPI:
+    """
+    Versão asyncio da QiveAPI, com a mesma superfície de métodos.
+
+    Todas as requisições passam por um semáforo global (max_concurrency),
+    de modo que milhares de documentos podem ser processados em paralelo
+    sem estourar conexões nem a cota da API.
+
+    Uso:
+        async with AsyncQiveAPI(api_id, api_key, max_concurrency=20) as qive:
+            resultados = await qive.processar_nfe_varias_chaves(chaves)
+    """
+
+    # Métodos puros (sem I/O) são compartilhados com a versão síncrona
+    extrair_dados_nota_json = QiveAPI.extrair_dados_nota_json
+    exibir_nota = QiveAPI.exibir_nota
+
+    def __init__(
+        self,
+        api_id,
+        api_key,
+        max_concurrency=20,
+        pool_size=None,
+        max_retries=3,
+        backoff_factor=0.5,
+        timeout=60,
+        requisicoes_por_segundo=20.0,
+        rate_limiter=None,
+        metricas=None,
+        base_url="https://api.arquivei.com.br"
+    ):
+        """
+        Args:
+            api_id: X-API-ID da conta Qive/Arquivei
+            api_key: X-API-KEY da conta Qive/Arquivei
+            max_concurrency: Máximo de requisições simultâneas (limite global)
+            pool_size: Conexões mantidas no pool (padrão: max_concurrency)
+            max_retries: Tentativas extras em caso de 5xx, timeout ou falha de conexão
+            backoff_factor: Fator do backoff exponencial entre tentativas
+            timeout: Timeout (segundos) de cada requisição
+            requisicoes_por_segundo: Orçamento de requisições por segundo do limitador padrão
+            rate_limiter: RateLimiter compartilhado (opcional); substitui o limitador padrão
+            metricas: MetricasQive (opcional) compartilhada; por padrão cada instância cria a sua
+            base_url: Endereço da API (ex: servidor mock local nos benchmarks)
+        """
+        self.base_url = base_url.rstrip("/")
+        self.headers = {
+            "X-API-ID": api_id,
+            "X-API-KEY": api_key
+        }
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.semaforo = asyncio.Semaphore(max_concurrency)
+        self.rate_limiter = rate_limiter or RateLimiter(requisicoes_por_segundo)
+        self.metricas = metricas or MetricasQive()
+
+        pool_size = pool_size or max_concurrency
+        self.client = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+        logging.info("AsyncQiveAPI inicializada (concorrência máxima: %s)", max_concurrency)
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+    async def close(self):
+        """Fecha o cliente HTTP e libera as conexões do pool"""
+        await self.client.aclose()
+
+
+    async def _get(self, url, params=None):
+        """
+        GET limitado pelo semáforo global e pelo rate limiter, com
+        retry/backoff exponencial em 5xx, timeouts e falhas de conexão.
+        Respostas 429 respeitam o Retry-After e reduzem a taxa do limitador.
+
+        Returns:
+            httpx.Response
+        """
+        endpoint = endpoint_da_url(url)
+
+        tentativa = 0
+        while True:
+            try:
+                self.metricas.registrar_throttle(endpoint, await self.rate_limiter.adquirir_async())
+                async with self.semaforo:
+                    inicio = time.perf_counter()
+                    try:
+                        response = await self.client.get(url, params=params)
+                    except httpx.HTTPError:
+                        self.metricas.registrar_requisicao(endpoint, time.perf_counter() - inicio)
+                        raise
+
+                self.metricas.registrar_requisicao(
+                    endpoint,
+                    time.perf_counter() - inicio,
+                    response.status_code,
+                    bytes_recebidos=len(response.content),
+                    bytes_enviados=len(str(response.request.url)) + sum(
+                        len(chave) + len(valor) + 4 for chave, valor in response.request.headers.items()
+                    )
+                )
+
+                if response.status_code == 429 and tentativa < self.max_retries:
+                    self.rate_limiter.registrar_429(interpretar_retry_after(response.headers.get("Retry-After")))
+                    self.metricas.registrar_retry(endpoint)
+                    tentativa += 1
+                    continue
+
+                if response.status_code not in (500, 502, 503, 504) or tentativa >= self.max_retries:
+                    if response.status_code < 400:
+                        self.rate_limiter.registrar_sucesso()
+                    return response
+
+                logging.warning("HTTP %s em %s (tentativa %s)", response.status_code, url, tentativa + 1)
+                self.metricas.registrar_retry(endpoint)
+
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if tentativa >= self.max_retries:
+                    raise
+                logging.warning("Falha de rede em %s (tentativa %s): %s", url, tentativa + 1, e)
+                self.metricas.registrar_retry(endpoint)
+
+            await asyncio.sleep(self.backoff_factor * (2 ** tentativa))
+            tentativa += 1
+
+
+    async def _get_json(self, url, params=None):
+        """GET + raise_for_status + validação do campo status.code; retorna o JSON ou None"""
+        response = await self._get(url, params=params)
+        logging.debug("Requisição URL: %s", response.url)
+        response.raise_for_status()
+        inicio = time.perf_counter()
+        data = response.json()
+        self.metricas.registrar_fase(endpoint_da_url(url), "decodificacao", time.perf_counter() - inicio)
+
+        if data.get("status", {}).get("code") != 200:
+            logging.error("Erro API: %s", data.get('status', {}).get('message'))
+            return None
+
+        return data
+
+
+    def _salvar_arquivo(self, conteudo, nome_arquivo, pasta):
+        """Grava bytes em pasta/nome_arquivo (executado fora do event loop)"""
+        os.makedirs(pasta, exist_ok=True)
+        caminho = os.path.join(pasta, nome_arquivo)
+        with open(caminho, "wb") as f:
+            f.write(conteudo)
+        return caminho
+
+
+    async def iterar_nfse_notas(self, cnpj, created_from, created_to, tipo="received", max_paginas=None, por_pagina=False):
+        """
+        Async generator: percorre as notas por cursor entregando cada página
+        assim que ela chega (sem acumular o período inteiro em memória)
+
+        Args:
+            cnpj: CNPJ para filtrar
+            created_from: Data de RECEBIMENTO inicial (formato: YYYY-MM-DD)
+            created_to: Data de RECEBIMENTO final (formato: YYYY-MM-DD)
+            tipo: "received" ou "emitted"
+            max_paginas: Limite de páginas (None = sem limite)
+            por_pagina: True = entrega listas (uma por página); False = entrega nota a nota
+
+        Yields:
+            Nota em formato JSON (ou lista de notas, se por_pagina=True)
+        """
+        cnpj_limpo = cnpj.replace(".", "").replace("/", "").replace("-", "")
+        url = f"{self.base_url}/v1/nfse/{tipo}"
+
+        params = {
+            "cnpj[]": cnpj_limpo,
+            "created_at[from]": created_from,
+            "created_at[to]": created_to,
+            "cursor": 0,
+            "limit": 50,
+            "format_type": "json"
+        }
+
+        total_notas = 0
+        cursor_atual = 0
+        pagina = 1
+
+        try:
+            while True:
+                if max_paginas and pagina > max_paginas:
+                    logging.info("Limite de %s páginas atingido", max_paginas)
+                    break
+
+                params["cursor"] = cursor_atual
+
+                try:
+                    data = await self._get_json(url, params=params)
+                    if data is None:
+                        break
+
+                    notas = data.get("data", [])
+                    if not notas:
+                        break
+
+                except httpx.HTTPStatusError as e:
+                    logging.error("Erro HTTP %s na página %s", e.response.status_code, pagina)
+                    break
+
+                except Exception as e:
+                    logging.error("Erro na página %s (cursor: %s): %s", pagina, cursor_atual, e)
+                    break
+
+                total_notas += len(notas)
+                if por_pagina:
+                    yield notas
+                else:
+                    for nota in notas:
+                        yield nota
+
+                if len(notas) < 50:
+                    break
+
+                cursor_atual += len(notas)
+                pagina += 1
+
+        finally:
+            logging.info("Total de notas: %s em %s página(s)", total_notas, pagina)
+
+
+    async def buscar_nfse_todas_notas_paginado(self, cnpj, created_from, created_to, tipo="received", max_paginas=None):
+        """
+        Busca TODAS as notas com paginação automática por cursor
+
+        Returns:
+            Lista completa de notas em formato JSON
+        """
+        return [nota async for nota in self.iterar_nfse_notas(cnpj, created_from, created_to, tipo, max_paginas)]
+
+
+    async def buscar_nfse_nota_por_numero(self, numero_nota, cnpj, created_from, created_to, tipo="received"):
+        """
+        Busca uma nota específica pelo número, parando no primeiro acerto
+
+        Returns:
+            Dados da nota ou None
+        """
+        notas = self.iterar_nfse_notas(cnpj, created_from, created_to, tipo)
+        try:
+            async for nota_json in notas:
+                dados = self.extrair_dados_nota_json(nota_json)
+                if dados and str(dados.get("numero")) == str(numero_nota):
+                    logging.info("NOTA %s ENCONTRADA!", numero_nota)
+                    return dados
+        finally:
+            await notas.aclose()
+
+        logging.info("Nota %s não encontrada", numero_nota)
+        return None
+
+
+    async def buscar_nfse_cancelada(self, cnpj=None, id_notas=None, tipo_evento="101101", limit=50):
+        """
+        Consulta o endpoint /v1/nfse/events para buscar eventos de cancelamento de NFS-e.
+
+        Returns:
+            Lista de eventos de cancelamento encontrados
+        """
+        url = f"{self.base_url}/v1/nfse/events"
+        params = {
+            "type[]": tipo_evento,
+            "limit": limit
+        }
+
+        if id_notas:
+            params["id[]"] = id_notas
+
+        if cnpj:
+            params["cnpj[]"] = cnpj.replace(".", "").replace("/", "").replace("-", "")
+
+        try:
+            data = await self._get_json(url, params=params)
+            if data is None:
+                return []
+
+            canceladas = [ev for ev in data.get("data", []) if ev.get("type") == "101101"]
+            logging.info("Total de notas canceladas: %s", len(canceladas))
+            return canceladas
+
+        except httpx.HTTPError as e:
+            logging.error("Erro ao consultar eventos: %s", e)
+            return []
+
+
+    async def buscar_nfe_cancelada(self, cnpj=None, access_key=None, tipo_evento="110111", limit=50):
+        """
+        Busca eventos de cancelamento (type=110111) de NF-e.
+
+        Returns:
+            list|None: Lista de eventos encontrados ou None se falhar
+        """
+        url = f"{self.base_url}/v2/nfe/events"
+        params = {
+            "type[]": tipo_evento,
+            "limit": limit,
+            "access_key": access_key
+        }
+
+        if cnpj:
+            params["cnpj[]"] = cnpj.replace(".", "").replace("/", "").replace("-", "")
+
+        try:
+            data = await self._get_json(url, params=params)
+            if data is None:
+                return None
+
+            eventos = data.get("data", [])
+            logging.info("%s evento(s) encontrado(s).", len(eventos))
+            return eventos
+
+        except httpx.HTTPError as e:
+            logging.error("Erro de requisição: %s", e)
+        except Exception as e:
+            logging.error("Erro inesperado: %s", e)
+
+        return None
+
+
+    async def _baixar_documento(self, url, params, extrair_base64, nome_arquivo, pasta, descricao):
+        """
+        Fluxo comum de download: GET, extrai o campo base64, decodifica e salva.
+
+        Args:
+            extrair_base64: função que recebe o JSON e devolve a string base64 (ou None)
+            descricao: texto usado nos logs (ex: "DANFE")
+
+        Returns:
+            str|None: Caminho do arquivo salvo ou None em caso de erro
+        """
+        try:
+            data = await self._get_json(url, params=params)
+            if data is None:
+                return None
+
+            conteudo_base64 = extrair_base64(data)
+            if not conteudo_base64:
+                logging.error("%s: conteúdo base64 vazio ou inexistente.", descricao)
+                return None
+
+            endpoint = endpoint_da_url(url)
+            inicio = time.perf_counter()
+            conteudo = base64.b64decode(conteudo_base64)
+            self.metricas.registrar_fase(endpoint, "decodificacao", time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            caminho = await asyncio.to_thread(self._salvar_arquivo, conteudo, nome_arquivo, pasta)
+            self.metricas.registrar_fase(endpoint, "escrita", time.perf_counter() - inicio)
+
+            logging.info("%s salvo com sucesso: %s", descricao, caminho)
+            return caminho
+
+        except httpx.HTTPError as e:
+            logging.error("Erro de requisição (%s): %s", descricao, e)
+        except Exception as e:
+            logging.error("Erro ao salvar %s: %s", descricao, e)
+
+        return None
+
+
+    @staticmethod
+    def _primeiro_xml(data):
+        itens = data.get("data", [])
+        return itens[0].get("xml") if itens else None
+
+
+    @staticmethod
+    def _nome_com_extensao(nome_arquivo, padrao, extensao):
+        nome_arquivo = nome_arquivo or padrao
+        if not nome_arquivo.lower().endswith(extensao):
+            nome_arquivo += extensao
+        return nome_arquivo
+
+
+    async def baixar_nfe_pdf(self, access_key, nome_arquivo=None, pasta="./danfe_pdf"):
+        """Baixa o DANFE (PDF) de uma NF-e pela chave de acesso"""
+        return await self._baixar_documento(
+            f"{self.base_url}/v1/nfe/danfe",
+            {"access_key": access_key},
+            lambda data: data.get("data", {}).get("encoded_pdf"),
+            self._nome_com_extensao(nome_arquivo, f"DANFE_{access_key}", ".pdf"),
+            pasta,
+            "DANFE"
+        )
+
+
+    async def baixar_nfe_xml(self, access_key, nome_arquivo=None, pasta="./danfe_xml"):
+        """Baixa o XML de uma NF-e pela chave de acesso"""
+        return await self._baixar_documento(
+            f"{self.base_url}/v1/nfe/received",
+            {"access_key[]": access_key, "format_type": "xml"},
+            self._primeiro_xml,
+            self._nome_com_extensao(nome_arquivo, f"NFE_{access_key}", ".xml"),
+            pasta,
+            "XML NF-e"
+        )
+
+
+    async def baixar_nfse_pdf(self, id_nfse, nome_arquivo=None, pasta="./danfse_pdf"):
+        """Baixa o DANFSe (PDF) de uma NFS-e pelo ID"""
+        return await self._baixar_documento(
+            f"{self.base_url}/v1/nfse/danfse",
+            {"id": id_nfse},
+            lambda data: data.get("data", {}).get("encoded_pdf"),
+            self._nome_com_extensao(nome_arquivo, f"NFS-e_{id_nfse}", ".pdf"),
+            pasta,
+            "DANFSe"
+        )
+
+
+    async def baixar_nfse_xml(self, id_nfse, nome_arquivo=None, pasta="./danfse_xml"):
+        """Baixa o XML de uma NFS-e pelo ID"""
+        return await self._baixar_documento(
+            f"{self.base_url}/v1/nfse/received",
+            {"id[]": id_nfse, "format_type": "xml"},
+            self._primeiro_xml,
+            self._nome_com_extensao(nome_arquivo, f"NFS-e_{id_nfse}", ".xml"),
+            pasta,
+            "XML NFS-e"
+        )
+
+
+    async def processar_nfse_por_numero(
+        self,
+        numero_nota,
+        cnpj,
+        data_emissao,
+        data_fim=None,
+        nome_arquivo_pdf=None,
+        nome_arquivo_xml=None,
+        pasta_pdf="./danfse_pdf",
+        pasta_xml="./danfse_xml"
+    ):
+        """
+        Consulta se uma NFSe está cancelada e, se estiver ativa, baixa PDF e XML
+        (os dois downloads rodam em paralelo).
+        """
+        try:
+            if not data_fim:
+                data_fim = datetime.now().strftime("%Y-%m-%d")
+
+            nota_especifica = await self.buscar_nfse_nota_por_numero(
+                numero_nota=numero_nota,
+                cnpj=cnpj,
+                created_from=data_emissao,
+                created_to=data_fim,
+                tipo="received"
+            )
+
+            if not nota_especifica:
+                logging.warning("NFSe %s não encontrada.", numero_nota)
+                return None
+
+            id_nfse = nota_especifica.get("id_arquivei")
+
+            notas_canceladas = await self.buscar_nfse_cancelada(cnpj=cnpj, id_notas=[id_nfse], limit=50)
+            if notas_canceladas:
+                logging.info("NFSe %s está CANCELADA.", numero_nota)
+                return {"status": "CANCELADA", "id_nfse": id_nfse}
+
+            caminho_pdf, caminho_xml = await asyncio.gather(
+                self.baixar_nfse_pdf(
+                    id_nfse=id_nfse, nome_arquivo=nome_arquivo_pdf or f"NFS-e_{numero_nota}.pdf", pasta=pasta_pdf
+                ),
+                self.baixar_nfse_xml(
+                    id_nfse=id_nfse, nome_arquivo=nome_arquivo_xml or f"NFS-e_{numero_nota}.xml", pasta=pasta_xml
+                )
+            )
+
+            return {
+                "status": "ATIVA",
+                "id_nfse": id_nfse,
+                "pdf": caminho_pdf,
+                "xml": caminho_xml,
+            }
+
+        except Exception as e:
+            logging.error("Erro ao processar NFSe %s: %s", numero_nota, e)
+            return None
+
+
+    async def processar_nfe_por_chave(
+        self,
+        access_key,
+        nome_arquivo_pdf=None,
+        nome_arquivo_xml=None,
+        pasta_pdf="./danfe_pdf",
+        pasta_xml="./danfe_xml"
+    ):
+        """
+        Consulta se uma NFe está cancelada e, se estiver ativa, baixa PDF e XML
+        (os dois downloads rodam em paralelo).
+        """
+        try:
+            notas_canceladas = await self.buscar_nfe_cancelada(access_key=[access_key])
+
+            if notas_canceladas:
+                logging.info("NFe %s está CANCELADA.", access_key)
+                return {"status": "CANCELADA", "access_key": access_key}
+
+            caminho_pdf, caminho_xml = await asyncio.gather(
+                self.baixar_nfe_pdf(
+                    access_key=access_key, nome_arquivo=nome_arquivo_pdf or f"NFe_{access_key}.pdf", pasta=pasta_pdf
+                ),
+                self.baixar_nfe_xml(
+                    access_key=access_key, nome_arquivo=nome_arquivo_xml or f"NFe_{access_key}.xml", pasta=pasta_xml
+                )
+            )
+
+            return {
+                "status": "ATIVA",
+                "access_key": access_key,
+                "pdf": caminho_pdf,
+                "xml": caminho_xml,
+            }
+
+        except Exception as e:
+            logging.error("Erro ao processar NFe %s: %s", access_key, e)
+            return None
+
+
+    async def processar_nfe_varias_chaves(self, access_keys, pasta_pdf="./danfe_pdf", pasta_xml="./danfe_xml"):
+        """
+        Processa uma lista de chaves de NF-e em paralelo. A concorrência real
+        de requisições é limitada pelo semáforo global (max_concurrency).
+
+        Args:
+            access_keys: Lista de chaves de acesso
+            pasta_pdf: Diretório para salvar os PDFs
+            pasta_xml: Diretório para salvar os XMLs
+
+        Returns:
+            Lista de resultados na mesma ordem das chaves
+        """
+        inicio = datetime.now()
+
+        resultados = await asyncio.gather(*(
+            self.processar_nfe_por_chave(access_key=chave, pasta_pdf=pasta_pdf, pasta_xml=pasta_xml)
+            for chave in access_keys
+        ))
+
+        duracao = (datetime.now() - inicio).total_seconds()
+        logging.info("%s NF-e processadas em %.1fs", len(access_keys), duracao)
+        return resultados
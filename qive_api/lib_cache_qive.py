@@ -0,0 +1,562 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import calendar
+import threading
+from datetime import date, datetime
+from urllib.parse import urlencode
+
+
+
+def sha256_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    """Calcula o SHA-256 de um arquivo lendo em blocos"""
+    hasher = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            hasher.update(bloco)
+    return hasher.hexdigest()
+
+
+class ManifestoDownloads:
+    """
+    Manifesto local (SQLite) dos documentos já baixados.
+
+    Cada documento é registrado pela sua chave lógica (ex: "nfe_pdf:<chave>")
+    com caminho, SHA-256, tamanho e data do download. Antes de baixar, os
+    métodos baixar_* consultam o manifesto: se o arquivo existe e confere,
+    o download é pulado. Se o mesmo documento já foi salvo em outro caminho,
+    o conteúdo é copiado localmente em vez de ser baixado de novo.
+    """
+
+    def __init__(self, caminho="./manifesto_downloads.sqlite3", verificar_hash=False):
+        """
+        Args:
+            caminho: Arquivo SQLite do manifesto (criado se não existir)
+            verificar_hash: True = confere o SHA-256 do arquivo antes de reaproveitar
+                            (mais lento); False = confere apenas existência e tamanho
+        """
+        self.caminho = caminho
+        self.verificar_hash = verificar_hash
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS documentos (
+                    chave TEXT PRIMARY KEY,
+                    caminho TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    tamanho INTEGER NOT NULL,
+                    baixado_em TEXT NOT NULL
+                )
+            """)
+
+        logging.info("Manifesto de downloads aberto: %s", caminho)
+
+
+    def close(self):
+        """Fecha a conexão com o banco"""
+        with self._lock:
+            self._conn.close()
+
+
+    def _arquivo_confere(self, caminho, sha256, tamanho):
+        if not os.path.isfile(caminho) or os.path.getsize(caminho) != tamanho:
+            return False
+        return not self.verificar_hash or sha256_arquivo(caminho) == sha256
+
+
+    def documento_valido(self, chave, caminho):
+        """
+        Verifica se o documento já está disponível em `caminho`
+
+        Args:
+            chave: Chave lógica do documento (ex: "nfe_pdf:<access_key>")
+            caminho: Caminho onde o documento deve estar
+
+        Returns:
+            bool: True se o arquivo em `caminho` é válido (copiado do
+                  caminho registrado, se necessário)
+        """
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT caminho, sha256, tamanho FROM documentos WHERE chave = ?", (chave,)
+            ).fetchone()
+
+        if not linha:
+            return False
+
+        caminho_registrado, sha256, tamanho = linha
+
+        if os.path.abspath(caminho_registrado) == os.path.abspath(caminho):
+            return self._arquivo_confere(caminho, sha256, tamanho)
+
+        if self._arquivo_confere(caminho, sha256, tamanho):
+            return True
+
+        # Mesmo documento salvo com outro nome/pasta: copia em vez de baixar
+        if self._arquivo_confere(caminho_registrado, sha256, tamanho):
+            pasta = os.path.dirname(caminho)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            shutil.copyfile(caminho_registrado, caminho)
+            self.registrar(chave, caminho, sha256, tamanho)
+            return True
+
+        return False
+
+
+    def registrar(self, chave, caminho, sha256=None, tamanho=None):
+        """
+        Registra (ou atualiza) um documento baixado
+
+        Args:
+            chave: Chave lógica do documento
+            caminho: Caminho do arquivo salvo
+            sha256: Hash já calculado (opcional; calculado a partir do arquivo se None)
+            tamanho: Tamanho em bytes (opcional)
+        """
+        if sha256 is None:
+            sha256 = sha256_arquivo(caminho)
+        if tamanho is None:
+            tamanho = os.path.getsize(caminho)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documentos VALUES (?, ?, ?, ?, ?)",
+                (chave, caminho, sha256, tamanho, datetime.now().isoformat(timespec="seconds"))
+            )
+
+
+    def remover(self, chave):
+        """Remove um documento do manifesto (o arquivo em disco não é apagado)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documentos WHERE chave = ?", (chave,))
+
+
+def data_emissao_chave_nfe(access_key):
+    """
+    Data de emissão estimada pela chave de acesso da NF-e (AAMM nas posições 3-6).
+    Como o dia não consta na chave, usa o último dia do mês (ou hoje, se for o mês
+    corrente), o que nunca faz o documento parecer mais antigo do que é.
+
+    Returns:
+        date|None
+    """
+    chave = str(access_key or "")
+    if len(chave) != 44 or not chave.isdigit():
+        return None
+
+    ano, mes = 2000 + int(chave[2:4]), int(chave[4:6])
+    if not 1 <= mes <= 12:
+        return None
+
+    ultimo_dia = date(ano, mes, calendar.monthrange(ano, mes)[1])
+    return min(ultimo_dia, date.today())
+
+
+class CacheCancelamento:
+    """
+    Cache persistente (SQLite) do status de cancelamento de NF-e/NFS-e.
+
+    Cancelamento é uma transição sem volta: uma vez confirmado, fica guardado
+    para sempre. O resultado "não cancelada" vale por um TTL que cresce com a
+    idade do documento (documentos recentes ainda podem ser cancelados;
+    antigos dificilmente mudam):
+
+        ttl = min(ttl_maximo, max(ttl_base, idade * fator_idade))
+
+    Com idade_definitiva_dias, documentos mais velhos que isso e não cancelados
+    também passam a ser permanentes (ex: prazo legal de cancelamento expirado).
+    """
+
+    def __init__(
+        self,
+        caminho="./cache_cancelamentos.sqlite3",
+        ttl_base=6 * 3600,
+        fator_idade=0.5,
+        ttl_maximo=30 * 86400,
+        idade_definitiva_dias=None
+    ):
+        """
+        Args:
+            caminho: Arquivo SQLite do cache (criado se não existir)
+            ttl_base: TTL mínimo (s) de um resultado "não cancelada"
+            fator_idade: Fração da idade do documento usada como TTL (0.5 = metade da idade)
+            ttl_maximo: TTL máximo (s) de um resultado "não cancelada"
+            idade_definitiva_dias: Idade (dias) a partir da qual "não cancelada" não expira (None = sempre expira)
+        """
+        self.caminho = caminho
+        self.ttl_base = ttl_base
+        self.fator_idade = fator_idade
+        self.ttl_maximo = ttl_maximo
+        self.idade_definitiva_dias = idade_definitiva_dias
+        self.acertos = 0
+        self.consultas = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cancelamentos (
+                    chave TEXT PRIMARY KEY,
+                    cancelada INTEGER NOT NULL,
+                    data_documento TEXT,
+                    verificado_em REAL NOT NULL,
+                    expira_em REAL
+                )
+            """)
+
+        logging.info("Cache de cancelamentos aberto: %s", caminho)
+
+
+    def close(self):
+        """Fecha a conexão com o banco"""
+        with self._lock:
+            self._conn.close()
+
+
+    def ttl(self, data_documento=None):
+        """
+        TTL (s) de um resultado "não cancelada"; None = permanente
+
+        Args:
+            data_documento: Data de emissão (date ou texto YYYY-MM-DD...) ou None se desconhecida.
+                            Data inválida é tratada como desconhecida (ttl_base).
+        """
+        if data_documento is None:
+            return self.ttl_base
+
+        try:
+            if isinstance(data_documento, datetime):
+                data_documento = data_documento.date()
+            elif isinstance(data_documento, str):
+                data_documento = date.fromisoformat(data_documento[:10])
+            idade_dias = max(0, (date.today() - data_documento).days)
+        except (ValueError, TypeError):
+            logging.warning("Data de documento inválida para o TTL do cache: %r", data_documento)
+            return self.ttl_base
+
+
+        if self.idade_definitiva_dias is not None and idade_dias >= self.idade_definitiva_dias:
+            return None
+
+        return min(self.ttl_maximo, max(self.ttl_base, idade_dias * 86400 * self.fator_idade))
+
+
+    def separar(self, documento, ids):
+        """
+        Separa os documentos resolvidos pelo cache dos que precisam ir à API
+
+        Args:
+            documento: "nfe" ou "nfse"
+            ids: Chaves de acesso / IDs Qive
+
+        Returns:
+            tuple(set, set, list): (canceladas, ativas, pendentes de consulta)
+        """
+        ids = list(dict.fromkeys(ids))
+        agora = time.time()
+        canceladas, ativas = set(), set()
+
+        with self._lock:
+            for inicio in range(0, len(ids), 500):
+                lote = ids[inicio:inicio + 500]
+                linhas = self._conn.execute(
+                    f"SELECT chave, cancelada, expira_em FROM cancelamentos WHERE chave IN ({','.join('?' * len(lote))})",
+                    [f"{documento}:{i}" for i in lote]
+                ).fetchall()
+
+                for chave, cancelada, expira_em in linhas:
+                    identificador = chave.split(":", 1)[1]
+                    if cancelada:
+                        canceladas.add(identificador)
+                    elif expira_em is None or expira_em > agora:
+                        ativas.add(identificador)
+
+            self.consultas += len(ids)
+            self.acertos += len(canceladas) + len(ativas)
+
+        pendentes = [i for i in ids if i not in canceladas and i not in ativas]
+        return canceladas, ativas, pendentes
+
+
+    def registrar(self, documento, ids_consultados, canceladas, datas=None):
+        """
+        Grava o resultado de uma consulta à API
+
+        Args:
+            documento: "nfe" ou "nfse"
+            ids_consultados: Todos os IDs enviados na consulta
+            canceladas: IDs que vieram com evento de cancelamento
+            datas: Dict opcional id -> data de emissão (para o TTL por idade)
+        """
+        datas = datas or {}
+        agora = time.time()
+        linhas = []
+
+        for identificador in ids_consultados:
+            data_documento = datas.get(identificador)
+            if data_documento is None and documento == "nfe":
+                data_documento = data_emissao_chave_nfe(identificador)
+            if isinstance(data_documento, date):
+                data_documento = data_documento.isoformat()
+
+            if identificador in canceladas:
+                linhas.append((f"{documento}:{identificador}", 1, data_documento, agora, None))
+            else:
+                ttl = self.ttl(data_documento)
+                linhas.append((f"{documento}:{identificador}", 0, data_documento, agora, None if ttl is None else agora + ttl))
+
+        with self._lock, self._conn:
+            # Um cancelamento já confirmado nunca é sobrescrito por "não cancelada"
+            self._conn.executemany(
+                """
+                INSERT INTO cancelamentos VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(chave) DO UPDATE SET
+                    cancelada = excluded.cancelada,
+                    data_documento = COALESCE(excluded.data_documento, cancelamentos.data_documento),
+                    verificado_em = excluded.verificado_em,
+                    expira_em = excluded.expira_em
+                WHERE cancelamentos.cancelada = 0
+                """,
+                linhas
+            )
+
+
+    def remover(self, documento, identificador):
+        """Descarta o status guardado de um documento"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cancelamentos WHERE chave = ?", (f"{documento}:{identificador}",))
+
+
+    def estatisticas(self):
+        """Acertos do cache desde a abertura"""
+        with self._lock:
+            return {
+                "consultas": self.consultas,
+                "acertos": self.acertos,
+                "taxa_acerto": round(self.acertos / self.consultas, 4) if self.consultas else 0.0,
+            }
+
+
+# TTL (s) padrão por endpoint; endpoints fora do dict não são guardados.
+# Os endpoints de eventos ficam de fora: a validade dos status de cancelamento
+# é controlada pelo CacheCancelamento (e --revalidar precisa ir à API)
+TTLS_RESPOSTAS = {
+    "/v1/nfse/received": 600,
+    "/v1/nfse/emitted": 600,
+    "/v1/nfe/received": 600,
+}
+
+
+def normalizar_parametros(params):
+    """
+    Query string canônica: chaves ordenadas e listas (id[], access_key...)
+    ordenadas, para que a mesma consulta gere sempre a mesma chave de cache
+    """
+    itens = []
+    for chave, valor in (params or {}).items():
+        if valor is None:
+            continue
+        if isinstance(valor, (list, tuple, set)):
+            itens.extend((chave, str(v)) for v in sorted(str(v) for v in valor))
+        else:
+            itens.append((chave, str(valor)))
+    return urlencode(sorted(itens))
+
+
+class CacheRespostas:
+    """
+    Cache em disco (SQLite) das respostas JSON das listagens.
+
+    A chave é o endpoint + parâmetros normalizados. Cada endpoint tem seu TTL
+    (ttls); páginas de períodos já fechados (created_at[to] anterior a hoje
+    menos dias_fechamento) não expiram. O tamanho total é limitado: ao passar
+    de tamanho_maximo, as respostas acessadas há mais tempo são descartadas (LRU).
+    """
+
+    def __init__(
+        self,
+        caminho="./cache_respostas.sqlite3",
+        tamanho_maximo=512 * 1024 * 1024,
+        ttls=None,
+        dias_fechamento=1
+    ):
+        """
+        Args:
+            caminho: Arquivo SQLite do cache (criado se não existir)
+            tamanho_maximo: Limite (bytes) da soma dos corpos guardados
+            ttls: Dict endpoint -> TTL em segundos (padrão: TTLS_RESPOSTAS)
+            dias_fechamento: Dias após created_at[to] para o período ser considerado fechado
+                             (None = nenhuma resposta é permanente)
+        """
+        self.caminho = caminho
+        self.tamanho_maximo = tamanho_maximo
+        self.ttls = dict(TTLS_RESPOSTAS if ttls is None else ttls)
+        self.dias_fechamento = dias_fechamento
+        self.acertos = 0
+        self.falhas = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS respostas (
+                    chave TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    corpo BLOB NOT NULL,
+                    tamanho INTEGER NOT NULL,
+                    criado_em REAL NOT NULL,
+                    expira_em REAL,
+                    acessado_em REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_respostas_acesso ON respostas (acessado_em);
+            """)
+
+        self._tamanho_total = self._conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+        logging.info("Cache de respostas aberto: %s (%.1f MB)", caminho, self._tamanho_total / (1024 * 1024))
+
+
+    def close(self):
+        """Fecha a conexão com o banco"""
+        with self._lock:
+            self._conn.close()
+
+
+    def aceita(self, endpoint):
+        """True se o endpoint tem TTL configurado (respostas dele podem ser guardadas)"""
+        return bool(self.ttls.get(endpoint))
+
+
+    @staticmethod
+    def chave(endpoint, params):
+        return endpoint + "?" + normalizar_parametros(params)
+
+
+    def _periodo_fechado(self, params):
+        if self.dias_fechamento is None or not params:
+            return False
+        fim = params.get("created_at[to]")
+        if not fim:
+            return False
+        try:
+            data_fim = date.fromisoformat(str(fim)[:10])
+        except ValueError:
+            return False
+        return (date.today() - data_fim).days >= self.dias_fechamento
+
+
+    def obter(self, endpoint, params):
+        """
+        Corpo guardado para a consulta, ou None se ausente/expirado
+
+        Args:
+            endpoint: Caminho do endpoint (ex: /v1/nfse/received)
+            params: Parâmetros da requisição
+
+        Returns:
+            bytes|None
+        """
+        if not self.aceita(endpoint):
+            return None
+
+        chave = self.chave(endpoint, params)
+        agora = time.time()
+
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT corpo, expira_em FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+
+            if linha is None or (linha[1] is not None and linha[1] <= agora):
+                self.falhas += 1
+                return None
+
+            with self._conn:
+                self._conn.execute("UPDATE respostas SET acessado_em = ? WHERE chave = ?", (agora, chave))
+            self.acertos += 1
+            return linha[0]
+
+
+    def guardar(self, endpoint, params, corpo):
+        """
+        Guarda o corpo de uma resposta 200 cujo status.code também seja 200
+
+        Args:
+            endpoint: Caminho do endpoint
+            params: Parâmetros da requisição
+            corpo: Bytes da resposta JSON
+        """
+        ttl = self.ttls.get(endpoint)
+        if not ttl or not corpo or len(corpo) > self.tamanho_maximo:
+            return
+
+        try:
+            if json.loads(corpo).get("status", {}).get("code") != 200:
+                return
+        except ValueError:
+            return
+
+        chave = self.chave(endpoint, params)
+        agora = time.time()
+        expira_em = None if self._periodo_fechado(params) else agora + ttl
+
+        with self._lock, self._conn:
+            anterior = self._conn.execute("SELECT tamanho FROM respostas WHERE chave = ?", (chave,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chave, endpoint, sqlite3.Binary(corpo), len(corpo), agora, expira_em, agora)
+            )
+            self._tamanho_total += len(corpo) - (anterior[0] if anterior else 0)
+
+            if self._tamanho_total > self.tamanho_maximo:
+                self._despejar()
+
+
+    def _despejar(self):
+        """Remove expirados e, se preciso, os menos acessados até 90% do limite (com o lock)"""
+        self._conn.execute("DELETE FROM respostas WHERE expira_em IS NOT NULL AND expira_em <= ?", (time.time(),))
+        self._tamanho_total = self._conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+
+        alvo = self.tamanho_maximo * 0.9
+        descartar = []
+        for chave, tamanho in self._conn.execute("SELECT chave, tamanho FROM respostas ORDER BY acessado_em"):
+            if self._tamanho_total <= alvo:
+                break
+            descartar.append((chave,))
+            self._tamanho_total -= tamanho
+
+        self._conn.executemany("DELETE FROM respostas WHERE chave = ?", descartar)
+        logging.info("Cache de respostas: %s resposta(s) descartada(s) (LRU)", len(descartar))
+
+
+    def limpar(self, endpoint=None):
+        """Apaga todas as respostas (ou só as de um endpoint)"""
+        with self._lock, self._conn:
+            if endpoint:
+                self._conn.execute("DELETE FROM respostas WHERE endpoint = ?", (endpoint,))
+            else:
+                self._conn.execute("DELETE FROM respostas")
+            self._tamanho_total = self._conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+
+
+    def estatisticas(self):
+        """Acertos, falhas e ocupação do cache"""
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": round(self.acertos / total, 4) if total else 0.0,
+                "tamanho_total": self._tamanho_total,
+            }
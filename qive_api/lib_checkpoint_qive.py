@@ -0,0 +1,200 @@
+import os
+import json
+import logging
+from datetime import datetime
+
+
+
+class EstadoVarredura:
+    """
+    Situação de uma varredura por cursor, preenchida por iterar_nfse_notas.
+
+    Atributos:
+        completa: True somente se a última página foi alcançada
+        motivo: "fim", "max_paginas", "timeout", "conexao", "http_<code>",
+                "erro_api", "erro" ou "interrompida"
+        cursor: Próximo cursor ainda não lido
+        paginas: Páginas recebidas (incluindo as recuperadas do checkpoint)
+        total_notas: Notas entregues ao consumidor
+    """
+
+    def __init__(self, cursor=0):
+        self.completa = False
+        self.motivo = None
+        self.cursor = cursor
+        self.paginas = 0
+        self.total_notas = 0
+
+
+    def como_dict(self):
+        return {
+            "completa": self.completa,
+            "motivo": self.motivo,
+            "cursor": self.cursor,
+            "paginas": self.paginas,
+            "total_notas": self.total_notas,
+        }
+
+
+class ResultadoVarredura(list):
+    """
+    Lista de notas que também informa se a varredura foi completa ou truncada
+    (continua sendo uma list, compatível com o retorno antigo)
+    """
+
+    def __init__(self, notas, estado):
+        super().__init__(notas)
+        self.completa = estado.completa
+        self.motivo = estado.motivo
+        self.cursor_final = estado.cursor
+        self.paginas = estado.paginas
+
+
+    @property
+    def truncada(self):
+        return not self.completa
+
+
+class CheckpointVarredura:
+    """
+    Persiste o progresso de uma varredura em dois arquivos:
+
+        <caminho>              JSON com parâmetros, cursor e nº de páginas salvas
+        <caminho>.notas.jsonl  uma linha por página já recebida
+
+    O estado é regravado (de forma atômica) depois de cada página anexada;
+    ao retomar, só as páginas contabilizadas no estado são relidas, então
+    uma página gravada pela metade em um crash é descartada.
+    """
+
+    def __init__(self, caminho):
+        """
+        Args:
+            caminho: Arquivo JSON do checkpoint (ex: ./checkpoints/nfse_2025-01.json)
+        """
+        self.caminho = caminho
+        self.caminho_notas = caminho + ".notas.jsonl"
+        self.estado = None
+
+
+    def _gravar_estado(self):
+        self.estado["atualizado_em"] = datetime.now().isoformat(timespec="seconds")
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(self.estado, f, ensure_ascii=False)
+        os.replace(temporario, self.caminho)
+
+
+    def _descartar_paginas_orfas(self):
+        """
+        Corta do JSONL páginas gravadas após o último estado salvo (crash no meio)
+
+        Returns:
+            bool: False se o JSONL tem menos páginas que o estado (checkpoint inutilizável)
+        """
+        if not os.path.exists(self.caminho_notas):
+            return self.estado["paginas"] == 0
+
+        tamanho_valido = 0
+        paginas_lidas = 0
+        with open(self.caminho_notas, "rb") as f:
+            for linha in f:
+                if paginas_lidas >= self.estado["paginas"] or not linha.endswith(b"\n"):
+                    break
+                tamanho_valido += len(linha)
+                paginas_lidas += 1
+
+        if os.path.getsize(self.caminho_notas) != tamanho_valido:
+            logging.warning("Descartando página incompleta do checkpoint")
+            with open(self.caminho_notas, "r+b") as f:
+                f.truncate(tamanho_valido)
+
+        return paginas_lidas == self.estado["paginas"]
+
+
+    def iniciar(self, parametros, cursor_inicial=0):
+        """
+        Carrega o checkpoint se ele pertencer aos mesmos parâmetros;
+        caso contrário começa um novo (descartando o anterior)
+
+        Args:
+            parametros: Dict que identifica a varredura (cnpj, tipo, datas...)
+            cursor_inicial: Cursor de partida de uma varredura nova
+
+        Returns:
+            dict: Estado carregado/criado (cursor, paginas, completa)
+        """
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+        if os.path.exists(self.caminho):
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                estado = json.load(f)
+
+            self.estado = estado
+            if estado.get("parametros") != parametros:
+                logging.warning("Checkpoint existente é de outra varredura; iniciando do zero")
+            elif not self._descartar_paginas_orfas():
+                logging.warning("Checkpoint inconsistente (páginas faltando); iniciando do zero")
+            else:
+                logging.info(
+                    f"Checkpoint encontrado: cursor {estado['cursor']}, {estado['paginas']} página(s), "
+                    f"completa={estado['completa']}"
+                )
+                return self.estado
+
+        self.estado = {
+            "parametros": parametros,
+            "cursor_inicial": cursor_inicial,
+            "cursor": cursor_inicial,
+            "paginas": 0,
+            "completa": False,
+            "motivo": None,
+        }
+        with open(self.caminho_notas, "w", encoding="utf-8"):
+            pass
+        self._gravar_estado()
+        return self.estado
+
+
+    def iterar_paginas_salvas(self):
+        """Relê as páginas já contabilizadas no checkpoint"""
+        if not self.estado or not self.estado["paginas"] or not os.path.exists(self.caminho_notas):
+            return
+
+        with open(self.caminho_notas, "r", encoding="utf-8") as f:
+            for indice, linha in enumerate(f):
+                if indice >= self.estado["paginas"]:
+                    break
+                yield json.loads(linha)
+
+
+    def salvar_pagina(self, notas, cursor):
+        """
+        Anexa uma página e avança o cursor
+
+        Args:
+            notas: Notas da página recebida
+            cursor: Próximo cursor ainda não lido
+        """
+        with open(self.caminho_notas, "a", encoding="utf-8") as f:
+            f.write(json.dumps(notas, ensure_ascii=False) + "\n")
+
+        self.estado["cursor"] = cursor
+        self.estado["paginas"] += 1
+        self._gravar_estado()
+
+
+    def finalizar(self, completa, motivo):
+        """Registra o desfecho da varredura"""
+        self.estado["completa"] = completa
+        self.estado["motivo"] = motivo
+        self._gravar_estado()
+
+
+    def remover(self):
+        """Apaga os arquivos do checkpoint"""
+        for caminho in (self.caminho, self.caminho_notas):
+            if os.path.exists(caminho):
+                os.remove(caminho)
@@ -0,0 +1,296 @@
+import os
+import logging
+import calendar
+
+
+
+# Colunas na mesma ordem/semântica de QiveAPI.extrair_dados_nota_json
+COLUNAS_TEXTO = ["id_arquivei", "numero", "codigo_verificacao", "data_emissao", "discriminacao", "data_cancelamento"]
+COLUNAS_NUMERICAS = ["base_calculo", "aliquota", "valor_iss", "valor_servicos"]
+COLUNAS_CATEGORICAS = ["cnpj_prestador", "nome_prestador", "cnpj_tomador", "nome_tomador", "status"]
+COLUNAS_NFSE = [
+    "id_arquivei", "numero", "codigo_verificacao", "data_emissao",
+    "base_calculo", "aliquota", "valor_iss", "valor_servicos",
+    "cnpj_prestador", "nome_prestador", "cnpj_tomador", "nome_tomador",
+    "discriminacao", "cancelada", "data_cancelamento", "status",
+]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+    except ImportError as e:
+        raise ImportError("Extração colunar requer o pacote 'pyarrow' (pip install pyarrow)") from e
+    return pyarrow
+
+
+def schema_nfse():
+    """
+    Schema Arrow estável das NFS-e extraídas (usado também na exportação Parquet)
+
+    Returns:
+        pyarrow.Schema
+    """
+    pa = _pyarrow()
+    tipos = {coluna: pa.string() for coluna in COLUNAS_TEXTO}
+    tipos.update({coluna: pa.float64() for coluna in COLUNAS_NUMERICAS})
+    tipos.update({coluna: pa.dictionary(pa.int32(), pa.string()) for coluna in COLUNAS_CATEGORICAS})
+    tipos["cancelada"] = pa.bool_()
+    return pa.schema([(coluna, tipos[coluna]) for coluna in COLUNAS_NFSE])
+
+
+def _texto(valor):
+    return None if valor is None else str(valor)
+
+
+def converter_numero(valor):
+    """
+    Conversão tolerante dos valores da nota (mesma regra nas saídas por linha e colunar)
+
+    Returns:
+        float|None: 0.0 se ausente, None se não numérico
+    """
+    if valor is None or valor == "":
+        return 0.0
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def extrair_colunas_nfse(notas):
+    """
+    Percorre as notas uma única vez preenchendo listas por coluna,
+    sem montar um dict por nota nem converter valores um a um.
+
+    Args:
+        notas: Iterável de notas em formato JSON (da API)
+
+    Returns:
+        dict[str, list]: Valores brutos por coluna (numéricos ainda como texto)
+    """
+    colunas = {coluna: [] for coluna in COLUNAS_NFSE}
+    c = colunas  # atalho local: evita lookups repetidos no laço
+
+    for nota_json in notas:
+        nfse = (nota_json.get("xml") or {}).get("Nfse") or {}
+        inf_nfse = nfse.get("InfNfse") or {}
+        valores = inf_nfse.get("ValoresNfse") or {}
+        prestador = inf_nfse.get("PrestadorServico") or {}
+        tomador = inf_nfse.get("Tomador") or {}
+        servico = (((inf_nfse.get("DeclaracaoPrestacaoServico") or {})
+                    .get("InfDeclaracaoPrestacaoServico") or {})
+                   .get("Servico") or {})
+        cancelamento = nfse.get("NfseCancelamento")
+
+        c["id_arquivei"].append(_texto(nota_json.get("id")))
+        c["numero"].append(_texto(inf_nfse.get("Numero")))
+        c["codigo_verificacao"].append(_texto(inf_nfse.get("CodigoVerificacao")))
+        c["data_emissao"].append(_texto(inf_nfse.get("DataEmissao")))
+
+        c["base_calculo"].append(_texto(valores.get("BaseCalculo")))
+        c["aliquota"].append(_texto(valores.get("Aliquota")))
+        c["valor_iss"].append(_texto(valores.get("ValorIss")))
+        c["valor_servicos"].append(_texto(valores.get("ValorServicos")))
+
+        c["cnpj_prestador"].append(
+            ((prestador.get("IdentificacaoPrestador") or {}).get("CpfCnpj") or {}).get("Cnpj", "N/A")
+        )
+        c["nome_prestador"].append(prestador.get("RazaoSocial", "N/A"))
+        c["cnpj_tomador"].append(
+            ((tomador.get("IdentificacaoTomador") or {}).get("CpfCnpj") or {}).get("Cnpj", "N/A")
+        )
+        c["nome_tomador"].append(tomador.get("RazaoSocial", "N/A"))
+        c["discriminacao"].append(servico.get("Discriminacao", "N/A"))
+
+        c["cancelada"].append(cancelamento is not None)
+        c["data_cancelamento"].append(
+            (cancelamento.get("Confirmacao") or {}).get("DataHora", "N/A") if cancelamento is not None else None
+        )
+        c["status"].append("CANCELADA" if cancelamento is not None else "ATIVA")
+
+    return colunas
+
+
+def lote_nfse(notas):
+    """
+    Converte uma página (ou lista) de notas em um RecordBatch Arrow tipado.
+    Numéricos são convertidos de forma vetorizada (texto -> float64, nulos = 0);
+    se a página tiver algum valor não numérico, a coluna é convertida valor a
+    valor com converter_numero (inválidos viram nulo em vez de abortar o lote).
+
+    Args:
+        notas: Iterável de notas em formato JSON
+
+    Returns:
+        pyarrow.RecordBatch com o schema_nfse()
+    """
+    pa = _pyarrow()
+    pc = pa.compute
+    schema = schema_nfse()
+    colunas = extrair_colunas_nfse(notas)
+
+    arrays = []
+    for campo in schema:
+        valores = colunas[campo.name]
+        if campo.name in COLUNAS_NUMERICAS:
+            textos = pc.fill_null(pa.array(valores, pa.string()), "0")
+            try:
+                array = pc.cast(textos, pa.float64())
+            except pa.ArrowInvalid:
+                array = pa.array([converter_numero(valor) for valor in valores], pa.float64())
+        elif campo.name in COLUNAS_CATEGORICAS:
+            array = pa.array(valores, pa.string()).dictionary_encode()
+            array = array.cast(campo.type)
+        else:
+            array = pa.array(valores, campo.type)
+        arrays.append(array)
+
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iterar_lotes_nfse(paginas):
+    """
+    Converte um fluxo de páginas (ex: iterar_nfse_notas(..., por_pagina=True))
+    em RecordBatches, uma página por vez
+
+    Yields:
+        pyarrow.RecordBatch
+    """
+    for pagina in paginas:
+        if pagina:
+            yield lote_nfse(pagina)
+
+
+def tabela_nfse(paginas):
+    """
+    Monta uma Table Arrow a partir de um fluxo de páginas de notas
+
+    Args:
+        paginas: Iterável de listas de notas
+
+    Returns:
+        pyarrow.Table
+    """
+    pa = _pyarrow()
+    lotes = list(iterar_lotes_nfse(paginas))
+    tabela = pa.Table.from_batches(lotes, schema=schema_nfse())
+    logging.info("Tabela NFS-e montada: %s notas em %s lote(s)", tabela.num_rows, len(lotes))
+    return tabela
+
+
+def dataframe_nfse(paginas):
+    """
+    Mesmo que tabela_nfse, convertido para pandas (colunas categóricas
+    para prestador/tomador/status, float64 para valores e bool para cancelada)
+
+    Returns:
+        pandas.DataFrame
+    """
+    return tabela_nfse(paginas).to_pandas()
+
+
+def meses_do_periodo(mes_inicial, mes_final):
+    """
+    Lista os meses de um intervalo com o primeiro e o último dia de cada um
+
+    Args:
+        mes_inicial: Mês inicial (YYYY-MM)
+        mes_final: Mês final (YYYY-MM), inclusive
+
+    Returns:
+        Lista de tuplas (mes "YYYY-MM", primeiro_dia "YYYY-MM-DD", ultimo_dia "YYYY-MM-DD")
+    """
+    ano, mes = (int(parte) for parte in mes_inicial.split("-"))
+    ano_final, mes_final_num = (int(parte) for parte in mes_final.split("-"))
+
+    meses = []
+    while (ano, mes) <= (ano_final, mes_final_num):
+        ultimo_dia = calendar.monthrange(ano, mes)[1]
+        meses.append((f"{ano:04d}-{mes:02d}", f"{ano:04d}-{mes:02d}-01", f"{ano:04d}-{mes:02d}-{ultimo_dia:02d}"))
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+
+    return meses
+
+
+def escrever_particao_parquet(lotes, pasta_destino, cnpj, tipo, mes, compressao="zstd", estado=None):
+    """
+    Grava (substituindo) a partição cnpj=<cnpj>/tipo=<tipo>/mes=<mes> de um
+    dataset Parquet no layout Hive, consumindo os RecordBatches em streaming.
+
+    O arquivo é escrito em um temporário e renomeado no final; só então os
+    arquivos antigos da partição são removidos. As demais partições não são tocadas.
+    Se a varredura que gerou os lotes não foi completa (estado.completa False),
+    o temporário é descartado e a partição existente fica como estava.
+
+    Args:
+        lotes: Iterável de RecordBatches com o schema_nfse()
+        pasta_destino: Raiz do dataset
+        cnpj: CNPJ (limpo) da partição
+        tipo: "received" ou "emitted"
+        mes: Mês da partição (YYYY-MM)
+        compressao: Codec Parquet (zstd, snappy, gzip...)
+        estado: EstadoVarredura da varredura que produz os lotes (opcional)
+
+    Returns:
+        tuple(str, int): (caminho do arquivo gravado, quantidade de linhas)
+        ou (None, linhas lidas) se a varredura foi truncada
+    """
+    _pyarrow()
+    import pyarrow.parquet as pq
+
+    pasta_particao = os.path.join(pasta_destino, f"cnpj={cnpj}", f"tipo={tipo}", f"mes={mes}")
+    os.makedirs(pasta_particao, exist_ok=True)
+
+    caminho_final = os.path.join(pasta_particao, "part-0.parquet")
+    caminho_temp = os.path.join(pasta_particao, ".part-0.parquet.tmp")
+
+    linhas = 0
+    try:
+        with pq.ParquetWriter(caminho_temp, schema_nfse(), compression=compressao) as writer:
+            for lote in lotes:
+                writer.write_batch(lote)
+                linhas += lote.num_rows
+    except BaseException:
+        if os.path.exists(caminho_temp):
+            os.remove(caminho_temp)
+        raise
+
+    if estado is not None and not estado.completa:
+        os.remove(caminho_temp)
+        logging.error(
+            "Varredura de %s incompleta (%s) após %s notas - partição %s mantida sem alterações",
+            mes, estado.motivo, linhas, pasta_particao
+        )
+        return None, linhas
+
+    os.replace(caminho_temp, caminho_final)
+
+    for nome in os.listdir(pasta_particao):
+        caminho = os.path.join(pasta_particao, nome)
+        if caminho != caminho_final and nome.endswith(".parquet"):
+            os.remove(caminho)
+
+    logging.info("Partição %s gravada: %s notas", pasta_particao, linhas)
+    return caminho_final, linhas
+
+
+def ler_dataset_nfse(pasta_destino, filtro=None):
+    """
+    Abre o dataset Parquet exportado com descoberta de partições Hive,
+    permitindo que filtros por cnpj/tipo/mes descartem partições inteiras
+
+    Args:
+        pasta_destino: Raiz do dataset
+        filtro: Expressão pyarrow.dataset opcional
+                (ex: (ds.field("cnpj") == "123") & (ds.field("mes") == "2025-01"))
+
+    Returns:
+        pyarrow.Table
+    """
+    _pyarrow()
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(pasta_destino, format="parquet", partitioning="hive")
+    return dataset.to_table(filter=filtro)
@@ -0,0 +1,330 @@
+import json
+import sqlite3
+import logging
+import threading
+from datetime import date, datetime, timedelta
+
+
+
+class IndiceNFSe:
+    """
+    Índice local (SQLite) das NFS-e já baixadas da Qive/Arquivei.
+
+    Guarda os dados extraídos de cada nota (extrair_dados_nota_json),
+    indexados por CNPJ, número, ID Arquivei e data de emissão, as faixas de
+    datas de recebimento já varridas por completo e o último cursor
+    sincronizado de cada faixa ainda aberta. Assim uma nova sincronização só
+    busca os dias e as posições de cursor ainda não vistos (mesmo com janelas
+    sobrepostas) e as consultas por número são respondidas localmente.
+    """
+
+    def __init__(self, caminho="./indice_nfse.sqlite3"):
+        """
+        Args:
+            caminho: Arquivo SQLite do índice (criado se não existir)
+        """
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS notas (
+                    id_arquivei TEXT PRIMARY KEY,
+                    cnpj TEXT NOT NULL,
+                    tipo TEXT NOT NULL,
+                    numero TEXT,
+                    codigo_verificacao TEXT,
+                    data_emissao TEXT,
+                    cancelada INTEGER,
+                    dados_json TEXT NOT NULL,
+                    indexado_em TEXT NOT NULL,
+                    recebido_de TEXT,
+                    recebido_ate TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_notas_numero ON notas (cnpj, tipo, numero);
+                CREATE INDEX IF NOT EXISTS idx_notas_emissao ON notas (cnpj, tipo, data_emissao);
+
+                CREATE TABLE IF NOT EXISTS sincronizacoes (
+                    cnpj TEXT NOT NULL,
+                    tipo TEXT NOT NULL,
+                    created_from TEXT NOT NULL,
+                    created_to TEXT NOT NULL,
+                    cursor INTEGER NOT NULL,
+                    atualizado_em TEXT NOT NULL,
+                    PRIMARY KEY (cnpj, tipo, created_from, created_to)
+                );
+
+                CREATE TABLE IF NOT EXISTS cobertura (
+                    cnpj TEXT NOT NULL,
+                    tipo TEXT NOT NULL,
+                    data_de TEXT NOT NULL,
+                    data_ate TEXT NOT NULL,
+                    PRIMARY KEY (cnpj, tipo, data_de)
+                );
+            """)
+
+        # Índices criados antes das colunas de recebimento
+        colunas = {linha[1] for linha in self._conn.execute("PRAGMA table_info(notas)")}
+        with self._conn:
+            for coluna in ("recebido_de", "recebido_ate"):
+                if coluna not in colunas:
+                    self._conn.execute(f"ALTER TABLE notas ADD COLUMN {coluna} TEXT")
+
+        logging.info(f"Índice NFS-e aberto: {caminho}")
+
+
+    def close(self):
+        """Fecha a conexão com o banco"""
+        with self._lock:
+            self._conn.close()
+
+
+    def cursor_sincronizado(self, cnpj, tipo, created_from, created_to):
+        """
+        Retorna o último cursor já sincronizado para a janela (0 se nunca sincronizada)
+        """
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT cursor FROM sincronizacoes WHERE cnpj = ? AND tipo = ? AND created_from = ? AND created_to = ?",
+                (cnpj, tipo, created_from, created_to)
+            ).fetchone()
+        return linha[0] if linha else 0
+
+
+    def faixas_pendentes(self, cnpj, tipo, data_de, data_ate):
+        """
+        Partes da janela de recebimento [data_de, data_ate] (dias inclusivos)
+        que ainda não foram varridas por completo
+
+        Returns:
+            Lista de tuplas (data_de, data_ate) no formato YYYY-MM-DD
+        """
+        inicio, fim = date.fromisoformat(data_de[:10]), date.fromisoformat(data_ate[:10])
+        with self._lock:
+            cobertas = self._conn.execute(
+                "SELECT data_de, data_ate FROM cobertura WHERE cnpj = ? AND tipo = ? "
+                "AND data_ate >= ? AND data_de <= ? ORDER BY data_de",
+                (cnpj, tipo, inicio.isoformat(), fim.isoformat())
+            ).fetchall()
+
+        pendentes = []
+        for coberta_de, coberta_ate in cobertas:
+            coberta_de, coberta_ate = date.fromisoformat(coberta_de), date.fromisoformat(coberta_ate)
+            if coberta_de > inicio:
+                pendentes.append((inicio.isoformat(), min(fim, coberta_de - timedelta(days=1)).isoformat()))
+            inicio = max(inicio, coberta_ate + timedelta(days=1))
+            if inicio > fim:
+                break
+        if inicio <= fim:
+            pendentes.append((inicio.isoformat(), fim.isoformat()))
+        return pendentes
+
+
+    def registrar_cobertura(self, cnpj, tipo, data_de, data_ate):
+        """
+        Marca a faixa de recebimento [data_de, data_ate] como varrida por completo,
+        fundindo-a com faixas sobrepostas ou adjacentes
+        """
+        inicio, fim = date.fromisoformat(data_de[:10]), date.fromisoformat(data_ate[:10])
+        with self._lock, self._conn:
+            vizinhas = self._conn.execute(
+                "SELECT data_de, data_ate FROM cobertura WHERE cnpj = ? AND tipo = ? "
+                "AND data_ate >= ? AND data_de <= ?",
+                (cnpj, tipo, (inicio - timedelta(days=1)).isoformat(), (fim + timedelta(days=1)).isoformat())
+            ).fetchall()
+            for vizinha_de, vizinha_ate in vizinhas:
+                inicio = min(inicio, date.fromisoformat(vizinha_de))
+                fim = max(fim, date.fromisoformat(vizinha_ate))
+                self._conn.execute(
+                    "DELETE FROM cobertura WHERE cnpj = ? AND tipo = ? AND data_de = ?", (cnpj, tipo, vizinha_de)
+                )
+            self._conn.execute(
+                "INSERT INTO cobertura VALUES (?, ?, ?, ?)", (cnpj, tipo, inicio.isoformat(), fim.isoformat())
+            )
+            # Cursores de faixas agora cobertas não serão mais usados
+            self._conn.execute(
+                "DELETE FROM sincronizacoes WHERE cnpj = ? AND tipo = ? AND created_from >= ? AND created_to <= ?",
+                (cnpj, tipo, inicio.isoformat(), fim.isoformat())
+            )
+
+
+    def registrar_pagina(self, cnpj, tipo, created_from, created_to, lista_dados, cursor):
+        """
+        Grava as notas de uma página e avança o cursor da janela na mesma transação.
+
+        A nota não traz a data de recebimento: guarda-se a faixa varrida em que
+        ela apareceu (recebido_de/recebido_ate), estreitada pela interseção
+        sempre que a nota reaparece em outra varredura.
+
+        Args:
+            cnpj: CNPJ (limpo) consultado
+            tipo: "received" ou "emitted"
+            created_from: Data inicial da janela sincronizada
+            created_to: Data final da janela sincronizada
+            lista_dados: Dicts retornados por extrair_dados_nota_json
+            cursor: Cursor da próxima posição ainda não lida
+        """
+        agora = datetime.now().isoformat(timespec="seconds")
+        linhas = [
+            (
+                dados["id_arquivei"],
+                cnpj,
+                tipo,
+                str(dados.get("numero")),
+                dados.get("codigo_verificacao"),
+                dados.get("data_emissao"),
+                int(bool(dados.get("cancelada"))),
+                json.dumps(dados, ensure_ascii=False),
+                agora,
+                created_from[:10],
+                created_to[:10],
+            )
+            for dados in lista_dados if dados and dados.get("id_arquivei")
+        ]
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO notas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id_arquivei) DO UPDATE SET
+                    cnpj = excluded.cnpj,
+                    tipo = excluded.tipo,
+                    numero = excluded.numero,
+                    codigo_verificacao = excluded.codigo_verificacao,
+                    data_emissao = excluded.data_emissao,
+                    cancelada = excluded.cancelada,
+                    dados_json = excluded.dados_json,
+                    indexado_em = excluded.indexado_em,
+                    recebido_de = CASE
+                        WHEN notas.recebido_de IS NULL OR notas.recebido_de > excluded.recebido_ate
+                             OR notas.recebido_ate < excluded.recebido_de THEN excluded.recebido_de
+                        ELSE max(notas.recebido_de, excluded.recebido_de) END,
+                    recebido_ate = CASE
+                        WHEN notas.recebido_ate IS NULL OR notas.recebido_de > excluded.recebido_ate
+                             OR notas.recebido_ate < excluded.recebido_de THEN excluded.recebido_ate
+                        ELSE min(notas.recebido_ate, excluded.recebido_ate) END
+                """,
+                linhas
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sincronizacoes VALUES (?, ?, ?, ?, ?, ?)",
+                (cnpj, tipo, created_from, created_to, cursor, agora)
+            )
+
+
+    def buscar_por_numero(
+        self,
+        cnpj,
+        numero_nota,
+        tipo="received",
+        data_emissao_de=None,
+        data_emissao_ate=None,
+        recebido_de=None,
+        recebido_ate=None
+    ):
+        """
+        Busca uma nota no índice pelo número
+
+        Args:
+            cnpj: CNPJ (limpo) consultado
+            numero_nota: Número da nota fiscal
+            tipo: "received" ou "emitted"
+            data_emissao_de: Filtro opcional de data de emissão inicial (YYYY-MM-DD)
+            data_emissao_ate: Filtro opcional de data de emissão final (YYYY-MM-DD)
+            recebido_de: Filtro opcional de data de recebimento inicial (YYYY-MM-DD)
+            recebido_ate: Filtro opcional de data de recebimento final (YYYY-MM-DD)
+                Só casam notas cuja faixa de recebimento conhecida está inteira
+                dentro do filtro (ver faixas_ambiguas)
+
+        Returns:
+            Dict com dados da nota ou None
+        """
+        sql = "SELECT dados_json FROM notas WHERE cnpj = ? AND tipo = ? AND numero = ?"
+        args = [cnpj, tipo, str(numero_nota)]
+
+        if recebido_de:
+            sql += " AND recebido_de >= ?"
+            args.append(recebido_de[:10])
+        if recebido_ate:
+            sql += " AND recebido_ate <= ?"
+            args.append(recebido_ate[:10])
+
+        if data_emissao_de:
+            sql += " AND data_emissao >= ?"
+            args.append(data_emissao_de)
+        if data_emissao_ate:
+            # Datas de emissão vêm com horário (YYYY-MM-DDTHH:MM:SS)
+            sql += " AND substr(data_emissao, 1, 10) <= ?"
+            args.append(data_emissao_ate)
+
+        with self._lock:
+            linha = self._conn.execute(sql + " ORDER BY data_emissao DESC LIMIT 1", args).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+
+    def faixas_ambiguas(self, cnpj, numero_nota, tipo, recebido_de, recebido_ate):
+        """
+        Notas com o número cuja faixa de recebimento conhecida cruza a janela
+        sem estar contida nela (ou é desconhecida): não dá para saber, só pelo
+        índice, se foram recebidas dentro da janela.
+
+        Returns:
+            Lista de tuplas (data_de, data_ate): interseção de cada faixa com a
+            janela, que precisa ser varrida de novo para estreitar a faixa
+        """
+        de, ate = recebido_de[:10], recebido_ate[:10]
+        with self._lock:
+            linhas = self._conn.execute(
+                "SELECT recebido_de, recebido_ate FROM notas WHERE cnpj = ? AND tipo = ? AND numero = ? "
+                "AND (recebido_de IS NULL OR (recebido_de <= ? AND recebido_ate >= ? "
+                "AND NOT (recebido_de >= ? AND recebido_ate <= ?)))",
+                (cnpj, tipo, str(numero_nota), ate, de, de, ate)
+            ).fetchall()
+
+        faixas = []
+        for faixa_de, faixa_ate in linhas:
+            faixa = (max(faixa_de or de, de), min(faixa_ate or ate, ate))
+            if faixa not in faixas:
+                faixas.append(faixa)
+        return faixas
+
+
+    def descartar_faixa(self, cnpj, tipo, data_de, data_ate):
+        """
+        Depois de uma varredura completa de [data_de, data_ate]: notas que não
+        apareceram nela (faixa não contida na janela) não foram recebidas ali,
+        então a faixa delas é encurtada quando a janela cobre uma das pontas
+        """
+        de, ate = data_de[:10], data_ate[:10]
+        with self._lock, self._conn:
+            # Começa dentro da janela: passa a começar no dia seguinte ao fim dela
+            self._conn.execute(
+                "UPDATE notas SET recebido_de = date(?, '+1 day') WHERE cnpj = ? AND tipo = ? "
+                "AND recebido_de >= ? AND recebido_de <= ? AND recebido_ate > ?",
+                (ate, cnpj, tipo, de, ate, ate)
+            )
+            # Termina dentro da janela: passa a terminar no dia anterior ao início dela
+            self._conn.execute(
+                "UPDATE notas SET recebido_ate = date(?, '-1 day') WHERE cnpj = ? AND tipo = ? "
+                "AND recebido_ate >= ? AND recebido_ate <= ? AND recebido_de < ?",
+                (de, cnpj, tipo, de, ate, de)
+            )
+
+
+    def buscar_por_id(self, id_arquivei):
+        """Busca uma nota no índice pelo ID Arquivei; retorna dict ou None"""
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT dados_json FROM notas WHERE id_arquivei = ?", (id_arquivei,)
+            ).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+
+    def total_notas(self, cnpj=None):
+        """Quantidade de notas indexadas (opcionalmente por CNPJ)"""
+        with self._lock:
+            if cnpj:
+                return self._conn.execute("SELECT COUNT(*) FROM notas WHERE cnpj = ?", (cnpj,)).fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM notas").fetchone()[0]
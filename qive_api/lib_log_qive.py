@@ -0,0 +1,169 @@
+import json
+import uuid
+import queue
+import atexit
+import logging
+import functools
+import threading
+from datetime import datetime
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+
+
+# ID de correlação da chamada em andamento (propaga por contexto, não por thread)
+_correlacao_id = ContextVar("correlacao_id", default=None)
+
+FORMATO_TEXTO = "%(asctime)s - %(levelname)s - %(correlacao_id)s - %(filename)s - %(lineno)d - %(message)s"
+
+_listener = None
+_lock = threading.Lock()
+
+
+def novo_correlacao_id():
+    return uuid.uuid4().hex[:12]
+
+
+def correlacao_atual():
+    """ID de correlação ativo no contexto atual (ou None)"""
+    return _correlacao_id.get()
+
+
+class correlacao:
+    """
+    Context manager que define o ID de correlação dos logs emitidos dentro dele
+
+    Uso:
+        with correlacao():            # gera um ID novo
+            qive.processar_nfe_por_chave(chave)
+        with correlacao("lote-42"):   # usa um ID conhecido (ex: vindo do orquestrador)
+            ...
+    """
+
+    def __init__(self, correlacao_id=None):
+        self.correlacao_id = correlacao_id or novo_correlacao_id()
+        self._token = None
+
+
+    def __enter__(self):
+        self._token = _correlacao_id.set(self.correlacao_id)
+        return self.correlacao_id
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _correlacao_id.reset(self._token)
+
+
+def com_correlacao(funcao):
+    """
+    Decorator: a chamada ganha um ID de correlação próprio, a menos que já
+    esteja dentro de outra chamada correlacionada (aí herda o ID dela)
+    """
+    @functools.wraps(funcao)
+    def wrapper(*args, **kwargs):
+        if _correlacao_id.get() is not None:
+            return funcao(*args, **kwargs)
+        with correlacao():
+            return funcao(*args, **kwargs)
+    return wrapper
+
+
+class FiltroCorrelacao(logging.Filter):
+    """Anota cada registro com o ID de correlação (executado na thread que gerou o log)"""
+
+    def filter(self, record):
+        if not hasattr(record, "correlacao_id"):
+            record.correlacao_id = _correlacao_id.get() or "-"
+        return True
+
+
+class FormatadorJSON(logging.Formatter):
+    """Um objeto JSON por linha, pronto para ingestão (ELK, Loki, CloudWatch...)"""
+
+    def format(self, record):
+        registro = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "mensagem": record.getMessage(),
+            "correlacao_id": getattr(record, "correlacao_id", "-"),
+            "logger": record.name,
+            "arquivo": record.filename,
+            "linha": record.lineno,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            registro["exc"] = self.formatException(record.exc_info)
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+
+class _QueueHandlerAdiado(QueueHandler):
+    """
+    QueueHandler que não formata a mensagem na thread chamadora: o registro
+    vai para a fila como está e %-formatação, JSON e escrita em disco
+    acontecem na thread do QueueListener.
+
+    (Só é seguro para filas do mesmo processo: os args não são serializados.)
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def configurar_logs_fila(caminho_log, nivel=logging.INFO, formato_json=False, console=True):
+    """
+    Configura o logger raiz em modo não bloqueante: as chamadas de log só
+    enfileiram o registro; uma thread em segundo plano formata e grava no
+    arquivo (e no console).
+
+    Args:
+        caminho_log: Arquivo de log
+        nivel: Nível mínimo (logging.INFO, logging.DEBUG...)
+        formato_json: True = uma linha JSON por registro (com correlacao_id)
+        console: True = também exibe no console
+
+    Returns:
+        QueueListener (parado automaticamente na saída do processo)
+    """
+    global _listener
+
+    formatador = FormatadorJSON() if formato_json else logging.Formatter(FORMATO_TEXTO, datefmt="%H:%M:%S")
+
+    destinos = [logging.FileHandler(caminho_log, encoding="utf-8")]
+    if console:
+        destinos.append(logging.StreamHandler())
+    for destino in destinos:
+        destino.setFormatter(formatador)
+
+    fila = queue.SimpleQueue()
+    handler = _QueueHandlerAdiado(fila)
+    handler.addFilter(FiltroCorrelacao())
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+
+        raiz = logging.getLogger()
+        for antigo in list(raiz.handlers):
+            raiz.removeHandler(antigo)
+            antigo.close()
+        raiz.addHandler(handler)
+        raiz.setLevel(nivel)
+
+        _listener = QueueListener(fila, *destinos, respect_handler_level=True)
+        _listener.start()
+
+    return _listener
+
+
+def parar_logs():
+    """Esvazia a fila e para a thread de escrita (chamado também no atexit)"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for destino in _listener.handlers:
+                destino.close()
+            _listener = None
+
+
+atexit.register(parar_logs)
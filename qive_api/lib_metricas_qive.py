@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+
+# Limites (segundos) dos buckets do histograma de latência
+BUCKETS_LATENCIA = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Fases em que o tempo de uma chamada é dividido
+FASES = ("rede", "decodificacao", "escrita")
+
+
+def endpoint_da_url(url):
+    """Rótulo do endpoint a partir da URL (ex: /v1/nfse/received)"""
+    return urlparse(url).path or "/"
+
+
+class _MetricasEndpoint:
+    def __init__(self):
+        self.requisicoes = 0
+        self.por_status = {}
+        self.erros = 0
+        self.buckets = [0] * (len(BUCKETS_LATENCIA) + 1)  # último = +Inf
+        self.latencia_total = 0.0
+        self.latencia_maxima = 0.0
+        self.bytes_recebidos = 0
+        self.bytes_enviados = 0
+        self.retries = 0
+        self.throttles = 0
+        self.tempo_throttle = 0.0
+        self.cache_acertos = 0
+        self.fases = {fase: 0.0 for fase in FASES}
+
+
+    def como_dict(self):
+        return {
+            "requisicoes": self.requisicoes,
+            "por_status": dict(self.por_status),
+            "erros": self.erros,
+            "latencia": {
+                "total": round(self.latencia_total, 6),
+                "media": round(self.latencia_total / self.requisicoes, 6) if self.requisicoes else 0.0,
+                "maxima": round(self.latencia_maxima, 6),
+                "buckets": {
+                    str(limite): contagem
+                    for limite, contagem in zip(list(BUCKETS_LATENCIA) + ["+Inf"], self.buckets)
+                },
+            },
+            "bytes_recebidos": self.bytes_recebidos,
+            "bytes_enviados": self.bytes_enviados,
+            "retries": self.retries,
+            "throttles": self.throttles,
+            "tempo_throttle": round(self.tempo_throttle, 6),
+            "cache_acertos": self.cache_acertos,
+            "fases": {fase: round(segundos, 6) for fase, segundos in self.fases.items()},
+        }
+
+
+class MetricasQive:
+    """
+    Métricas por endpoint das chamadas à Qive/Arquivei (thread-safe):
+    histograma de latência, bytes recebidos/enviados, retries (429 e
+    urllib3), tempo retido pelo rate limiter e tempo gasto em rede,
+    decodificação e escrita em disco.
+
+    Pode ser exportada como snapshot JSON (snapshot/salvar_json) ou no
+    formato texto do Prometheus (prometheus/salvar_prometheus/iniciar_servidor).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self.iniciado_em = datetime.now().isoformat(timespec="seconds")
+        self._inicio = time.monotonic()
+
+
+    def _endpoint(self, endpoint):
+        metricas = self._endpoints.get(endpoint)
+        if metricas is None:
+            metricas = self._endpoints[endpoint] = _MetricasEndpoint()
+        return metricas
+
+
+    def registrar_requisicao(self, endpoint, latencia, status=None, bytes_recebidos=0, bytes_enviados=0):
+        """
+        Registra uma requisição concluída (ou que falhou, com status=None)
+
+        Args:
+            endpoint: Caminho do endpoint (ex: /v1/nfe/danfe)
+            latencia: Segundos até a resposta (cabeçalhos, em downloads em streaming)
+            status: Código HTTP ou None em caso de exceção
+            bytes_recebidos: Tamanho do corpo recebido (0 se lido depois, em streaming)
+            bytes_enviados: Tamanho aproximado da requisição (linha + cabeçalhos)
+        """
+        with self._lock:
+            m = self._endpoint(endpoint)
+            m.requisicoes += 1
+            chave_status = str(status) if status is not None else "erro"
+            m.por_status[chave_status] = m.por_status.get(chave_status, 0) + 1
+            if status is None or status >= 400:
+                m.erros += 1
+
+            indice = len(BUCKETS_LATENCIA)
+            for i, limite in enumerate(BUCKETS_LATENCIA):
+                if latencia <= limite:
+                    indice = i
+                    break
+            m.buckets[indice] += 1
+            m.latencia_total += latencia
+            m.latencia_maxima = max(m.latencia_maxima, latencia)
+
+            m.bytes_recebidos += bytes_recebidos
+            m.bytes_enviados += bytes_enviados
+            m.fases["rede"] += latencia
+
+
+    def registrar_bytes(self, endpoint, bytes_recebidos):
+        """Soma bytes recebidos depois da resposta (corpo lido em streaming)"""
+        with self._lock:
+            self._endpoint(endpoint).bytes_recebidos += bytes_recebidos
+
+
+    def registrar_retry(self, endpoint, quantidade=1):
+        """Conta tentativas repetidas (429 ou retries internos do urllib3)"""
+        with self._lock:
+            self._endpoint(endpoint).retries += quantidade
+
+
+    def registrar_throttle(self, endpoint, segundos):
+        """Registra o tempo em que a chamada ficou retida pelo rate limiter"""
+        if segundos <= 0:
+            return
+        with self._lock:
+            m = self._endpoint(endpoint)
+            m.throttles += 1
+            m.tempo_throttle += segundos
+
+
+    def registrar_cache_acerto(self, endpoint):
+        """Conta uma resposta servida pelo cache local (sem requisição)"""
+        with self._lock:
+            self._endpoint(endpoint).cache_acertos += 1
+
+
+    def registrar_fase(self, endpoint, fase, segundos):
+        """
+        Soma tempo a uma fase da chamada
+
+        Args:
+            endpoint: Caminho do endpoint
+            fase: "rede", "decodificacao" ou "escrita"
+            segundos: Tempo gasto
+        """
+        with self._lock:
+            fases = self._endpoint(endpoint).fases
+            fases[fase] = fases.get(fase, 0.0) + segundos
+
+
+    def snapshot(self):
+        """
+        Retorna uma cópia das métricas atuais
+
+        Returns:
+            dict: {"iniciado_em", "uptime", "endpoints": {endpoint: {...}}}
+        """
+        with self._lock:
+            endpoints = {endpoint: m.como_dict() for endpoint, m in sorted(self._endpoints.items())}
+        return {
+            "iniciado_em": self.iniciado_em,
+            "uptime": round(time.monotonic() - self._inicio, 3),
+            "endpoints": endpoints,
+        }
+
+
+    def prometheus(self):
+        """
+        Métricas no formato texto de exposição do Prometheus
+
+        Returns:
+            str
+        """
+        snapshot = self.snapshot()
+        linhas = []
+
+        def metrica(nome, tipo, ajuda):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+
+        def rotulos(endpoint, **extras):
+            pares = [f'endpoint="{endpoint}"'] + [f'{chave}="{valor}"' for chave, valor in extras.items()]
+            return "{" + ",".join(pares) + "}"
+
+        endpoints = snapshot["endpoints"]
+
+        metrica("qive_requisicoes_total", "counter", "Requisicoes por endpoint e status HTTP")
+        for endpoint, m in endpoints.items():
+            for status, total in m["por_status"].items():
+                linhas.append(f"qive_requisicoes_total{rotulos(endpoint, status=status)} {total}")
+
+        metrica("qive_latencia_segundos", "histogram", "Latencia das requisicoes por endpoint")
+        for endpoint, m in endpoints.items():
+            acumulado = 0
+            for limite, contagem in m["latencia"]["buckets"].items():
+                acumulado += contagem
+                linhas.append(f"qive_latencia_segundos_bucket{rotulos(endpoint, le=limite)} {acumulado}")
+            linhas.append(f"qive_latencia_segundos_sum{rotulos(endpoint)} {m['latencia']['total']}")
+            linhas.append(f"qive_latencia_segundos_count{rotulos(endpoint)} {m['requisicoes']}")
+
+        contadores = (
+            ("qive_bytes_recebidos_total", "bytes_recebidos", "Bytes recebidos por endpoint"),
+            ("qive_bytes_enviados_total", "bytes_enviados", "Bytes enviados por endpoint"),
+            ("qive_retries_total", "retries", "Tentativas repetidas (429 e retries do urllib3)"),
+            ("qive_throttles_total", "throttles", "Chamadas retidas pelo rate limiter"),
+            ("qive_throttle_segundos_total", "tempo_throttle", "Tempo retido pelo rate limiter"),
+            ("qive_cache_acertos_total", "cache_acertos", "Respostas servidas pelo cache local"),
+        )
+        for nome, campo, ajuda in contadores:
+            metrica(nome, "counter", ajuda)
+            for endpoint, m in endpoints.items():
+                linhas.append(f"{nome}{rotulos(endpoint)} {m[campo]}")
+
+        metrica("qive_fase_segundos_total", "counter", "Tempo gasto em rede, decodificacao e escrita")
+        for endpoint, m in endpoints.items():
+            for fase, segundos in m["fases"].items():
+                linhas.append(f"qive_fase_segundos_total{rotulos(endpoint, fase=fase)} {segundos}")
+
+        return "\n".join(linhas) + "\n"
+
+
+    def _salvar(self, caminho, conteudo):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        temporario = caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write(conteudo)
+        os.replace(temporario, caminho)
+        return caminho
+
+
+    def salvar_json(self, caminho):
+        """Grava o snapshot em JSON (escrita atômica)"""
+        return self._salvar(caminho, json.dumps(self.snapshot(), ensure_ascii=False, indent=2))
+
+
+    def salvar_prometheus(self, caminho):
+        """
+        Grava o arquivo .prom (escrita atômica), no formato esperado pelo
+        textfile collector do node_exporter
+        """
+        return self._salvar(caminho, self.prometheus())
+
+
+    def iniciar_servidor(self, porta=9108, host="0.0.0.0"):
+        """
+        Sobe um servidor HTTP em thread daemon com:
+            /metrics       formato Prometheus
+            /metrics.json  snapshot JSON
+
+        Returns:
+            ThreadingHTTPServer (chame .shutdown() para parar)
+        """
+        metricas = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    corpo = metricas.prometheus().encode("utf-8")
+                    tipo = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    corpo = json.dumps(metricas.snapshot(), ensure_ascii=False).encode("utf-8")
+                    tipo = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", tipo)
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, formato, *args):
+                pass
+
+        servidor = ThreadingHTTPServer((host, porta), Handler)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        logging.info(f"Métricas disponíveis em http://{host}:{porta}/metrics")
+        return servidor
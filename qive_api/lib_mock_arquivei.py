@@ -0,0 +1,390 @@
+import json
+import time
+import copy
+import base64
+import random
+import bisect
+import logging
+import threading
+from datetime import date, timedelta
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+
+# Nota NFS-e (format_type=json) usada como modelo quando nenhuma gravação é informada
+NOTA_MODELO = {
+    "id": "",
+    "xml": {
+        "Nfse": {
+            "InfNfse": {
+                "Numero": "",
+                "CodigoVerificacao": "",
+                "DataEmissao": "",
+                "ValoresNfse": {
+                    "BaseCalculo": "1500.00",
+                    "Aliquota": "2.00",
+                    "ValorIss": "30.00",
+                    "ValorServicos": "1500.00",
+                },
+                "PrestadorServico": {
+                    "IdentificacaoPrestador": {"CpfCnpj": {"Cnpj": "11222333000181"}},
+                    "RazaoSocial": "PRESTADOR MOCK LTDA",
+                },
+                "Tomador": {
+                    "IdentificacaoTomador": {"CpfCnpj": {"Cnpj": "44555666000199"}},
+                    "RazaoSocial": "TOMADOR MOCK LTDA",
+                },
+                "DeclaracaoPrestacaoServico": {
+                    "InfDeclaracaoPrestacaoServico": {
+                        "Servico": {"Discriminacao": "Servico de teste gerado pelo mock"}
+                    }
+                },
+            }
+        }
+    },
+}
+
+
+class ConfigMock:
+    """
+    Parâmetros do servidor mock
+
+    Atributos:
+        total_nfse / total_nfe: Quantidade de documentos gerados
+        data_inicial / dias: Período de recebimento em que as NFS-e e NF-e são distribuídas
+        fracao_canceladas: Fração dos documentos com evento de cancelamento
+        limite_pagina: Máximo de registros por página (mesmo que o cliente peça mais)
+        latencia / jitter: Atraso fixo + aleatório (s) de cada resposta
+        latencia_documento: Atraso extra (s) de DANFE/DANFSe (geração do PDF)
+        tamanho_pdf / tamanho_xml: Tamanho (bytes) dos documentos servidos
+        taxa_erro: Probabilidade de responder 500
+        taxa_429 / retry_after: Probabilidade de responder 429 e o Retry-After enviado
+        semente: Semente do gerador aleatório (execuções reprodutíveis)
+        modelo_nfse: Caminho de uma nota JSON gravada da API real, usada como modelo
+        modelo_pdf: Caminho de um PDF gravado, servido no lugar do PDF sintético
+    """
+
+    def __init__(self, **opcoes):
+        self.total_nfse = 1000
+        self.total_nfe = 1000
+        self.data_inicial = "2025-01-01"
+        self.dias = 30
+        self.fracao_canceladas = 0.05
+        self.limite_pagina = 50
+        self.latencia = 0.02
+        self.jitter = 0.01
+        self.latencia_documento = 0.05
+        self.tamanho_pdf = 200 * 1024
+        self.tamanho_xml = 20 * 1024
+        self.taxa_erro = 0.0
+        self.taxa_429 = 0.0
+        self.retry_after = 1
+        self.semente = 42
+        self.modelo_nfse = None
+        self.modelo_pdf = None
+
+        for chave, valor in opcoes.items():
+            if not hasattr(self, chave):
+                raise ValueError(f"Opção desconhecida do mock: {chave}")
+            setattr(self, chave, valor)
+
+
+    def como_dict(self):
+        return dict(vars(self))
+
+
+class DadosMock:
+    """
+    Conjunto de documentos sintético e determinístico: as notas são geradas
+    sob demanda a partir do índice, então o mock aguenta centenas de
+    milhares de documentos sem mantê-los em memória.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.cnpj = "44555666000199"
+
+        if config.modelo_nfse:
+            with open(config.modelo_nfse, "r", encoding="utf-8") as f:
+                self.modelo_nfse = json.load(f)
+        else:
+            self.modelo_nfse = NOTA_MODELO
+
+        if config.modelo_pdf:
+            with open(config.modelo_pdf, "rb") as f:
+                self.pdf = f.read()
+        else:
+            self.pdf = self._conteudo(b"%PDF-1.4\n", config.tamanho_pdf)
+        self.pdf_base64 = base64.b64encode(self.pdf).decode("ascii")
+
+        # Datas de recebimento (created_at) ordenadas, para filtrar por bisect
+        self.datas_nfse = self._datas_recebimento(config.total_nfse)
+        self.datas_nfe = self._datas_recebimento(config.total_nfe)
+
+        passo = int(1 / config.fracao_canceladas) if config.fracao_canceladas else 0
+        self.passo_cancelamento = passo
+
+        self.ids_nfse = [f"mock-nfse-{i:08d}" for i in range(config.total_nfse)]
+        self.posicao_nfse = {id_nfse: i for i, id_nfse in enumerate(self.ids_nfse)}
+        self.chaves_nfe = [self._chave_nfe(i) for i in range(config.total_nfe)]
+        self.posicao_nfe = {chave: i for i, chave in enumerate(self.chaves_nfe)}
+
+
+    def _datas_recebimento(self, total):
+        inicio = date.fromisoformat(self.config.data_inicial)
+        return [
+            (inicio + timedelta(days=int(i * self.config.dias / max(1, total)))).isoformat()
+            for i in range(total)
+        ]
+
+
+    @staticmethod
+    def _conteudo(cabecalho, tamanho):
+        aleatorio = random.Random(tamanho)
+        corpo = bytes(aleatorio.getrandbits(8) for _ in range(min(tamanho, 4096)))
+        repeticoes = max(0, tamanho - len(cabecalho)) // max(1, len(corpo)) + 1
+        return (cabecalho + corpo * repeticoes)[:tamanho]
+
+
+    def _chave_nfe(self, i):
+        # cUF(2) + AAMM(4) + CNPJ(14) + modelo(2) + série(3) + número(9) + tpEmis(1) + código(8) + DV(1)
+        aamm = self.config.data_inicial[2:4] + self.config.data_inicial[5:7]
+        return f"35{aamm}{self.cnpj}55001{i:09d}1{i % 10 ** 8:08d}0"
+
+
+    def cancelada(self, posicao):
+        return bool(self.passo_cancelamento) and posicao % self.passo_cancelamento == 0
+
+
+    def nota_nfse(self, posicao):
+        nota = copy.deepcopy(self.modelo_nfse)
+        nota["id"] = self.ids_nfse[posicao]
+        inf_nfse = nota["xml"]["Nfse"]["InfNfse"]
+        inf_nfse["Numero"] = str(posicao + 1)
+        inf_nfse["CodigoVerificacao"] = f"{posicao:08X}"
+        inf_nfse["DataEmissao"] = self.datas_nfse[posicao] + "T10:00:00"
+        if self.cancelada(posicao):
+            nota["xml"]["Nfse"]["NfseCancelamento"] = {
+                "Confirmacao": {"DataHora": self.datas_nfse[posicao] + "T18:00:00"}
+            }
+        return nota
+
+
+    def xml_documento(self, identificador):
+        cabecalho = f'<?xml version="1.0" encoding="UTF-8"?><documento id="{identificador}">'.encode()
+        conteudo = self._conteudo(cabecalho, self.config.tamanho_xml)
+        return base64.b64encode(conteudo).decode("ascii")
+
+
+    @staticmethod
+    def _faixa(datas, created_from, created_to):
+        inicio = bisect.bisect_left(datas, (created_from or "0000-00-00")[:10])
+        fim = bisect.bisect_right(datas, (created_to or "9999-99-99")[:10])
+        return inicio, fim
+
+
+    def faixa_nfse(self, created_from, created_to):
+        """Posições [inicio, fim) das NFS-e recebidas no período"""
+        return self._faixa(self.datas_nfse, created_from, created_to)
+
+
+    def faixa_nfe(self, created_from, created_to):
+        """Posições [inicio, fim) das NF-e recebidas no período"""
+        return self._faixa(self.datas_nfe, created_from, created_to)
+
+
+def _pagina(registros, params, limite_pagina):
+    cursor = int(params.get("cursor", ["0"])[0] or 0)
+    limit = min(int(params.get("limit", ["50"])[0] or 50), limite_pagina)
+    return registros[cursor:cursor + limit]
+
+
+class ServidorMockArquivei:
+    """
+    Servidor HTTP local que imita os endpoints da Qive/Arquivei usados pela
+    QiveAPI, para benchmarks sem gastar cota da API real:
+
+        /v1/nfse/received e /v1/nfse/emitted  (listagem JSON e XML por id[])
+        /v1/nfe/received                      (XML por access_key[] ou por período)
+        /v1/nfse/events e /v2/nfe/events      (eventos de cancelamento)
+        /v1/nfe/danfe e /v1/nfse/danfse       (PDF em base64)
+
+    Uso:
+        with ServidorMockArquivei(ConfigMock(total_nfse=5000, latencia=0.05)) as mock:
+            qive = QiveAPI("id", "key", base_url=mock.base_url)
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", porta=0):
+        self.config = config or ConfigMock()
+        self.dados = DadosMock(self.config)
+        self.host = host
+        self.porta = porta
+        self.servidor = None
+        self.contadores = {}
+        self._lock = threading.Lock()
+        self._aleatorio = random.Random(self.config.semente)
+
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.servidor.server_address[1]}"
+
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.parar()
+
+
+    def iniciar(self):
+        """Sobe o servidor em uma thread daemon e retorna a base_url"""
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, corpo, cabecalhos = mock.responder(url.path, parse_qs(url.query, keep_blank_values=True))
+                dados = json.dumps(corpo).encode("utf-8")
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                for chave, valor in cabecalhos.items():
+                    self.send_header(chave, valor)
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, formato, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer((self.host, self.porta), Handler)
+        self.servidor.daemon_threads = True
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        logging.info(f"Mock Arquivei em {self.base_url} ({self.config.total_nfse} NFS-e, {self.config.total_nfe} NF-e)")
+        return self.base_url
+
+
+    def parar(self):
+        if self.servidor is not None:
+            self.servidor.shutdown()
+            self.servidor.server_close()
+            self.servidor = None
+
+
+    def _sortear(self):
+        with self._lock:
+            return self._aleatorio.random()
+
+
+    def responder(self, caminho, params):
+        """
+        Monta a resposta de um GET
+
+        Returns:
+            tuple(int, dict, dict): (status HTTP, corpo JSON, cabecalhos extras)
+        """
+        config = self.config
+        with self._lock:
+            self.contadores[caminho] = self.contadores.get(caminho, 0) + 1
+
+        atraso = config.latencia + (self._sortear() * config.jitter if config.jitter else 0)
+        if caminho in ("/v1/nfe/danfe", "/v1/nfse/danfse"):
+            atraso += config.latencia_documento
+        if atraso > 0:
+            time.sleep(atraso)
+
+        if config.taxa_429 and self._sortear() < config.taxa_429:
+            return 429, {"status": {"code": 429, "message": "Too Many Requests"}}, {"Retry-After": str(config.retry_after)}
+        if config.taxa_erro and self._sortear() < config.taxa_erro:
+            return 500, {"status": {"code": 500, "message": "Erro injetado pelo mock"}}, {}
+
+        rotas = {
+            "/v1/nfse/received": self._listar_nfse,
+            "/v1/nfse/emitted": self._listar_nfse,
+            "/v1/nfe/received": self._xml_nfe,
+            "/v1/nfse/events": self._eventos_nfse,
+            "/v2/nfe/events": self._eventos_nfe,
+            "/v1/nfe/danfe": self._danfe,
+            "/v1/nfse/danfse": self._danfse,
+        }
+        rota = rotas.get(caminho)
+        if rota is None:
+            return 404, {"status": {"code": 404, "message": "Endpoint não simulado"}}, {}
+
+        corpo = rota(params)
+        corpo.setdefault("status", {"code": 200, "message": "Ok"})
+        return 200, corpo, {}
+
+
+    def _listar_nfse(self, params):
+        dados = self.dados
+
+        ids = params.get("id[]")
+        if ids:
+            posicoes = [dados.posicao_nfse[i] for i in ids if i in dados.posicao_nfse]
+        else:
+            inicio, fim = dados.faixa_nfse(
+                params.get("created_at[from]", [None])[0], params.get("created_at[to]", [None])[0]
+            )
+            posicoes = range(inicio, fim)
+
+        posicoes = _pagina(posicoes, params, self.config.limite_pagina)
+
+        if params.get("format_type", ["json"])[0] == "xml":
+            return {"data": [{"id": dados.ids_nfse[p], "xml": dados.xml_documento(dados.ids_nfse[p])} for p in posicoes]}
+        return {"data": [dados.nota_nfse(p) for p in posicoes]}
+
+
+    def _xml_nfe(self, params):
+        dados = self.dados
+        if "access_key[]" in params:
+            chaves = [c for c in params["access_key[]"] if c in dados.posicao_nfe]
+        else:
+            # Listagem por CNPJ/período (todas as NF-e do mock são do mesmo CNPJ)
+            cnpjs = params.get("cnpj[]")
+            if cnpjs and dados.cnpj not in cnpjs:
+                return {"data": []}
+            inicio, fim = dados.faixa_nfe(
+                params.get("created_at[from]", [None])[0], params.get("created_at[to]", [None])[0]
+            )
+            chaves = dados.chaves_nfe[inicio:fim]
+        chaves = _pagina(chaves, params, self.config.limite_pagina)
+        return {"data": [{"access_key": c, "xml": dados.xml_documento(c)} for c in chaves]}
+
+
+    def _eventos_nfse(self, params):
+        dados = self.dados
+        ids = params.get("id[]") or dados.ids_nfse
+        eventos = [
+            {"id": i, "type": "101101"}
+            for i in ids if i in dados.posicao_nfse and dados.cancelada(dados.posicao_nfse[i])
+        ]
+        return {"data": _pagina(eventos, params, self.config.limite_pagina)}
+
+
+    def _eventos_nfe(self, params):
+        dados = self.dados
+        chaves = params.get("access_key") or params.get("access_key[]") or dados.chaves_nfe
+        eventos = [
+            {"access_key": c, "type": "110111"}
+            for c in chaves if c in dados.posicao_nfe and dados.cancelada(dados.posicao_nfe[c])
+        ]
+        return {"data": _pagina(eventos, params, self.config.limite_pagina)}
+
+
+    def _danfe(self, params):
+        if params.get("access_key", [None])[0] not in self.dados.posicao_nfe:
+            return {"status": {"code": 404, "message": "Documento não encontrado"}}
+        return {"data": {"encoded_pdf": self.dados.pdf_base64}}
+
+
+    def _danfse(self, params):
+        if params.get("id", [None])[0] not in self.dados.posicao_nfse:
+            return {"status": {"code": 404, "message": "Documento não encontrado"}}
+        return {"data": {"encoded_pdf": self.dados.pdf_base64}}
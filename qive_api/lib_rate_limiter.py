@@ -0,0 +1,146 @@
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+
+def interpretar_retry_after(valor):
+    """
+    Converte o header Retry-After em segundos de espera
+
+    Args:
+        valor: Conteúdo do header (segundos ou data HTTP) ou None
+
+    Returns:
+        float|None: Segundos a aguardar ou None se ausente/inválido
+    """
+    if not valor:
+        return None
+
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+
+    try:
+        data = parsedate_to_datetime(valor)
+        return max(0.0, (data - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Token bucket compartilhável entre threads e tasks asyncio.
+
+    Cada requisição consome um token; os tokens são repostos a
+    `requisicoes_por_segundo`. Ao receber 429 a taxa cai pela metade
+    (até `taxa_minima`) e o bucket fica bloqueado pelo tempo do
+    Retry-After; cada resposta bem-sucedida recupera a taxa aos poucos.
+
+    Uma mesma instância pode ser passada para várias QiveAPI/AsyncQiveAPI
+    para que todas dividam o mesmo orçamento de requisições.
+    """
+
+    def __init__(self, requisicoes_por_segundo=3.0, capacidade=None, taxa_minima=0.2, fator_recuperacao=1.05):
+        """
+        Args:
+            requisicoes_por_segundo: Orçamento de requisições por segundo
+            capacidade: Tamanho do bucket (rajada máxima). Padrão: 1 segundo de orçamento
+            taxa_minima: Menor taxa permitida após sucessivos 429
+            fator_recuperacao: Multiplicador aplicado à taxa a cada sucesso
+        """
+        self.taxa_maxima = float(requisicoes_por_segundo)
+        self.taxa = self.taxa_maxima
+        self.taxa_minima = min(taxa_minima, self.taxa_maxima)
+        self.fator_recuperacao = fator_recuperacao
+        self.capacidade = float(capacidade or max(1.0, self.taxa_maxima))
+
+        self._tokens = self.capacidade
+        self._ultimo = time.monotonic()
+        self._bloqueado_ate = 0.0
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.total_requisicoes = 0
+        self.total_aguardas = 0
+        self.tempo_aguardando = 0.0
+        self.total_429 = 0
+
+
+    def _reservar(self):
+        """Reserva um token e retorna quantos segundos o chamador deve aguardar"""
+        with self._lock:
+            agora = time.monotonic()
+            self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+            self._ultimo = agora
+
+            # O saldo pode ficar negativo: cada chamador "entra na fila" do bucket
+            self._tokens -= 1
+            espera = -self._tokens / self.taxa if self._tokens < 0 else 0.0
+            espera = max(espera, self._bloqueado_ate - agora)
+
+            self.total_requisicoes += 1
+            if espera > 0:
+                self.total_aguardas += 1
+                self.tempo_aguardando += espera
+
+            return espera
+
+
+    def adquirir(self):
+        """Bloqueia a thread até haver orçamento. Retorna o tempo aguardado (s)"""
+        espera = self._reservar()
+        if espera > 0:
+            time.sleep(espera)
+        return espera
+
+
+    async def adquirir_async(self):
+        """Versão asyncio de adquirir(): suspende a task sem bloquear o loop"""
+        espera = self._reservar()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        return espera
+
+
+    def registrar_429(self, retry_after=None):
+        """
+        Informa que a API respondeu 429: reduz a taxa e bloqueia o bucket
+
+        Args:
+            retry_after: Segundos indicados pelo header Retry-After (opcional)
+        """
+        with self._lock:
+            self.total_429 += 1
+            self.taxa = max(self.taxa_minima, self.taxa / 2)
+
+            pausa = retry_after if retry_after is not None else 1.0 / self.taxa
+            self._bloqueado_ate = max(self._bloqueado_ate, time.monotonic() + pausa)
+            self._tokens = min(self._tokens, 0.0)
+
+        logging.warning("API respondeu 429: pausa de %.2fs, taxa reduzida para %.2f req/s", pausa, self.taxa)
+
+
+    def registrar_sucesso(self):
+        """Recupera gradualmente a taxa após respostas sem throttling"""
+        if self.taxa >= self.taxa_maxima:
+            return
+        with self._lock:
+            self.taxa = min(self.taxa_maxima, self.taxa * self.fator_recuperacao)
+
+
+    def estatisticas(self):
+        """Retorna os contadores do limitador"""
+        with self._lock:
+            return {
+                "taxa_atual": round(self.taxa, 3),
+                "taxa_maxima": self.taxa_maxima,
+                "total_requisicoes": self.total_requisicoes,
+                "total_aguardas": self.total_aguardas,
+                "tempo_aguardando": round(self.tempo_aguardando, 3),
+                "total_429": self.total_429,
+            }
@@ -0,0 +1,161 @@
+import os
+import re
+import json
+import time
+import base64
+
+
+
+# Tamanho máximo do "envelope" JSON (tudo o que não é o campo base64)
+LIMITE_ENVELOPE = 1024 * 1024
+
+_BRANCOS = b" \t\r\n"
+
+
+def _decodificar(dados, tempos):
+    if tempos is None:
+        return base64.b64decode(dados)
+    inicio = time.perf_counter()
+    conteudo = base64.b64decode(dados)
+    tempos["decodificacao"] = tempos.get("decodificacao", 0.0) + time.perf_counter() - inicio
+    return conteudo
+
+
+def _gravar(arquivo, conteudo, hasher, tempos=None):
+    inicio = time.perf_counter() if tempos is not None else None
+    if hasher is not None:
+        hasher.update(conteudo)
+    gravados = arquivo.write(conteudo)
+    if tempos is not None:
+        tempos["escrita"] = tempos.get("escrita", 0.0) + time.perf_counter() - inicio
+    return gravados
+
+
+def salvar_campo_base64(
+    chunks, campo, caminho_arquivo, limite_envelope=LIMITE_ENVELOPE, hasher=None, tempos=None, validar=None
+):
+    """
+    Lê uma resposta JSON em pedaços, localiza o primeiro campo string `campo`
+    (ex: "encoded_pdf", "xml") e decodifica seu conteúdo base64 direto para
+    o disco, sem nunca manter o documento inteiro em memória.
+
+    O restante do JSON (status, metadados) é guardado com o campo trocado
+    por "" e devolvido já parseado, para que o chamador valide status.code.
+
+    O arquivo é escrito em `caminho_arquivo + ".part"` e só é renomeado ao
+    final (e se `validar` aprovar); em caso de erro ou reprovação só o
+    parcial é removido, e um arquivo anterior em `caminho_arquivo` fica intacto.
+
+    Args:
+        chunks: Iterável de bytes (ex: response.iter_content(65536))
+        campo: Nome do campo base64 no JSON
+        caminho_arquivo: Caminho final do arquivo decodificado
+        limite_envelope: Tamanho máximo aceito para o JSON fora do campo
+        hasher: Objeto hashlib (opcional) atualizado com os bytes decodificados
+        tempos: Dict (opcional) onde são somados os segundos gastos em
+                "decodificacao" e "escrita"
+        validar: Função (opcional) validar(envelope, bytes) -> bool chamada
+                 antes de substituir o arquivo final
+
+    Returns:
+        tuple(dict, int): (envelope JSON, bytes gravados). bytes gravados = 0
+        e nenhum arquivo criado quando o campo não existe, está vazio ou
+        quando `validar` reprova a resposta.
+    """
+    padrao = re.compile(b'"' + re.escape(campo.encode()) + rb'"\s*:\s*"')
+
+    prefixo = bytearray()
+    sufixo = bytearray()
+    pendente = b""          # caracteres base64 ainda não alinhados em 4
+    barra_pendente = False  # "\" no fim do chunk anterior (escape JSON partido)
+    fase = "procurando"
+    inicio_campo = None
+    bytes_gravados = 0
+    arquivo = None
+    caminho_parcial = caminho_arquivo + ".part"
+
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+
+            if fase == "procurando":
+                inicio_busca = max(0, len(prefixo) - len(campo) - 16)
+                prefixo += chunk
+                encontrado = padrao.search(prefixo, inicio_busca)
+                if not encontrado:
+                    if len(prefixo) > limite_envelope:
+                        raise ValueError(f"Campo '{campo}' não encontrado nos primeiros {limite_envelope} bytes")
+                    continue
+
+                inicio_campo = encontrado.start()
+                chunk = bytes(prefixo[encontrado.end():])
+                del prefixo[encontrado.end():]
+                fase = "decodificando"
+
+                pasta = os.path.dirname(caminho_arquivo)
+                if pasta:
+                    os.makedirs(pasta, exist_ok=True)
+                arquivo = open(caminho_parcial, "wb")
+
+            if fase == "decodificando":
+                if barra_pendente:
+                    chunk = b"\\" + chunk
+                    barra_pendente = False
+
+                fim = chunk.find(b'"')
+                trecho = chunk if fim < 0 else chunk[:fim]
+
+                # Escape partido entre chunks: guarda a barra para o próximo
+                if fim < 0 and trecho.endswith(b"\\") and (len(trecho) - len(trecho.rstrip(b"\\"))) % 2:
+                    trecho = trecho[:-1]
+                    barra_pendente = True
+
+                # Escapes JSON possíveis em base64: "\/" e quebras de linha "\n"/"\r"
+                trecho = trecho.replace(b"\\/", b"/").replace(b"\\n", b"").replace(b"\\r", b"")
+                pendente += trecho.translate(None, _BRANCOS)
+
+                alinhado = len(pendente) - len(pendente) % 4
+                if alinhado:
+                    bytes_gravados += _gravar(arquivo, _decodificar(pendente[:alinhado], tempos), hasher, tempos)
+                    pendente = pendente[alinhado:]
+
+                if fim < 0:
+                    continue
+
+                fase = "sufixo"
+                chunk = chunk[fim + 1:]
+
+            if fase == "sufixo":
+                sufixo += chunk
+                if len(prefixo) + len(sufixo) > limite_envelope:
+                    raise ValueError("Envelope JSON maior que o limite permitido")
+
+        if fase == "procurando":
+            # Campo ausente: a resposta é pequena (erro/lista vazia) e pode ser parseada inteira
+            return json.loads(bytes(prefixo) or b"{}"), 0
+
+        if fase == "decodificando":
+            raise ValueError(f"Resposta truncada: campo '{campo}' não foi fechado")
+
+        if pendente:
+            bytes_gravados += _gravar(arquivo, _decodificar(pendente, tempos), hasher, tempos)
+
+        arquivo.close()
+        arquivo = None
+
+        envelope = json.loads(bytes(prefixo[:inicio_campo]) + b'"' + campo.encode() + b'": ""' + bytes(sufixo))
+        if bytes_gravados and (validar is None or validar(envelope, bytes_gravados)):
+            os.replace(caminho_parcial, caminho_arquivo)
+            return envelope, bytes_gravados
+
+        # Campo vazio (sem arquivo de 0 bytes) ou resposta reprovada: o arquivo final não é tocado
+        os.remove(caminho_parcial)
+        return envelope, 0
+
+    except BaseException:
+        if arquivo is not None:
+            arquivo.close()
+        if os.path.exists(caminho_parcial):
+            os.remove(caminho_parcial)
+        raise
@@ -1,43 +1,373 @@
 import os
+import sys
+import csv
+import json
+import time
 import logging
+import argparse
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from lib_api_qive import QiveAPI
+from lib_indice_nfse import IndiceNFSe
+from lib_cache_qive import ManifestoDownloads, CacheCancelamento, CacheRespostas
+from lib_log_qive import configurar_logs_fila
 
 
 def configurar_logs():    
     log_dir = "./log"
     os.makedirs(log_dir, exist_ok=True)
     nome_log = datetime.now().strftime("%Y-%m-%d_qive.log")
+
+    # Logs em fila: arquivo e console são escritos por uma thread em segundo plano.
+    # QIVE_LOG_JSON=1 grava uma linha JSON por registro (com correlacao_id)
+    formato_json = os.getenv("QIVE_LOG_JSON", "0") == "1"
+    if formato_json:
+        nome_log = nome_log.replace(".log", ".jsonl")
     caminho_log = os.path.join(log_dir, nome_log)
 
-    logging.basicConfig(
-        filename=caminho_log,
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(filename)s - %(lineno)d - %(message)s",
-        datefmt="%H:%M:%S",
-        force=True
+    configurar_logs_fila(
+        caminho_log,
+        nivel=logging.DEBUG if os.getenv("QIVE_LOG_DEBUG", "0") == "1" else logging.INFO,
+        formato_json=formato_json
     )
 
-    # Exibir logs também no console
-    console = logging.StreamHandler()
-    console.setLevel(logging.INFO)
-    console.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(filename)s - %(lineno)d - %(message)s"))
-    logging.getLogger().addHandler(console)
-
     logging.debug("Log configurado com sucesso.")
-    logging.debug(f"Arquivo de log: {os.path.abspath(caminho_log)}")
+    logging.debug("Arquivo de log: %s", os.path.abspath(caminho_log))
+
+
+API_ID = os.getenv("QIVE_API_ID", "b2d09779e1bb295256cd4e9feffaa5aecb2dfc47")
+API_KEY = os.getenv("QIVE_API_KEY", "5b84010e4e04fd0b4fd773596fdc3be57a42e278")
+
+
+def criar_qive(pool_size=10, requisicoes_por_segundo=3.0):
+    return QiveAPI(
+        api_id=API_ID,
+        api_key=API_KEY,
+        pool_size=pool_size,
+        requisicoes_por_segundo=requisicoes_por_segundo,
+        indice=IndiceNFSe("./indice_nfse.sqlite3"),
+        manifesto=ManifestoDownloads("./manifesto_downloads.sqlite3"),
+        cache_cancelamentos=CacheCancelamento("./cache_cancelamentos.sqlite3"),
+        cache_respostas=CacheRespostas("./cache_respostas.sqlite3")
+    )
+
+
+# ============================================================
+# MODO LOTE (CLI): python main_qive.py <comando> [opções]
+# ============================================================
+
+# IDs/chaves por consulta de cancelamento no check-cancel (resultado gravado a cada bloco)
+TAMANHO_BLOCO_CANCELAMENTO = 1000
+
+
+def ler_entradas(caminho, campos):
+    """
+    Lê as entradas de um CSV (ou stdin, se caminho == "-").
+    Aceita ',' ou ';' como separador. Se a primeira linha for um cabeçalho
+    com os nomes dos campos, as colunas são mapeadas pelo nome; senão, pela posição.
+
+    Args:
+        caminho: Caminho do arquivo ou "-" para stdin
+        campos: Nomes dos campos esperados, na ordem posicional
+
+    Returns:
+        Lista de dicts {campo: valor}
+    """
+    arquivo = sys.stdin if caminho == "-" else open(caminho, "r", encoding="utf-8-sig", newline="")
+    try:
+        linhas = [linha for linha in arquivo if linha.strip()]
+    finally:
+        if arquivo is not sys.stdin:
+            arquivo.close()
+
+    if not linhas:
+        return []
+
+    separador = ";" if linhas[0].count(";") > linhas[0].count(",") else ","
+    registros = list(csv.reader(linhas, delimiter=separador))
+
+    cabecalho = [coluna.strip().lower() for coluna in registros[0]]
+    if campos[0] in cabecalho:
+        registros = registros[1:]
+    else:
+        cabecalho = campos
+
+    entradas = []
+    for registro in registros:
+        valores = dict(zip(cabecalho, (valor.strip() for valor in registro)))
+        entradas.append({campo: valores.get(campo) or None for campo in campos})
+
+    return entradas
+
+
+class SaidaJSONL:
+    """Escreve um resultado por linha (JSONL) de forma segura entre threads"""
+
+    def __init__(self, caminho):
+        self.arquivo = sys.stdout if caminho == "-" else open(caminho, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+        if self.arquivo is not sys.stdout and self.arquivo.tell():
+            # Linha cortada por uma interrupção anterior: o próximo registro começa em linha nova
+            with open(caminho, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self.arquivo.write("\n")
+
+    def escrever(self, registro):
+        linha = json.dumps(registro, ensure_ascii=False, default=str)
+        with self._lock:
+            self.arquivo.write(linha + "\n")
+            self.arquivo.flush()
+
+    def close(self):
+        if self.arquivo is not sys.stdout:
+            self.arquivo.close()
+
+
+def chaves_concluidas(caminho, campo):
+    """
+    Valores de `campo` das entradas que já terminaram sem erro em um JSONL de
+    resultados anterior (usado para retomar um lote interrompido)
+    """
+    if caminho == "-" or not os.path.exists(caminho):
+        return set()
+
+    concluidas = set()
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                continue  # linha cortada por uma interrupção
+            if registro.get("erro") is None and registro.get("entrada", {}).get(campo):
+                concluidas.add(registro["entrada"][campo])
+    return concluidas
+
+
+def filtrar_pendentes(entradas, campo, args):
+    """
+    Com --retomar, remove das entradas as que já constam como concluídas
+    no arquivo de --output (o novo resultado é acrescentado ao mesmo arquivo)
+    """
+    if not args.retomar:
+        return entradas
+
+    concluidas = chaves_concluidas(args.output, campo)
+    pendentes = [e for e in entradas if e[campo] not in concluidas]
+    logging.info(
+        "Retomando lote: %s entrada(s) já concluída(s), %s pendente(s)", len(entradas) - len(pendentes), len(pendentes)
+    )
+    return pendentes
+
+
+def executar_em_paralelo(funcao, entradas, workers, saida):
+    """
+    Executa funcao(entrada) para cada entrada em um pool de threads,
+    gravando uma linha JSONL por entrada assim que ela termina
+
+    Returns:
+        Quantidade de entradas com erro
+    """
+    def executar(entrada):
+        inicio = time.perf_counter()
+        try:
+            resultado = funcao(entrada)
+            erro = None if resultado else "sem resultado"
+        except Exception as e:
+            resultado, erro = None, str(e)
+        return {
+            "entrada": entrada,
+            "resultado": resultado,
+            "erro": erro,
+            "duracao": round(time.perf_counter() - inicio, 3),
+        }
+
+    erros = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for futuro in as_completed([executor.submit(executar, entrada) for entrada in entradas]):
+            registro = futuro.result()
+            erros += registro["erro"] is not None
+            saida.escrever(registro)
+
+    return erros
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        prog="main_qive.py",
+        description="API Qive/Arquivei - sem argumentos abre o menu interativo; com um comando roda em lote."
+    )
+
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument("--input", "-i", default="-", help="CSV de entrada (padrão: stdin)")
+    comum.add_argument("--output", "-o", default="-", help="Arquivo JSONL de resultados (padrão: stdout)")
+    comum.add_argument("--workers", "-w", type=int, default=4, help="Quantidade de execuções simultâneas")
+    comum.add_argument("--rps", type=float, default=3.0, help="Orçamento de requisições por segundo")
+    comum.add_argument("--metricas-json", help="Grava o snapshot JSON das métricas por endpoint ao final")
+    comum.add_argument("--metricas-prom", help="Grava as métricas no formato Prometheus (textfile collector) ao final")
+
+    documento = argparse.ArgumentParser(add_help=False)
+    documento.add_argument("--documento", "-d", choices=["nfe", "nfse"], required=True)
+
+    download = argparse.ArgumentParser(add_help=False)
+    download.add_argument("--pasta", help="Diretório de destino (padrão: o mesmo do menu)")
+    download.add_argument("--forcar", action="store_true", help="Baixa de novo mesmo se já constar no manifesto")
+
+    retomada = argparse.ArgumentParser(add_help=False)
+    retomada.add_argument("--retomar", action="store_true",
+                          help="Pula as entradas já concluídas sem erro no arquivo de --output")
+
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("buscar-nfse", parents=[comum],
+                   help="(opção 1) Busca NFS-e por número - colunas: numero,cnpj,data_inicio,data_fim")
+    check_cancel = sub.add_parser("check-cancel", parents=[comum, documento, retomada],
+                                  help="(opções 2/7) Verifica cancelamento em massa - colunas: id (nfse) ou access_key (nfe)")
+    check_cancel.add_argument("--revalidar", action="store_true",
+                              help="Consulta a API mesmo para status ainda válidos no cache de cancelamentos")
+    sub.add_parser("download-pdf", parents=[comum, documento, download, retomada],
+                   help="(opções 3/5) Baixa PDF - colunas: id (nfse) ou access_key (nfe)")
+    sub.add_parser("download-xml", parents=[comum, documento, download, retomada],
+                   help="(opções 4/6) Baixa XML - colunas: id (nfse) ou access_key (nfe)")
+    sub.add_parser("process-nfse", parents=[comum, download],
+                   help="(opção 8) Processa NFS-e - colunas: numero,cnpj,data_emissao,data_fim")
+    sub.add_parser("process-nfe", parents=[comum, download, retomada],
+                   help="(opção 9) Processa NF-e em lote - colunas: access_key")
+
+    return parser
+
+
+def executar_cli(argv):
+    """
+    Executa um comando em lote (sem input()) e retorna o código de saída:
+    0 = tudo ok, 1 = alguma entrada falhou
+    """
+    args = criar_parser().parse_args(argv)
+
+    logging.info("#" * 80)
+    logging.info(">>>>>>>>>>>>>  QIVE LOTE: %s  <<<<<<<<<<<<<", args.comando)
+
+    qive = criar_qive(pool_size=max(10, args.workers * 2), requisicoes_por_segundo=args.rps)
+    saida = SaidaJSONL(args.output)
+    inicio = time.perf_counter()
+
+    try:
+        if args.comando == "buscar-nfse":
+            entradas = ler_entradas(args.input, ["numero", "cnpj", "data_inicio", "data_fim"])
+            erros = executar_em_paralelo(
+                lambda e: qive.buscar_nfse_nota_por_numero(
+                    e["numero"], cnpj=e["cnpj"], created_from=e["data_inicio"],
+                    created_to=e["data_fim"] or datetime.now().strftime("%Y-%m-%d")
+                ),
+                entradas, args.workers, saida
+            )
+
+        elif args.comando == "check-cancel":
+            campo = "access_key" if args.documento == "nfe" else "id"
+            entradas = filtrar_pendentes(ler_entradas(args.input, [campo]), campo, args)
+            ids = list(dict.fromkeys(e[campo] for e in entradas if e[campo]))
+            consultar = qive.buscar_nfe_canceladas_em_lote if args.documento == "nfe" else qive.buscar_nfse_canceladas_em_lote
+
+            # Consulta e grava em blocos: uma interrupção perde no máximo o bloco em andamento
+            erros = 0
+            for inicio_bloco in range(0, len(ids), TAMANHO_BLOCO_CANCELAMENTO):
+                bloco = ids[inicio_bloco:inicio_bloco + TAMANHO_BLOCO_CANCELAMENTO]
+                canceladas = consultar(bloco, ignorar_cache=args.revalidar)
+                for valor in bloco:
+                    if canceladas is None:
+                        erros += 1
+                        saida.escrever({"entrada": {campo: valor}, "resultado": None, "erro": "falha na consulta"})
+                    else:
+                        status = "CANCELADA" if valor in canceladas else "ATIVA"
+                        saida.escrever({"entrada": {campo: valor}, "resultado": {"status": status}, "erro": None})
+
+        elif args.comando in ("download-pdf", "download-xml"):
+            campo = "access_key" if args.documento == "nfe" else "id"
+            metodo = {
+                ("download-pdf", "nfe"): qive.baixar_nfe_pdf,
+                ("download-pdf", "nfse"): qive.baixar_nfse_pdf,
+                ("download-xml", "nfe"): qive.baixar_nfe_xml,
+                ("download-xml", "nfse"): qive.baixar_nfse_xml,
+            }[(args.comando, args.documento)]
+
+            opcoes = {"forcar": args.forcar}
+            if args.pasta:
+                opcoes["pasta"] = args.pasta
+
+            entradas = filtrar_pendentes(ler_entradas(args.input, [campo]), campo, args)
+            erros = executar_em_paralelo(
+                lambda e: metodo(e[campo], **opcoes), entradas, args.workers, saida
+            )
+
+        elif args.comando == "process-nfse":
+            entradas = ler_entradas(args.input, ["numero", "cnpj", "data_emissao", "data_fim"])
+            opcoes = {"forcar": args.forcar}
+            if args.pasta:
+                opcoes.update(pasta_pdf=os.path.join(args.pasta, "pdf"), pasta_xml=os.path.join(args.pasta, "xml"))
+
+            erros = executar_em_paralelo(
+                lambda e: qive.processar_nfse_por_numero(
+                    numero_nota=e["numero"], cnpj=e["cnpj"], data_emissao=e["data_emissao"],
+                    data_fim=e["data_fim"], **opcoes
+                ),
+                entradas, args.workers, saida
+            )
+
+        elif args.comando == "process-nfe":
+            entradas = filtrar_pendentes(ler_entradas(args.input, ["access_key"]), "access_key", args)
+            opcoes = {"forcar": args.forcar}
+            if args.pasta:
+                opcoes.update(pasta_pdf=os.path.join(args.pasta, "pdf"), pasta_xml=os.path.join(args.pasta, "xml"))
+
+            chaves = [e["access_key"] for e in entradas if e["access_key"]]
+
+            erros = 0
+
+            def gravar(resultado):
+                # Uma linha por chave assim que ela termina: uma interrupção não perde o que já foi feito
+                nonlocal erros
+                erro = "download incompleto" if resultado["status"] == "ERRO" else None
+                erros += erro is not None
+                saida.escrever({"entrada": {"access_key": resultado["access_key"]}, "resultado": resultado, "erro": erro})
+
+            # Cancelamentos em massa + downloads paralelos (processar_nfe_lote)
+            resultados = qive.processar_nfe_lote(
+                access_keys=chaves,
+                max_workers=args.workers,
+                caminho_manifesto=os.devnull,
+                ao_concluir=gravar,
+                **opcoes
+            )
+
+            if resultados is None:
+                erros = len(chaves)
+                for chave in chaves:
+                    saida.escrever({"entrada": {"access_key": chave}, "resultado": None, "erro": "falha na verificação de cancelamento"})
+
+    finally:
+        saida.close()
+        qive.close()
+        if args.metricas_json:
+            qive.metricas.salvar_json(args.metricas_json)
+        if args.metricas_prom:
+            qive.metricas.salvar_prometheus(args.metricas_prom)
+
+    logging.info("Comando %s concluído em %.1fs (%s erro(s))", args.comando, time.perf_counter() - inicio, erros)
+    return 1 if erros else 0
 
 
 def main():
     configurar_logs()
 
+    # Com argumentos: modo lote não interativo (cron / orquestrador RPA)
+    if len(sys.argv) > 1:
+        return executar_cli(sys.argv[1:])
+
     logging.info("#" * 80)
     logging.info(">>>>>>>>>>>>>  INICIANDO PROCESSO QIVE  <<<<<<<<<<<<<\n")
 
-    qive = QiveAPI(
-        api_id="b2d09779e1bb295256cd4e9feffaa5aecb2dfc47",
-        api_key="5b84010e4e04fd0b4fd773596fdc3be57a42e278"
-    )
+    qive = criar_qive()
 
     
     while True:
@@ -60,6 +390,7 @@ def main():
 
         if opcao == "0":
             print("Encerrando o sistema...")
+            qive.close()
             break
 
         elif opcao == "1":
@@ -295,5 +626,6 @@ def main():
 
 
 if __name__ == "__main__":    
-    main()
-    logging.shutdown()
\ No newline at end of file
+    codigo_saida = main()
+    logging.shutdown()
+    sys.exit(codigo_saida or 0)
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os módulos da qive_api são importados de forma plana (from lib_x import ...)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,107 @@
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from lib_cache_qive import CacheCancelamento, CacheRespostas
+
+
+DIA = 86400
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CacheCancelamento(
+        str(tmp_path / "cancelamentos.sqlite3"), ttl_base=3600, fator_idade=0.5, ttl_maximo=30 * DIA
+    )
+    yield cache
+    cache.close()
+
+
+def dias_atras(dias):
+    return date.today() - timedelta(days=dias)
+
+
+def test_ttl_cresce_com_a_idade_do_documento(cache):
+    assert cache.ttl(None) == 3600
+    assert cache.ttl(dias_atras(0)) == 3600
+    assert cache.ttl(dias_atras(10)) == 5 * DIA
+    assert cache.ttl(dias_atras(10).isoformat() + "T10:00:00-03:00") == 5 * DIA
+    assert cache.ttl(datetime.combine(dias_atras(10), datetime.min.time())) == 5 * DIA
+    assert cache.ttl(dias_atras(1000)) == 30 * DIA
+    # Data futura (relógio do emissor adiantado) não gera TTL negativo
+    assert cache.ttl(date.today() + timedelta(days=5)) == 3600
+
+
+def test_ttl_permanente_apos_idade_definitiva(tmp_path):
+    cache = CacheCancelamento(str(tmp_path / "c.sqlite3"), idade_definitiva_dias=180)
+    try:
+        assert cache.ttl(dias_atras(200)) is None
+        assert cache.ttl(dias_atras(100)) is not None
+    finally:
+        cache.close()
+
+
+@pytest.mark.parametrize("invalida", ["31/12/2024", "", "2024-13-01", "sem data", 20240101, ["2024-01-01"]])
+def test_ttl_com_data_invalida_usa_ttl_base(cache, invalida):
+    assert cache.ttl(invalida) == 3600
+
+
+def test_registrar_com_data_invalida_nao_perde_o_lote(cache):
+    antes = time.time()
+    cache.registrar("nfse", ["a", "b", "c"], {"b"}, datas={"a": "não é data", "c": dias_atras(10).isoformat()})
+
+    canceladas, ativas, pendentes = cache.separar("nfse", ["a", "b", "c"])
+    assert canceladas == {"b"}
+    assert ativas == {"a", "c"}
+    assert pendentes == []
+
+    expira_em = dict(cache._conn.execute("SELECT chave, expira_em FROM cancelamentos").fetchall())
+    assert antes + 3600 <= expira_em["nfse:a"] <= time.time() + 3600
+    assert expira_em["nfse:c"] >= antes + 5 * DIA
+
+
+CORPO_OK = b'{"status": {"code": 200, "message": "Ok"}, "data": []}'
+
+
+@pytest.fixture
+def respostas(tmp_path):
+    cache = CacheRespostas(str(tmp_path / "respostas.sqlite3"))
+    yield cache
+    cache.close()
+
+
+@pytest.mark.parametrize("endpoint", ["/v1/nfse/events", "/v2/nfe/events"])
+def test_eventos_nunca_sao_guardados(respostas, endpoint):
+    params = {"id[]": ["a", "b"], "created_at[to]": "2020-01-31"}
+
+    assert not respostas.aceita(endpoint)
+    respostas.guardar(endpoint, params, CORPO_OK)
+
+    assert respostas.obter(endpoint, params) is None
+    assert respostas._conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0] == 0
+
+
+def test_listagens_sao_guardadas(respostas):
+    params = {"cnpj[]": "44555666000199", "created_at[to]": "2020-01-31"}
+
+    respostas.guardar("/v1/nfse/received", params, CORPO_OK)
+
+    assert respostas.obter("/v1/nfse/received", params) == CORPO_OK
+
+
+def test_consultas_de_cancelamento_sempre_vao_a_api(tmp_path):
+    pytest.importorskip("requests")
+    from lib_api_qive import QiveAPI
+    from lib_mock_arquivei import ConfigMock, ServidorMockArquivei
+
+    cache = CacheRespostas(str(tmp_path / "respostas.sqlite3"))
+    with ServidorMockArquivei(ConfigMock(total_nfse=20, total_nfe=20, latencia=0, jitter=0)) as mock:
+        with QiveAPI("id", "key", base_url=mock.base_url, cache_respostas=cache) as qive:
+            for _ in range(2):
+                assert qive.buscar_nfse_canceladas_em_lote(mock.dados.ids_nfse) is not None
+                assert qive.buscar_nfe_canceladas_em_lote(mock.dados.chaves_nfe) is not None
+
+    cache.close()
+    assert mock.contadores["/v1/nfse/events"] == 2
+    assert mock.contadores["/v2/nfe/events"] == 2
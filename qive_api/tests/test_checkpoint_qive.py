@@ -0,0 +1,151 @@
+import os
+import json
+
+import pytest
+
+from lib_checkpoint_qive import CheckpointVarredura, EstadoVarredura, ResultadoVarredura
+
+
+PARAMETROS = {"cnpj": "44555666000199", "tipo": "received", "created_from": "2025-01-01", "created_to": "2025-01-31"}
+
+
+def pagina(inicio, tamanho=3):
+    return [{"id": f"nota-{i}"} for i in range(inicio, inicio + tamanho)]
+
+
+@pytest.fixture
+def caminho(tmp_path):
+    return str(tmp_path / "checkpoints" / "nfse.json")
+
+
+def test_checkpoint_novo_comeca_do_cursor_inicial(caminho):
+    estado = CheckpointVarredura(caminho).iniciar(PARAMETROS, cursor_inicial=10)
+
+    assert estado["cursor"] == 10
+    assert estado["paginas"] == 0
+    assert not estado["completa"]
+    assert os.path.exists(caminho)
+
+
+def test_retoma_do_ultimo_cursor_e_reentrega_paginas(caminho):
+    checkpoint = CheckpointVarredura(caminho)
+    checkpoint.iniciar(PARAMETROS)
+    checkpoint.salvar_pagina(pagina(0), 3)
+    checkpoint.salvar_pagina(pagina(3), 6)
+
+    retomado = CheckpointVarredura(caminho)
+    estado = retomado.iniciar(PARAMETROS)
+
+    assert estado["cursor"] == 6
+    assert estado["paginas"] == 2
+    assert list(retomado.iterar_paginas_salvas()) == [pagina(0), pagina(3)]
+
+
+def test_pagina_gravada_sem_estado_e_descartada(caminho):
+    checkpoint = CheckpointVarredura(caminho)
+    checkpoint.iniciar(PARAMETROS)
+    checkpoint.salvar_pagina(pagina(0), 3)
+
+    # Crash entre anexar a página e regravar o estado
+    with open(checkpoint.caminho_notas, "a", encoding="utf-8") as f:
+        f.write(json.dumps(pagina(3)) + "\n")
+
+    retomado = CheckpointVarredura(caminho)
+    estado = retomado.iniciar(PARAMETROS)
+
+    assert estado["cursor"] == 3
+    assert list(retomado.iterar_paginas_salvas()) == [pagina(0)]
+    with open(retomado.caminho_notas, "r", encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+
+
+def test_linha_cortada_no_meio_e_truncada(caminho):
+    checkpoint = CheckpointVarredura(caminho)
+    checkpoint.iniciar(PARAMETROS)
+    checkpoint.salvar_pagina(pagina(0), 3)
+    tamanho_valido = os.path.getsize(checkpoint.caminho_notas)
+
+    with open(checkpoint.caminho_notas, "a", encoding="utf-8") as f:
+        f.write(json.dumps(pagina(3))[:10])
+
+    retomado = CheckpointVarredura(caminho)
+    retomado.iniciar(PARAMETROS)
+
+    assert os.path.getsize(retomado.caminho_notas) == tamanho_valido
+    assert list(retomado.iterar_paginas_salvas()) == [pagina(0)]
+
+
+def test_paginas_faltando_recomeca_do_zero(caminho):
+    checkpoint = CheckpointVarredura(caminho)
+    checkpoint.iniciar(PARAMETROS, cursor_inicial=0)
+    checkpoint.salvar_pagina(pagina(0), 3)
+    checkpoint.salvar_pagina(pagina(3), 6)
+
+    with open(checkpoint.caminho_notas, "r+b") as f:
+        f.truncate(len(json.dumps(pagina(0)).encode()) + 1)
+
+    retomado = CheckpointVarredura(caminho)
+    estado = retomado.iniciar(PARAMETROS, cursor_inicial=0)
+
+    assert estado["cursor"] == 0
+    assert estado["paginas"] == 0
+    assert list(retomado.iterar_paginas_salvas()) == []
+
+
+def test_parametros_diferentes_recomecam_do_zero(caminho):
+    checkpoint = CheckpointVarredura(caminho)
+    checkpoint.iniciar(PARAMETROS)
+    checkpoint.salvar_pagina(pagina(0), 3)
+
+    outro = CheckpointVarredura(caminho)
+    estado = outro.iniciar(dict(PARAMETROS, created_to="2025-02-28"))
+
+    assert estado["cursor"] == 0
+    assert estado["parametros"]["created_to"] == "2025-02-28"
+    assert list(outro.iterar_paginas_salvas()) == []
+
+
+def test_finalizar_e_remover(caminho):
+    checkpoint = CheckpointVarredura(caminho)
+    checkpoint.iniciar(PARAMETROS)
+    checkpoint.salvar_pagina(pagina(0), 3)
+    checkpoint.finalizar(True, "fim")
+
+    assert CheckpointVarredura(caminho).iniciar(PARAMETROS)["completa"]
+
+    checkpoint.remover()
+    assert not os.path.exists(caminho)
+    assert not os.path.exists(checkpoint.caminho_notas)
+
+
+def test_resultado_varredura_truncada():
+    estado = EstadoVarredura(cursor=50)
+    estado.motivo = "timeout"
+    resultado = ResultadoVarredura(pagina(0), estado)
+
+    assert resultado == pagina(0)
+    assert resultado.truncada
+    assert resultado.motivo == "timeout"
+
+
+def test_varredura_truncada_e_retomada_pelo_checkpoint(caminho):
+    pytest.importorskip("requests")
+    from lib_api_qive import QiveAPI
+    from lib_mock_arquivei import ConfigMock, ServidorMockArquivei
+
+    config = ConfigMock(total_nfse=230, latencia=0, jitter=0)
+    with ServidorMockArquivei(config) as mock, QiveAPI("teste", "teste", base_url=mock.base_url) as qive:
+        parcial = qive.buscar_nfse_todas_notas_paginado(
+            "44555666000199", "2025-01-01", "2025-02-28", max_paginas=2, checkpoint=caminho
+        )
+        assert parcial.truncada
+        assert parcial.motivo == "max_paginas"
+        assert len(parcial) == 100
+
+        completo = qive.buscar_nfse_todas_notas_paginado(
+            "44555666000199", "2025-01-01", "2025-02-28", checkpoint=caminho
+        )
+
+    assert completo.completa
+    ids = [nota["id"] for nota in completo]
+    assert len(ids) == len(set(ids)) == 230
@@ -0,0 +1,57 @@
+import copy
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from lib_colunar_qive import COLUNAS_NUMERICAS, converter_numero, lote_nfse
+from lib_mock_arquivei import NOTA_MODELO
+
+
+def nota(**valores):
+    nota_json = copy.deepcopy(NOTA_MODELO)
+    nota_json["id"] = "nota-1"
+    campos = nota_json["xml"]["Nfse"]["InfNfse"]["ValoresNfse"]
+    for campo, valor in valores.items():
+        if valor is ...:
+            campos.pop(campo)
+        else:
+            campos[campo] = valor
+    return nota_json
+
+
+@pytest.mark.parametrize("valor,esperado", [
+    ("1500.00", 1500.0), (" 2.5 ", 2.5), (30, 30.0), (None, 0.0), ("", 0.0),
+    ("1.500,00", None), ("N/A", None), ({"valor": 1}, None),
+])
+def test_converter_numero(valor, esperado):
+    assert converter_numero(valor) == esperado
+
+
+def test_lote_com_valores_invalidos_nao_aborta():
+    notas = [
+        nota(),
+        nota(BaseCalculo="1.500,00", Aliquota=" 2.00"),
+        nota(ValorIss=..., ValorServicos=None),
+    ]
+
+    lote = lote_nfse(notas).to_pydict()
+
+    assert lote["base_calculo"] == [1500.0, None, 1500.0]
+    assert lote["aliquota"] == [2.0, 2.0, 2.0]
+    assert lote["valor_iss"] == [30.0, 30.0, 0.0]
+    assert lote["valor_servicos"] == [1500.0, 1500.0, 0.0]
+
+
+def test_colunar_igual_a_extracao_por_linha():
+    pytest.importorskip("requests")
+    from lib_api_qive import QiveAPI
+
+    notas = [nota(), nota(BaseCalculo="abc", ValorIss=...), nota(Aliquota="", ValorServicos="99.9")]
+    qive = QiveAPI.__new__(QiveAPI)
+
+    lote = lote_nfse(notas).to_pydict()
+    for i, nota_json in enumerate(notas):
+        linha = qive.extrair_dados_nota_json(nota_json)
+        assert {coluna: lote[coluna][i] for coluna in COLUNAS_NUMERICAS} == \
+            {coluna: linha[coluna] for coluna in COLUNAS_NUMERICAS}
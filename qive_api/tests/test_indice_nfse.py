@@ -0,0 +1,89 @@
+import pytest
+
+from lib_indice_nfse import IndiceNFSe
+
+
+CNPJ = "44555666000199"
+
+
+def nota(numero, data_emissao, id_arquivei=None):
+    return {
+        "id_arquivei": id_arquivei or f"id-{numero}",
+        "numero": numero,
+        "codigo_verificacao": "ABC",
+        "data_emissao": data_emissao,
+    }
+
+
+@pytest.fixture
+def indice(tmp_path):
+    indice = IndiceNFSe(str(tmp_path / "indice.sqlite3"))
+    yield indice
+    indice.close()
+
+
+def test_nota_emitida_antes_da_janela_e_recebida_dentro(indice):
+    # Emitida em dezembro, recebida pelo Arquivei em janeiro
+    indice.registrar_pagina(CNPJ, "received", "2025-01-10", "2025-01-20", [nota("7", "2024-12-20T10:00:00")], 1)
+
+    dados = indice.buscar_por_numero(CNPJ, "7", recebido_de="2025-01-01", recebido_ate="2025-01-31")
+
+    assert dados is not None
+    assert dados["data_emissao"].startswith("2024-12-20")
+    assert indice.faixas_ambiguas(CNPJ, "7", "received", "2025-01-01", "2025-01-31") == []
+
+
+def test_nota_recebida_fora_da_janela_nao_e_encontrada(indice):
+    indice.registrar_pagina(CNPJ, "received", "2025-01-01", "2025-01-05", [nota("5", "2025-01-01T10:00:00")], 1)
+
+    assert indice.buscar_por_numero(CNPJ, "5", recebido_de="2025-01-20", recebido_ate="2025-01-31") is None
+    assert indice.faixas_ambiguas(CNPJ, "5", "received", "2025-01-20", "2025-01-31") == []
+
+
+def test_faixa_mais_larga_que_a_janela_e_ambigua(indice):
+    indice.registrar_pagina(CNPJ, "received", "2025-01-01", "2025-01-31", [nota("5", "2025-01-01T10:00:00")], 1)
+
+    assert indice.buscar_por_numero(CNPJ, "5", recebido_de="2025-01-20", recebido_ate="2025-01-31") is None
+    assert indice.faixas_ambiguas(CNPJ, "5", "received", "2025-01-20", "2025-01-31") == [("2025-01-20", "2025-01-31")]
+
+
+def test_reaparecer_em_varredura_menor_estreita_a_faixa(indice):
+    indice.registrar_pagina(CNPJ, "received", "2025-01-01", "2025-01-31", [nota("9", "2025-01-02T10:00:00")], 1)
+    indice.registrar_pagina(CNPJ, "received", "2025-01-20", "2025-01-31", [nota("9", "2025-01-02T10:00:00")], 1)
+
+    assert indice.buscar_por_numero(CNPJ, "9", recebido_de="2025-01-20", recebido_ate="2025-01-31") is not None
+    assert indice.buscar_por_numero(CNPJ, "9", recebido_de="2025-01-01", recebido_ate="2025-01-19") is None
+
+
+def test_descartar_faixa_encurta_notas_nao_vistas(indice):
+    indice.registrar_pagina(CNPJ, "received", "2025-01-01", "2025-01-31", [nota("5", "2025-01-01T10:00:00")], 1)
+
+    # Varredura completa de 20 a 31 sem a nota 5: ela foi recebida até o dia 19
+    indice.descartar_faixa(CNPJ, "received", "2025-01-20", "2025-01-31")
+
+    assert indice.faixas_ambiguas(CNPJ, "5", "received", "2025-01-20", "2025-01-31") == []
+    assert indice.buscar_por_numero(CNPJ, "5", recebido_de="2025-01-01", recebido_ate="2025-01-19") is not None
+
+
+def test_busca_pelo_recebimento_via_api(tmp_path):
+    pytest.importorskip("requests")
+    from lib_api_qive import QiveAPI
+    from lib_mock_arquivei import ConfigMock, ServidorMockArquivei
+
+    indice = IndiceNFSe(str(tmp_path / "indice.sqlite3"))
+    config = ConfigMock(total_nfse=300, data_inicial="2025-01-01", dias=31, latencia=0, jitter=0)
+    with ServidorMockArquivei(config) as mock, QiveAPI("teste", "teste", base_url=mock.base_url, indice=indice) as qive:
+        qive.sincronizar_indice_nfse(CNPJ, "2025-01-01", "2025-01-31")
+
+        # Nota 5 foi recebida em 01/01: fora da janela, mesmo com o mês inteiro indexado
+        assert qive.buscar_nfse_nota_por_numero("5", CNPJ, "2025-01-20", "2025-01-31") is None
+        assert qive.buscar_nfse_nota_por_numero("5", CNPJ, "2025-01-01", "2025-01-10") is not None
+
+        # Nota 290 foi recebida no fim do mês
+        dados = qive.buscar_nfse_nota_por_numero("290", CNPJ, "2025-01-20", "2025-01-31")
+        assert dados is not None
+
+        requisicoes = sum(mock.contadores.values())
+        assert qive.buscar_nfse_nota_por_numero("290", CNPJ, "2025-01-20", "2025-01-31") == dados
+        assert sum(mock.contadores.values()) == requisicoes
+    indice.close()
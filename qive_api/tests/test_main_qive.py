@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+pytest.importorskip("requests")
+
+import main_qive
+from lib_api_qive import QiveAPI
+from lib_mock_arquivei import ConfigMock, ServidorMockArquivei
+
+
+@pytest.fixture
+def mock(monkeypatch):
+    with ServidorMockArquivei(ConfigMock(total_nfse=10, total_nfe=10, latencia=0, jitter=0,
+                                         latencia_documento=0, tamanho_pdf=1024)) as mock:
+        monkeypatch.setattr(
+            main_qive, "criar_qive",
+            lambda pool_size=10, requisicoes_por_segundo=3.0: QiveAPI("id", "key", base_url=mock.base_url)
+        )
+        yield mock
+
+
+def ler_saida(caminho):
+    with open(caminho, "r", encoding="utf-8") as f:
+        return [json.loads(linha) for linha in f]
+
+
+def escrever_entrada(caminho, campo, valores):
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("\n".join([campo] + valores) + "\n")
+
+
+def test_check_cancel_retoma_do_output(mock, tmp_path):
+    ids = mock.dados.ids_nfse
+    entrada, saida = str(tmp_path / "ids.csv"), str(tmp_path / "saida.jsonl")
+    escrever_entrada(entrada, "id", ids)
+
+    # Execução anterior interrompida: 3 concluídas, 1 com erro e uma linha cortada no fim
+    anteriores = [{"entrada": {"id": valor}, "resultado": {"status": "ATIVA"}, "erro": None} for valor in ids[:3]]
+    anteriores.append({"entrada": {"id": ids[3]}, "resultado": None, "erro": "falha na consulta"})
+    with open(saida, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(registro) + "\n" for registro in anteriores)
+        f.write('{"entrada": {"id": "')
+
+    codigo = main_qive.executar_cli(["check-cancel", "-d", "nfse", "-i", entrada, "-o", saida, "--retomar"])
+
+    assert codigo == 0
+    with open(saida, "r", encoding="utf-8") as f:
+        novas = [json.loads(linha) for linha in f.readlines()[len(anteriores) + 1:]]
+    assert [r["entrada"]["id"] for r in novas] == ids[3:]
+    assert {r["entrada"]["id"] for r in novas if r["resultado"]["status"] == "CANCELADA"} == \
+        {i for p, i in enumerate(ids) if p >= 3 and mock.dados.cancelada(p)}
+
+
+def test_download_retoma_do_output(mock, tmp_path):
+    chaves = mock.dados.chaves_nfe[:4]
+    primeira, completa = str(tmp_path / "primeira.csv"), str(tmp_path / "chaves.csv")
+    saida = str(tmp_path / "saida.jsonl")
+    escrever_entrada(primeira, "access_key", chaves[:2])
+    escrever_entrada(completa, "access_key", chaves)
+    opcoes = ["-d", "nfe", "-o", saida, "--pasta", str(tmp_path / "pdf"), "--forcar"]
+
+    assert main_qive.executar_cli(["download-pdf", "-i", primeira] + opcoes) == 0
+    assert main_qive.executar_cli(["download-pdf", "-i", completa, "--retomar"] + opcoes) == 0
+
+    assert sorted(r["entrada"]["access_key"] for r in ler_saida(saida)) == sorted(chaves)
+    # --forcar ignora o manifesto: só o --retomar evita baixar de novo as duas primeiras
+    assert mock.contadores["/v1/nfe/danfe"] == 4
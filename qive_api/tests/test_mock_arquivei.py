@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from lib_mock_arquivei import ConfigMock, ServidorMockArquivei
+
+
+CNPJ = "44555666000199"
+
+
+@pytest.fixture
+def mock():
+    return ServidorMockArquivei(ConfigMock(
+        total_nfse=10, total_nfe=120, dias=10, latencia=0, jitter=0, latencia_documento=0,
+        tamanho_pdf=2048, tamanho_xml=512
+    ))
+
+
+def test_danfe_e_danfse_no_formato_da_api(mock):
+    status, corpo, _ = mock.responder("/v1/nfe/danfe", {"access_key": [mock.dados.chaves_nfe[0]]})
+    assert status == 200
+    assert corpo["data"]["encoded_pdf"] == mock.dados.pdf_base64
+
+    status, corpo, _ = mock.responder("/v1/nfse/danfse", {"id": [mock.dados.ids_nfse[0]]})
+    assert corpo["data"]["encoded_pdf"] == mock.dados.pdf_base64
+
+
+def test_listagem_nfe_por_cnpj_e_periodo(mock):
+    params = {"cnpj[]": [CNPJ], "created_at[from]": ["2025-01-01"], "created_at[to]": ["2025-01-31"],
+              "format_type": ["xml"], "limit": ["50"]}
+
+    chaves = []
+    for cursor in (0, 50, 100):
+        _, corpo, _ = mock.responder("/v1/nfe/received", dict(params, cursor=[str(cursor)]))
+        chaves += [item["access_key"] for item in corpo["data"]]
+    assert chaves == mock.dados.chaves_nfe
+
+    _, corpo, _ = mock.responder("/v1/nfe/received", dict(params, **{"cnpj[]": ["00000000000000"]}))
+    assert corpo["data"] == []
+
+
+def test_async_baixa_pdf_e_xml_do_mock(tmp_path):
+    lib_async_qive = pytest.importorskip("lib_async_qive")
+
+    async def processar(base_url, chaves):
+        async with lib_async_qive.AsyncQiveAPI("id", "key", base_url=base_url, backoff_factor=0) as qive:
+            return await qive.processar_nfe_varias_chaves(
+                chaves, pasta_pdf=str(tmp_path / "pdf"), pasta_xml=str(tmp_path / "xml")
+            )
+
+    with ServidorMockArquivei(ConfigMock(total_nfe=5, latencia=0, jitter=0, latencia_documento=0,
+                                         tamanho_pdf=2048, fracao_canceladas=0)) as mock:
+        resultados = asyncio.run(processar(mock.base_url, mock.dados.chaves_nfe))
+
+    assert [r["status"] for r in resultados] == ["ATIVA"] * 5
+    assert all(r["pdf"] and r["xml"] for r in resultados)
+    with open(resultados[0]["pdf"], "rb") as f:
+        assert f.read() == mock.dados.pdf
@@ -0,0 +1,171 @@
+import os
+import json
+import base64
+import random
+import hashlib
+
+import pytest
+
+from lib_stream_qive import salvar_campo_base64
+
+
+TAMANHOS_CHUNK = [1, 2, 3, 5, 7, 64, 1 << 20]
+
+
+def picotar(dados, tamanho):
+    return [dados[i:i + tamanho] for i in range(0, len(dados), tamanho)]
+
+
+def resposta(conteudo_b64, campo="encoded_pdf"):
+    """JSON como a API devolve: status antes e depois do campo base64"""
+    return (
+        b'{"status": {"code": 200, "message": "Ok"}, "'
+        + campo.encode() + b'": "' + conteudo_b64
+        + b'", "data": {"id": "abc"}}'
+    )
+
+
+def b64_json(conteudo, barras=False, quebras=None):
+    """base64 como string JSON, opcionalmente com "\\/" e quebras de linha escapadas"""
+    texto = base64.b64encode(conteudo)
+    if quebras:
+        texto = quebras.join(texto[i:i + 76] for i in range(0, len(texto), 76))
+    if barras:
+        texto = texto.replace(b"/", b"\\/")
+    return texto
+
+
+@pytest.fixture
+def conteudos():
+    aleatorio = random.Random(42)
+    # Tamanhos com 0, 1 e 2 caracteres de padding; bytes altos geram "/" e "+" no base64
+    return [bytes(aleatorio.getrandbits(8) for _ in range(n)) for n in (1, 2, 3, 4, 5, 57, 58, 59, 1000)]
+
+
+@pytest.mark.parametrize("tamanho", TAMANHOS_CHUNK)
+@pytest.mark.parametrize("barras,quebras", [
+    (False, None),
+    (True, None),
+    (False, b"\\n"),
+    (True, b"\\r\\n"),
+])
+def test_decodifica_igual_ao_b64decode(tmp_path, conteudos, tamanho, barras, quebras):
+    for i, conteudo in enumerate(conteudos):
+        texto = b64_json(conteudo, barras, quebras)
+        caminho = str(tmp_path / f"doc_{i}.pdf")
+
+        envelope, gravados = salvar_campo_base64(picotar(resposta(texto), tamanho), "encoded_pdf", caminho)
+
+        esperado = base64.b64decode(json.loads(b'"' + texto + b'"'))
+        assert esperado == conteudo
+        with open(caminho, "rb") as f:
+            assert f.read() == esperado
+        assert gravados == len(esperado)
+        assert envelope["status"]["code"] == 200
+        assert envelope["data"] == {"id": "abc"}
+        assert envelope["encoded_pdf"] == ""
+        assert not os.path.exists(caminho + ".part")
+
+
+@pytest.mark.parametrize("tamanho", [1, 3, 1 << 20])
+def test_hasher_recebe_bytes_decodificados(tmp_path, conteudos, tamanho):
+    conteudo = conteudos[-1]
+    hasher = hashlib.sha256()
+    salvar_campo_base64(
+        picotar(resposta(b64_json(conteudo, barras=True)), tamanho), "encoded_pdf",
+        str(tmp_path / "doc.pdf"), hasher=hasher
+    )
+    assert hasher.hexdigest() == hashlib.sha256(conteudo).hexdigest()
+
+
+def test_campo_xml_com_espacos_apos_dois_pontos(tmp_path):
+    conteudo = b"<NFe>teste</NFe>"
+    dados = b'{"status":{"code":200},"xml"  :   "' + base64.b64encode(conteudo) + b'"}'
+    caminho = str(tmp_path / "nota.xml")
+
+    envelope, gravados = salvar_campo_base64(picotar(dados, 1), "xml", caminho)
+
+    assert envelope == {"status": {"code": 200}, "xml": ""}
+    with open(caminho, "rb") as f:
+        assert f.read() == conteudo
+
+
+def test_campo_ausente_devolve_envelope_sem_arquivo(tmp_path):
+    dados = b'{"status": {"code": 404, "message": "Not found"}}'
+    caminho = str(tmp_path / "doc.pdf")
+
+    envelope, gravados = salvar_campo_base64(picotar(dados, 2), "encoded_pdf", caminho)
+
+    assert gravados == 0
+    assert envelope["status"]["code"] == 404
+    assert not os.path.exists(caminho)
+
+
+def test_campo_vazio_nao_cria_arquivo(tmp_path):
+    caminho = str(tmp_path / "doc.pdf")
+
+    envelope, gravados = salvar_campo_base64(picotar(resposta(b""), 1), "encoded_pdf", caminho)
+
+    assert gravados == 0
+    assert not os.path.exists(caminho)
+    assert not os.path.exists(caminho + ".part")
+
+
+def test_resposta_truncada_remove_parcial(tmp_path):
+    dados = resposta(base64.b64encode(b"x" * 300))
+    cortado = dados[:dados.index(b'", "data"') - 10]
+    caminho = str(tmp_path / "doc.pdf")
+
+    with pytest.raises(ValueError):
+        salvar_campo_base64(picotar(cortado, 7), "encoded_pdf", caminho)
+
+    assert not os.path.exists(caminho)
+    assert not os.path.exists(caminho + ".part")
+
+
+def test_envelope_acima_do_limite(tmp_path):
+    dados = b'{"status": {"code": 200}, "lixo": "' + b"a" * 5000 + b'"}'
+
+    with pytest.raises(ValueError):
+        salvar_campo_base64(picotar(dados, 100), "encoded_pdf", str(tmp_path / "doc.pdf"), limite_envelope=1000)
+
+
+def test_resposta_reprovada_preserva_arquivo_anterior(tmp_path):
+    caminho = str(tmp_path / "doc.pdf")
+    with open(caminho, "wb") as f:
+        f.write(b"versao anterior")
+    dados = resposta(base64.b64encode(b"y" * 300)).replace(b'"code": 200', b'"code": 500')
+
+    envelope, gravados = salvar_campo_base64(
+        picotar(dados, 64), "encoded_pdf", caminho,
+        validar=lambda envelope, _: envelope["status"]["code"] == 200
+    )
+
+    assert gravados == 0
+    assert envelope["status"]["code"] == 500
+    assert not os.path.exists(caminho + ".part")
+    with open(caminho, "rb") as f:
+        assert f.read() == b"versao anterior"
+
+
+def test_download_forcado_com_erro_nao_apaga_documento(tmp_path):
+    pytest.importorskip("requests")
+    from lib_api_qive import QiveAPI
+    from lib_mock_arquivei import ConfigMock, ServidorMockArquivei
+
+    with ServidorMockArquivei(ConfigMock(total_nfse=3, latencia=0, jitter=0, latencia_documento=0,
+                                         tamanho_pdf=2048)) as mock:
+        id_nfse = mock.dados.ids_nfse[0]
+        with QiveAPI("id", "key", base_url=mock.base_url) as qive:
+            caminho = qive.baixar_nfse_pdf(id_nfse, pasta=str(tmp_path))
+            assert caminho
+
+            # A API passa a responder erro com o PDF no corpo
+            mock._danfse = lambda params: {
+                "status": {"code": 500, "message": "Erro"}, "data": {"encoded_pdf": "eHl6"}
+            }
+            assert qive.baixar_nfse_pdf(id_nfse, pasta=str(tmp_path), forcar=True) is None
+
+    with open(caminho, "rb") as f:
+        assert f.read() == mock.dados.pdf
+    assert not os.path.exists(caminho + ".part")